@@ -0,0 +1,233 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import llm
+from telemetry import telemetry
+
+# Agent loop over the research tools, using the model's native tool calling.
+#
+# Each step is one model call. If the model asks for tools, every call it
+# made in that step starts at once on a thread pool, each result is added to
+# the conversation (and reported to the caller) as soon as it finishes, and
+# the step waits at most TOOL_TIMEOUT, so it takes as long as its slowest
+# tool rather than the sum of them. The next step sends the results back to
+# the model; the loop ends when the model answers without calling a tool,
+# or after MAX_STEPS, whose model call is made without tools to force an
+# answer.
+#
+# run_iter() yields the loop's events as they happen; every step's model
+# and tool latencies are also kept in a trace.
+
+MODEL = "gpt-4o-mini"
+MAX_STEPS = 5
+TOOL_TIMEOUT = 20.0
+MAX_WORKERS = 8
+
+# Tool results are cut to this many characters before going back to the model
+MAX_RESULT_CHARS = 4000
+
+
+class AgentTool:
+    """A tool the model can call with one string argument, like langchain's Tool."""
+
+    def __init__(self, name, description, fn, argument="query"):
+        self.name = name
+        self.description = description
+        self.fn = fn
+        self.argument = argument
+
+    def schema(self):
+        return {
+            "type": "function",
+            "function": {
+                "name": self.name,
+                "description": self.description,
+                "parameters": {
+                    "type": "object",
+                    "properties": {self.argument: {"type": "string"}},
+                    "required": [self.argument],
+                },
+            },
+        }
+
+
+def default_tools():
+    """The tools from tools.py; search and Wikipedia go through its ToolRunner (memo, dedup, timeouts)."""
+    import tools
+
+    return [
+        AgentTool(tools.search_tool.name, tools.search_tool.description, tools.search_tool.func),
+        AgentTool(tools.wiki_tool.name, tools.wiki_tool.description, tools.wiki_tool.func),
+        AgentTool(tools.save_tool.name, tools.save_tool.description, tools.save_tool.func, argument="data"),
+    ]
+
+
+def parse_arguments(tool, arguments):
+    """The string argument of a call from its JSON arguments."""
+    value = json.loads(arguments or "{}")
+    if isinstance(value, dict):
+        value = value.get(tool.argument, next(iter(value.values()), ""))
+    return str(value)
+
+
+class Agent:
+    """Runs the model/tool loop for one conversation at a time (thread-safe)."""
+
+    def __init__(self, tools=default_tools, model=MODEL, client=None, limiter=None,
+                 max_steps=MAX_STEPS, tool_timeout=TOOL_TIMEOUT, max_workers=MAX_WORKERS):
+        self._tools = tools  # A list, or a function returning one (called on first use)
+        self.tools_error = None
+        self.model = model
+        self.client = client
+        self.limiter = limiter
+        self.max_steps = max_steps
+        self.tool_timeout = tool_timeout
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="agent-tool")
+
+    @property
+    def tools(self):
+        with self._lock:
+            if callable(self._tools):
+                try:
+                    self._tools = {t.name: t for t in self._tools()}
+                except ImportError as e:
+                    # Without langchain the chat still works, just without tools
+                    self.tools_error = e
+                    self._tools = {}
+                    print(f"Agent: tools unavailable ({e})")
+            elif isinstance(self._tools, list):
+                self._tools = {t.name: t for t in self._tools}
+            return self._tools
+
+    def run(self, api_messages):
+        """Runs the loop to the end; returns (reply text, trace)."""
+        reply, trace = "", []
+        for event in self.run_iter(api_messages):
+            if event["type"] == "reply":
+                reply, trace = event["text"], event["trace"]
+        return reply, trace
+
+    def stream(self, api_messages):
+        """Yields the final answer's text as it streams in."""
+        for event in self.run_iter(api_messages, stream=True):
+            if event["type"] == "text":
+                yield event["text"]
+
+    def run_iter(self, api_messages, stream=False):
+        """Yields the loop's events as dicts, by "type":
+
+        tool_call   {"step", "id", "name", "query"}, when a step's calls start
+        tool_result {"step", "id", "name", "result", "ms"}, as each call finishes
+        step        {"step", "model_ms", "tools_ms", "ms"}, after each step
+        text        {"text"}, answer chunks (stream=True only)
+        reply       {"text", "trace"}, last: the answer and every step's timings
+        """
+        tools = self.tools
+        messages = list(api_messages)
+        trace = []
+        for step in range(self.max_steps):
+            step_start = time.perf_counter()
+            kwargs = {"model": self.model, "messages": messages}
+            if tools and step < self.max_steps - 1:
+                kwargs["tools"] = [t.schema() for t in tools.values()]
+            if stream:
+                content, tool_calls = yield from self._stream_step(kwargs)
+            else:
+                response = llm.create_completion(self.client, self.limiter, **kwargs)
+                telemetry.record_usage(getattr(response, "usage", None), self.model)
+                message = response.choices[0].message
+                content = message.content or ""
+                tool_calls = [{"id": c.id, "type": "function",
+                               "function": {"name": c.function.name, "arguments": c.function.arguments}}
+                              for c in message.tool_calls or ()]
+            model_ms = (time.perf_counter() - step_start) * 1000
+            telemetry.record("agent.model", model_ms / 1000, step=step, tool_calls=len(tool_calls))
+            entry = {"step": step, "model_ms": round(model_ms, 1), "calls": []}
+            trace.append(entry)
+
+            if not tool_calls:
+                entry["ms"] = entry["model_ms"]
+                yield {"type": "step", "step": step, "model_ms": entry["model_ms"], "tools_ms": 0.0, "ms": entry["ms"]}
+                yield {"type": "reply", "text": content.strip(), "trace": trace}
+                return
+
+            messages.append({"role": "assistant", "content": content or None, "tool_calls": tool_calls})
+            tools_start = time.perf_counter()
+            for event in self._run_calls(step, tools, tool_calls, entry):
+                if event["type"] == "tool_result":
+                    messages.append({"role": "tool", "tool_call_id": event["id"], "content": event["result"]})
+                yield event
+            entry["tools_ms"] = round((time.perf_counter() - tools_start) * 1000, 1)
+            telemetry.record("agent.tools", entry["tools_ms"] / 1000, step=step, calls=len(tool_calls))
+            entry["ms"] = round((time.perf_counter() - step_start) * 1000, 1)
+            yield {"type": "step", "step": step, "model_ms": entry["model_ms"], "tools_ms": entry["tools_ms"],
+                   "ms": entry["ms"]}
+
+    def _stream_step(self, kwargs):
+        """One streamed model call; yields text events, returns (content, tool_calls)."""
+        response = llm.create_completion(self.client, self.limiter, stream=True, **kwargs)
+        parts = []
+        calls = {}  # index -> call; names and arguments arrive in fragments
+        for chunk in response:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta
+            if delta.content:
+                parts.append(delta.content)
+                yield {"type": "text", "text": delta.content}
+            for fragment in getattr(delta, "tool_calls", None) or ():
+                call = calls.setdefault(fragment.index, {"id": None, "type": "function",
+                                                         "function": {"name": "", "arguments": ""}})
+                if fragment.id:
+                    call["id"] = fragment.id
+                if fragment.function is not None:
+                    call["function"]["name"] += fragment.function.name or ""
+                    call["function"]["arguments"] += fragment.function.arguments or ""
+        return "".join(parts), [calls[i] for i in sorted(calls)]
+
+    def _run_calls(self, step, tools, tool_calls, entry):
+        """Starts all of a step's calls at once; yields tool_call events, then results as they finish."""
+        futures = {}
+        for call in tool_calls:
+            name = call["function"]["name"]
+            tool = tools.get(name)
+            try:
+                if tool is None:
+                    raise LookupError(f"unknown tool {name!r}")
+                query = parse_arguments(tool, call["function"]["arguments"])
+            except (LookupError, ValueError) as e:
+                result = f"Error: {e}"
+                entry["calls"].append({"name": name, "query": None, "ms": 0.0, "error": True})
+                yield {"type": "tool_result", "step": step, "id": call["id"], "name": name, "result": result, "ms": 0.0}
+                continue
+            yield {"type": "tool_call", "step": step, "id": call["id"], "name": name, "query": query}
+            futures[self._pool.submit(tool.fn, query)] = (call["id"], name, query, time.perf_counter())
+
+        deadline = time.perf_counter() + self.tool_timeout
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, deadline - time.perf_counter()), return_when="FIRST_COMPLETED")
+            if not done:
+                break
+            for future in done:
+                yield self._result(step, entry, futures[future], future)
+        for future in pending:
+            future.cancel()
+            call_id, name, query, start = futures[future]
+            entry["calls"].append({"name": name, "query": query, "ms": round(self.tool_timeout * 1000, 1), "error": True})
+            yield {"type": "tool_result", "step": step, "id": call_id, "name": name,
+                   "result": f"Error: {name} timed out after {self.tool_timeout}s", "ms": self.tool_timeout * 1000}
+
+    def _result(self, step, entry, call, future):
+        call_id, name, query, start = call
+        ms = round((time.perf_counter() - start) * 1000, 1)
+        error = future.exception()
+        result = f"Error: {name} failed ({error})" if error is not None else str(future.result())[:MAX_RESULT_CHARS]
+        entry["calls"].append({"name": name, "query": query, "ms": ms, "error": error is not None})
+        return {"type": "tool_result", "step": step, "id": call_id, "name": name, "result": result, "ms": ms}
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
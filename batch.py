@@ -0,0 +1,187 @@
+"""Runs prompts from a JSONL file through the chat pipeline, without the GUI.
+
+Each input line is one conversation: {"prompt": "..."} (or "body"/"text"),
+or {"messages": ["first user turn", "second user turn", ...]}, optionally
+with "id" and "title". Every conversation becomes a chat and goes through
+the same ChatEngine steps as send_message in the GUIs: the message is
+saved, the context window is built, the reply cache is checked, and the
+model is called through llm.create_completion. Conversations run
+concurrently, up to --concurrency at a time; turns within one run in order.
+
+One JSONL result per turn is written to --output (stdout by default) as
+soon as it completes, and a throughput/latency summary goes to stderr.
+
+    python batch.py prompts.jsonl --concurrency 8 --output results.jsonl
+    python batch.py prompts.jsonl --base-url http://127.0.0.1:8000/v1   # local stub server
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import llm
+from chat_engine import ChatEngine, MODEL
+from chat_store import ChatStore
+from response_cache import ResponseCache
+from router import Router, openai_backend
+from telemetry import telemetry
+
+CONCURRENCY = 8
+PROMPT_FIELDS = ("prompt", "body", "text", "content")
+
+
+def read_conversations(lines):
+    """Parses JSONL lines into (id, title, [user turns]) tuples; blank lines are skipped."""
+    conversations = []
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        item = json.loads(line)
+        if isinstance(item, str):
+            item = {"prompt": item}
+        turns = item.get("messages")
+        if turns is None:
+            turns = [next((item[f] for f in PROMPT_FIELDS if f in item), None)]
+        turns = [t["content"] if isinstance(t, dict) else t for t in turns]
+        if not turns or not all(isinstance(t, str) and t.strip() for t in turns):
+            raise ValueError(f"line {number}: expected a prompt or a list of messages")
+        item_id = item.get("id", item.get("request_id", number))
+        title = item.get("title") or turns[0][:30]
+        conversations.append((item_id, title, turns))
+    return conversations
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return float("nan")
+    k = min(len(sorted_values) - 1, max(0, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+
+class BatchRunner:
+    """Runs conversations concurrently through a ChatEngine."""
+
+    def __init__(self, engine, concurrency=CONCURRENCY, output=sys.stdout):
+        self.engine = engine
+        self.concurrency = concurrency
+        self.output = output
+        self.latencies = []
+        self.errors = 0
+        self.cached = 0
+        self._output_lock = threading.Lock()
+
+    def run(self, conversations):
+        """Runs every conversation; returns the summary dict."""
+        start = time.perf_counter()
+        with ThreadPoolExecutor(self.concurrency, thread_name_prefix="batch") as pool:
+            for future in [pool.submit(self._run_conversation, *c) for c in conversations]:
+                future.result()
+        return self.summary(time.perf_counter() - start)
+
+    def _run_conversation(self, item_id, title, turns):
+        chat = self.engine.new_chat(title)
+        for turn, prompt in enumerate(turns):
+            self._run_turn(item_id, chat, turn, prompt)
+
+    def _run_turn(self, item_id, chat, turn, prompt):
+        start = time.perf_counter()
+        self.engine.add_user_message(chat, prompt)
+        api_messages = self.engine.build_request(chat)
+
+        error = None
+        reply = self.engine.cached_reply(api_messages)
+        cached = reply is not None
+        if not cached:
+            try:
+                reply = self.engine.request_reply(api_messages)
+            except Exception as e:
+                error = str(e)
+                reply = e
+        latency = time.perf_counter() - start
+
+        self.engine.add_reply(chat, reply)
+        result = {"id": item_id, "turn": turn, "chat_id": chat["id"], "reply": None if error else reply,
+                  "error": error, "cached": cached, "latency_ms": round(latency * 1000, 1)}
+        with self._output_lock:
+            if error:
+                self.errors += 1
+            else:
+                self.latencies.append(latency)
+                self.cached += cached
+            self.output.write(json.dumps(result, ensure_ascii=False) + "\n")
+            self.output.flush()
+
+    def summary(self, elapsed):
+        latencies = sorted(self.latencies)
+        completed = len(latencies)
+        return {
+            "turns": completed + self.errors,
+            "errors": self.errors,
+            "cached": self.cached,
+            "seconds": round(elapsed, 3),
+            "turns_per_second": round(completed / elapsed, 2) if elapsed else 0.0,
+            "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+            "p90_ms": round(percentile(latencies, 90) * 1000, 1),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+            "max_ms": round(latencies[-1] * 1000, 1) if latencies else float("nan"),
+            "mean_ms": round(statistics.mean(latencies) * 1000, 1) if latencies else float("nan"),
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run JSONL prompts through the chat pipeline without the GUI.")
+    parser.add_argument("input", help="JSONL file of prompts or conversations ('-' for stdin)")
+    parser.add_argument("--output", default="-", help="JSONL results file (default: stdout)")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    parser.add_argument("--model", default=MODEL)
+    parser.add_argument("--fallback-model", action="append", default=[],
+                        help="route through these models as well, fastest healthy first, with hedging (repeatable)")
+    parser.add_argument("--db", default=":memory:", help="chat store to save the conversations in (default: not saved)")
+    parser.add_argument("--base-url", help="OpenAI-compatible endpoint, e.g. a local stub server")
+    parser.add_argument("--api-key", help="defaults to OPENAI_API_KEY")
+    parser.add_argument("--cache", action="store_true", help="reuse and store replies in the response cache")
+    parser.add_argument("--telemetry", help="JSONL file for per-phase timings and token counts")
+    parser.add_argument("--metrics-port", type=int, help="serve Prometheus metrics on this local port while running")
+    args = parser.parse_args(argv)
+
+    if args.input == "-":
+        conversations = read_conversations(sys.stdin)
+    else:
+        with open(args.input, encoding="utf-8") as f:
+            conversations = read_conversations(f)
+
+    client = None  # The shared client from llm.get_client()
+    if args.base_url:
+        # Local stub servers don't check the key, but the client insists on one
+        client = llm.build_client(base_url=args.base_url, api_key=args.api_key or os.getenv("OPENAI_API_KEY") or "local")
+    elif args.api_key:
+        client = llm.build_client(api_key=args.api_key)
+
+    response_cache = ResponseCache() if args.cache else None
+    telemetry.configure(args.telemetry, args.metrics_port)
+
+    router = None
+    if args.fallback_model:
+        router = Router([openai_backend(model, client) for model in [args.model] + args.fallback_model])
+
+    output = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    engine = ChatEngine(ChatStore(args.db), args.model, response_cache=response_cache, client=client,
+                        router=router)
+    try:
+        summary = BatchRunner(engine, args.concurrency, output).run(conversations)
+    finally:
+        engine.close()
+        telemetry.close()
+        if output is not sys.stdout:
+            output.close()
+
+    print(json.dumps(summary), file=sys.stderr)
+    return 1 if summary["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+"""Agent loop with fake tools and a scripted model: parallel vs. serial tool steps.
+
+The scripted model asks for several lookups in one step, then for one more,
+then answers. Fake tools sleep for fixed latencies; one fails and one never
+returns within the timeout. Prints the time of each step and its tools, of
+the same calls made one after another, and of a step with a failing and a
+stuck tool. tests/test_agent.py checks the behavior. Run with
+`python -m benchmarks.bench_agent`.
+"""
+import argparse
+import time
+
+from agent import Agent, AgentTool
+from benchmarks.common import ScriptedClient
+from llm import RateLimiter
+
+MESSAGES = [{"role": "user", "content": "Compare the populations of Lisbon, Porto and Madrid."}]
+
+
+def fake_tool(name, latency, fail=False):
+    def run(query):
+        time.sleep(latency)
+        if fail:
+            raise ConnectionError("backend unreachable")
+        return f"{name} result for {query!r}"
+    return AgentTool(name, f"Fake {name} tool", run)
+
+
+def make_tools(latencies):
+    return [fake_tool(name, latency) for name, latency in latencies.items()] + [
+        fake_tool("broken", 0.01, fail=True),
+        fake_tool("stuck", 2.0),  # Past the timeout; short so the process can exit
+    ]
+
+
+def make_script(calls):
+    return [
+        {"tool_calls": calls},
+        {"tool_calls": [("search", "Madrid population 2024")]},
+        {"content": "Madrid is the largest of the three."},
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=6, help="tool calls in the first step")
+    parser.add_argument("--tool-latency", type=float, default=0.3, help="latency of the slowest tool")
+    parser.add_argument("--model-latency", type=float, default=0.05)
+    args = parser.parse_args()
+    latencies = {"search": args.tool_latency, "wikipedia": args.tool_latency / 2}
+    names = list(latencies)
+    calls = [(names[i % len(names)], f"query {i}") for i in range(args.calls)]
+    limiter = RateLimiter(None, None)
+
+    # Serial baseline: the same calls, one after another
+    tools = {t.name: t for t in make_tools(latencies)}
+    start = time.perf_counter()
+    for name, query in calls:
+        tools[name].fn(query)
+    serial_ms = (time.perf_counter() - start) * 1000
+
+    client = ScriptedClient(make_script(calls), args.model_latency)
+    agent = Agent(make_tools(latencies), model="scripted", client=client, limiter=limiter, tool_timeout=2.0)
+    reply, trace = agent.run(MESSAGES)
+    for entry in trace:
+        slowest = max((c["ms"] for c in entry["calls"]), default=0.0)
+        print(f"  step {entry['step']}: model {entry['model_ms']:6.1f} ms, tools {entry.get('tools_ms', 0.0):6.1f} ms "
+              f"({len(entry['calls'])} calls, slowest {slowest:.1f} ms)")
+    first = trace[0]
+    print(f"  first step tools: parallel {first['tools_ms']:.1f} ms vs. serial {serial_ms:.1f} ms "
+          f"(slowest tool {args.tool_latency * 1000:.0f} ms)")
+    agent.shutdown()
+
+    # A failing tool and a stuck one: the step still ends at the timeout
+    client = ScriptedClient(make_script([("broken", "x"), ("stuck", "y"), ("nonexistent", "z"), ("search", "w")]),
+                            args.model_latency)
+    agent = Agent(make_tools(latencies), model="scripted", client=client, limiter=limiter, tool_timeout=0.5)
+    reply, trace = agent.run(MESSAGES)
+    results = {m["tool_call_id"]: m["content"] for m in client.chat.completions.requests[1] if m["role"] == "tool"}
+    print(f"  failure step: tools {trace[0]['tools_ms']:.1f} ms (timeout {agent.tool_timeout * 1000:.0f} ms); "
+          + "; ".join(results.values())[:200])
+    agent.shutdown()
+
+    # Streaming: tool calls arrive in fragments, the answer as text chunks
+    client = ScriptedClient(make_script(calls), args.model_latency)
+    agent = Agent(make_tools(latencies), model="scripted", client=client, limiter=limiter)
+    start = time.perf_counter()
+    parts = agent.stream(MESSAGES)
+    next(parts)
+    first_ms = (time.perf_counter() - start) * 1000
+    "".join(parts)
+    print(f"  streamed: first chunk of the answer after {first_ms:.1f} ms, "
+          f"done after {(time.perf_counter() - start) * 1000:.1f} ms")
+    agent.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""Headless batch throughput at several concurrency levels, against the local mock server.
+
+Run with `python -m benchmarks.bench_batch [--prompts 200]`.
+"""
+import argparse
+import io
+
+import llm
+from batch import BatchRunner
+from benchmarks.mock_server import MockServer
+from chat_engine import ChatEngine
+from chat_store import ChatStore
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--prompts", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.1)
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 4, 16, 32])
+    args = parser.parse_args()
+
+    conversations = [(i, f"prompt {i}", [f"Question number {i}: what is {i} squared?"]) for i in range(args.prompts)]
+    with MockServer(latency=args.latency, rate_limit_rate=0.05, retry_after=0.05, seed=0) as server:
+        client = llm.build_client(base_url=server.base_url, api_key="test")
+        for concurrency in args.levels:
+            # No client-side rate limit, so the levels don't throttle each other
+            limiter = llm.RateLimiter(requests_per_minute=None, tokens_per_minute=None)
+            engine = ChatEngine(ChatStore(":memory:"), client=client, limiter=limiter)
+            s = BatchRunner(engine, concurrency, io.StringIO()).run(conversations)
+            engine.close()
+            print(f"concurrency {concurrency:3d}: {s['turns_per_second']:7.1f} turns/s, "
+                  f"p50 {s['p50_ms']:7.1f} ms, p90 {s['p90_ms']:7.1f} ms, p99 {s['p99_ms']:7.1f} ms, {s['errors']} errors")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Response cache: latency of hits vs. misses against a local stub client.
+
+Replays a prompt mix where common openers ("hello", "what is your goal")
+repeat, the way they do in real chat histories.
+Run with `python -m benchmarks.bench_cache`.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.common import FakeClient
+from response_cache import ResponseCache
+
+OPENERS = ["hello", "what is your goal", "tell me about cnss", "Hello ", "what is  your goal"]
+
+
+def ask(client, cache, model, api_messages):
+    reply = cache.get(model, api_messages)
+    if reply is None:
+        response = client.chat.completions.create(model=model, messages=api_messages)
+        reply = response.choices[0].message.content
+        cache.put(model, api_messages, reply)
+    return reply
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--prompts", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05, help="stub API latency in seconds")
+    args = parser.parse_args()
+
+    random.seed(0)
+    prompts = [random.choice(OPENERS) if random.random() < 0.7 else f"unique question {i}" for i in range(args.prompts)]
+    client = FakeClient(args.latency)
+
+    with tempfile.TemporaryDirectory() as directory:
+        cache = ResponseCache(os.path.join(directory, "response_cache.db"))
+        cache.enable("fake")
+        hit_times, miss_times = [], []
+        for prompt in prompts:
+            calls_before = client.chat.completions.calls
+            start = time.perf_counter()
+            ask(client, cache, "fake", [{"role": "user", "content": prompt}])
+            elapsed = (time.perf_counter() - start) * 1000
+            (miss_times if client.chat.completions.calls > calls_before else hit_times).append(elapsed)
+        stats = cache.stats()
+        cache.close()
+
+    print(f"hits:   {stats['hits']:4d}, mean {sum(hit_times) / max(1, len(hit_times)):7.3f} ms")
+    print(f"misses: {stats['misses']:4d}, mean {sum(miss_times) / max(1, len(miss_times)):7.3f} ms")
+    print(f"hit rate {stats['hit_rate']:.0%}, {stats['entries']} entries, "
+          f"{client.chat.completions.calls} API calls for {len(prompts)} prompts")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Shared pooled client with retries vs. a bare client, against the local mock server.
+
+The mock answers a share of requests with 429 (with Retry-After) and 500.
+Reports user-visible failures, latency percentiles and how many TCP
+connections each client opened. Run with `python -m benchmarks.bench_client`.
+"""
+import argparse
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import openai
+
+import llm
+from benchmarks.mock_server import MockServer
+
+MESSAGES = [{"role": "user", "content": "Summarize the plot of Hamlet in two sentences."}]
+
+
+def run_load(call, n_requests, concurrency):
+    """Runs call() n_requests times from concurrency threads; returns (latencies, failures, seconds)."""
+    def timed(_):
+        start = time.perf_counter()
+        try:
+            call()
+            return time.perf_counter() - start, None
+        except Exception as e:
+            return time.perf_counter() - start, e
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(timed, range(n_requests)))
+    elapsed = time.perf_counter() - start
+    latencies = sorted(t for t, error in results if error is None)
+    return latencies, sum(error is not None for _, error in results), elapsed
+
+
+def report(label, server, latencies, failures, elapsed):
+    if latencies:
+        p50 = statistics.median(latencies) * 1000
+        p95 = latencies[int(len(latencies) * 0.95) - 1] * 1000 if len(latencies) > 1 else p50
+    else:
+        p50 = p95 = float("nan")
+    stats = server.stats
+    print(f"{label:22} failed {failures:4d}, p50 {p50:7.1f} ms, p95 {p95:7.1f} ms, "
+          f"{elapsed:5.2f} s, {stats.requests} HTTP requests, {stats.connections} connections")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.2)
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    parser.add_argument("--latency", type=float, default=0.03)
+    args = parser.parse_args()
+    config = dict(latency=args.latency, rate_limit_rate=args.rate_limit_rate, error_rate=args.error_rate,
+                  retry_after=0.05, seed=0)
+
+    with MockServer(**config) as server:
+        # What the GUIs did before: a default client, one attempt per message
+        bare = openai.OpenAI(base_url=server.base_url, api_key="test", max_retries=0)
+        results = run_load(lambda: bare.chat.completions.create(model="mock", messages=MESSAGES),
+                           args.requests, args.concurrency)
+        report("bare client", server, *results)
+
+    with MockServer(**config) as server:
+        client = llm.build_client(base_url=server.base_url, api_key="test")
+        limiter = llm.RateLimiter()
+        results = run_load(lambda: llm.create_completion(client, limiter, model="mock", messages=MESSAGES),
+                           args.requests, args.concurrency)
+        report("create_completion", server, *results)
+
+    with MockServer(latency=0.0) as server:
+        client = llm.build_client(base_url=server.base_url, api_key="test")
+        rpm = 600
+        limiter = llm.RateLimiter(requests_per_minute=rpm, tokens_per_minute=None)
+        limiter.requests.take(rpm)  # Start from an empty bucket to show the steady-state rate
+        n = 50
+        start = time.perf_counter()
+        run_load(lambda: llm.create_completion(client, limiter, model="mock", messages=MESSAGES), n, args.concurrency)
+        elapsed = time.perf_counter() - start
+        print(f"rate limiter at {rpm} rpm: {n} requests in {elapsed:.2f} s ({n / elapsed * 60:.0f} rpm)")
+
+
+if __name__ == "__main__":
+    main()
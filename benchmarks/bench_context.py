@@ -0,0 +1,48 @@
+"""Payload size and request latency as a chat grows: full history vs. ContextWindow.
+
+Latency comes from a fake model that charges a fixed round trip plus a
+per-token cost for the prompt, which is how real APIs scale with input size.
+Run with `python -m benchmarks.bench_context`.
+"""
+import argparse
+import json
+import time
+
+from chat_store import Message
+from context import ContextWindow, count_tokens
+
+BASE_LATENCY_MS = 300
+PER_TOKEN_MS = 0.05
+
+
+def simulated_latency_ms(api_messages):
+    return BASE_LATENCY_MS + PER_TOKEN_MS * sum(count_tokens(m["content"]) for m in api_messages)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=10000)
+    parser.add_argument("--max-tokens", type=int, default=3000)
+    args = parser.parse_args()
+
+    context = ContextWindow(max_tokens=args.max_tokens, system_prompt="You are a helpful assistant.")
+    messages = []
+    checkpoints = {10, 100, 1000, 5000, args.turns}
+
+    print(f"{'messages':>9} {'full KB':>9} {'full ms':>9} {'window KB':>10} {'window ms':>10} {'build us':>9}")
+    for turn in range(1, args.turns + 1):
+        role = "user" if turn % 2 else "assistant"
+        messages.append(Message(role, f"turn {turn}: " + "some words about the topic " * (turn % 9 + 3)))
+
+        start = time.perf_counter()
+        windowed = context.build("bench", messages)
+        build_us = (time.perf_counter() - start) * 1e6
+
+        if turn in checkpoints:
+            full = [{"role": m.role, "content": m.text} for m in messages]
+            print(f"{turn:>9} {len(json.dumps(full)) / 1024:>9.1f} {simulated_latency_ms(full):>9.0f} "
+                  f"{len(json.dumps(windowed)) / 1024:>10.1f} {simulated_latency_ms(windowed):>10.0f} {build_us:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
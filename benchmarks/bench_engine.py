@@ -0,0 +1,88 @@
+"""ChatEngine microbenchmarks: record size, append, render feed, persist/load, async send.
+
+Compares Message records with the {"role", "text", "time"} dicts they
+replaced. Runs without a display or network. Run with
+`python -m benchmarks.bench_engine [--messages 100000]`.
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+from benchmarks.common import FakeClient
+from chat_engine import ChatEngine
+from chat_store import ChatStore, Message
+from llm import RateLimiter
+
+
+def measure_memory(build):
+    tracemalloc.start()
+    records = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return records, size
+
+
+def per_op_us(fn, n):
+    start = time.perf_counter()
+    fn()
+    return (time.perf_counter() - start) / n * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=100_000)
+    parser.add_argument("--sends", type=int, default=200)
+    args = parser.parse_args()
+    n = args.messages
+    texts = [f"message {i} " + "lorem ipsum " * (i % 7 + 1) for i in range(n)]
+    now = int(time.time())
+
+    # Record size: texts are shared, so this is the per-message overhead
+    dicts, dict_bytes = measure_memory(lambda: [
+        {"role": "user" if i % 2 == 0 else "assistant", "text": texts[i],
+         "time": datetime.fromtimestamp(now + i).strftime("%H:%M")} for i in range(n)
+    ])
+    records, record_bytes = measure_memory(lambda: [
+        Message("user" if i % 2 == 0 else "assistant", texts[i], now + i) for i in range(n)
+    ])
+    print(f"record overhead:  dict {dict_bytes / n:6.0f} B/message, Message {record_bytes / n:6.0f} B/message")
+
+    # Render feed: what the views read per bubble
+    dict_feed = per_op_us(lambda: [(d["role"] == "user", f"{d['text']}\n({d['time']})") for d in dicts], n)
+    record_feed = per_op_us(lambda: [(m.role == "user", f"{m.text}\n({m.time})") for m in records], n)
+    print(f"render feed:      dict {dict_feed:6.2f} us/message, Message {record_feed:6.2f} us/message")
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine = ChatEngine(ChatStore(os.path.join(directory, "chat_history.db")))
+        chat = engine.new_chat("bench")
+        appends = min(n, 20_000)
+        append_us = per_op_us(lambda: [engine.add_user_message(chat, texts[i]) for i in range(appends)], appends)
+        print(f"append + persist: {append_us:6.1f} us/message (engine.add_user_message, WAL)")
+
+        engine.store._cache.clear()
+        load_us = per_op_us(lambda: engine.messages(chat), appends)
+        print(f"load chat:        {load_us:6.2f} us/message ({appends} messages, cold)")
+        engine.close()
+
+    # Async round trips against a stub client with 50 ms latency
+    engine = ChatEngine(ChatStore(":memory:"), client=FakeClient(latency=0.05),
+                        limiter=RateLimiter(requests_per_minute=None, tokens_per_minute=None))
+
+    async def send_all():
+        chats = [engine.new_chat(f"chat {i}") for i in range(args.sends)]
+        await asyncio.gather(*(engine.send(c, "hello there") for c in chats))
+
+    start = time.perf_counter()
+    asyncio.run(send_all())
+    elapsed = time.perf_counter() - start
+    print(f"async send:       {args.sends} concurrent sends in {elapsed:.2f} s "
+          f"({args.sends / elapsed:.0f}/s with a 50 ms stub model)")
+    engine.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Cold-start time and memory: json.load of the whole history vs. ChatStore's title index.
+
+Each startup is measured in a fresh interpreter. Run with
+`python -m benchmarks.bench_lazy [--chats 1000 --messages 500]`.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from chat_store import ChatStore, Message
+
+JSON_STARTUP = """
+import json, resource, sys, time
+start = time.perf_counter()
+with open(sys.argv[1]) as f:
+    chat_history = json.load(f)
+titles = [chat["title"] for chat in chat_history]
+elapsed = time.perf_counter() - start
+print(elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+STORE_STARTUP = """
+import resource, sys, time
+start = time.perf_counter()
+from chat_store import ChatStore
+store = ChatStore(sys.argv[1])
+chat_history = store.load_index()
+titles = [chat["title"] for chat in chat_history]
+elapsed = time.perf_counter() - start
+open_start = time.perf_counter()
+store.get_messages(chat_history[len(chat_history) // 2])
+open_elapsed = time.perf_counter() - open_start
+print(elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, open_elapsed)
+"""
+
+
+def build_history(directory, n_chats, per_chat):
+    """Writes the same synthetic history as chat_history.json and as a ChatStore."""
+    text = "lorem ipsum dolor sit amet " * 4
+    store = ChatStore(os.path.join(directory, "chat_history.db"))
+    json_path = os.path.join(directory, "chat_history.json")
+    with open(json_path, "w") as f:
+        f.write("[")
+        for i in range(n_chats):
+            messages = [
+                {"role": "user" if j % 2 == 0 else "assistant", "text": f"{j} {text}", "time": "12:00"}
+                for j in range(per_chat)
+            ]
+            store.add_chat({"title": f"chat {i}"}, [Message.from_dict(m) for m in messages])
+            if i:
+                f.write(",")
+            json.dump({"title": f"chat {i}", "messages": messages}, f, indent=2)
+        f.write("]")
+    store.close()
+    return json_path, store.path
+
+
+def run(script, path):
+    repo = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    out = subprocess.run([sys.executable, "-c", script, path], capture_output=True, text=True, check=True, cwd=repo)
+    return [float(x) for x in out.stdout.split()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chats", type=int, default=1000)
+    parser.add_argument("--messages", type=int, default=500, help="messages per chat")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"building {args.chats} chats x {args.messages} messages...")
+        json_path, db_path = build_history(directory, args.chats, args.messages)
+
+        elapsed, rss_kb = run(JSON_STARTUP, json_path)
+        print(f"json.load:   startup {elapsed * 1000:8.1f} ms, peak RSS {rss_kb / 1024:7.1f} MB")
+        elapsed, rss_kb, open_elapsed = run(STORE_STARTUP, db_path)
+        print(f"title index: startup {elapsed * 1000:8.1f} ms, peak RSS {rss_kb / 1024:7.1f} MB, "
+              f"first load_chat {open_elapsed * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Semantic memory: filling it from an archive, and search latency up to 1M remembered messages.
+
+First times how long ChatEngine takes to start with a memory attached and
+to fill it from an archive in the background. Then fills a memory with
+synthetic clustered vectors and times search (single queries and batches
+of 8) as it grows, including the exact full scan at the largest size for
+comparison, and the recall of the sketch-and-rescore path against it.
+Writes ~1.3 GB to a temporary directory at 1M rows. tests/test_memory.py
+checks what is recalled. Run with `python -m benchmarks.bench_memory`.
+"""
+import argparse
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from chat_engine import ChatEngine
+from chat_store import ChatStore, Message
+from memory import DIM, Memory, normalize
+
+TARGET_MS = 50
+CLUSTERS = 2000
+
+
+class SyntheticEmbedder:
+    """Clustered random unit vectors for bulk filling; a text registered with query() maps to its vector."""
+
+    dim = DIM
+
+    def __init__(self, seed=0):
+        self.random = np.random.default_rng(seed)
+        self.centers = normalize(self.random.standard_normal((CLUSTERS, DIM)).astype(np.float32))
+        self.queries = {}
+
+    def query(self, text, vector):
+        self.queries[text] = vector
+        return text
+
+    def __call__(self, texts):
+        if texts and texts[0] in self.queries:
+            return np.stack([self.queries[text] for text in texts])
+        centers = self.centers[self.random.integers(0, CLUSTERS, len(texts))]
+        return normalize(centers + self.random.standard_normal(centers.shape).astype(np.float32) * 0.08)
+
+
+def time_backfill(directory, chats):
+    store = ChatStore(":memory:")
+    for i in range(chats):
+        store.add_chat({"title": f"chat {i}"}, [
+            Message("user", f"Can you help me plan the weekend trip number {i} to the mountains?"),
+            Message("assistant", f"Sure, for trip {i} pack warm clothes and check the weather forecast first."),
+        ])
+    start = time.perf_counter()
+    engine = ChatEngine(store, "none", memory=Memory(directory))
+    ready_ms = (time.perf_counter() - start) * 1000
+    engine.wait_for_memory()
+    print(f"{chats} chats: engine ready in {ready_ms:.1f} ms; archive remembered in the background after "
+          f"{(time.perf_counter() - start) * 1000:.1f} ms")
+    engine.close()
+
+
+def timed(memory, texts, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        memory.search(texts)
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times), max(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--add-messages", type=int, default=5000, help="messages added one by one for add cost")
+    parser.add_argument("--archive-chats", type=int, default=1000, help="chats remembered in the background")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        time_backfill(f"{directory}/backfill", args.archive_chats)
+
+        memory = Memory(f"{directory}/real")
+        filler = [Message("user", f"message {i} about the quarterly report and the budget for project {i % 97}")
+                  for i in range(args.add_messages)]
+        start = time.perf_counter()
+        for i, msg in enumerate(filler):
+            memory.add(i % 20, [msg])
+        print(f"add, one message at a time: {(time.perf_counter() - start) / len(filler) * 1e6:.0f} us")
+        memory.close()
+
+        embed = SyntheticEmbedder()
+        memory = Memory(f"{directory}/synthetic", embed)
+        random = np.random.default_rng(1)
+        print(f"{'rows':>9} {'path':>7} {'1 query p50/max ms':>20} {'8 queries p50/max ms':>22}")
+        for size in sorted(args.sizes):
+            while len(memory) < size:
+                batch = min(50_000, size - len(memory))
+                memory.add(len(memory) // 1000, [Message("user", "x" * 20)] * batch)
+            # Near-duplicates of stored rows, as a rephrased question would be
+            targets = random.integers(0, size, args.queries)
+            queries = [embed.query(f"q{size}-{i}", normalize(
+                memory.vectors[t][None] + random.standard_normal((1, DIM)).astype(np.float32) * 0.05)[0])
+                       for i, t in enumerate(targets)]
+            path = "exact" if size <= memory.exact_rows else "sketch"
+            single = statistics.median(timed(memory, [q], 1)[0] for q in queries)
+            worst = max(timed(memory, [q], 1)[0] for q in queries[:10])
+            batch = timed(memory, queries[:8], 5)
+            print(f"{size:9d} {path:>7} {single:9.1f} / {worst:8.1f} {batch[0]:11.1f} / {batch[1]:8.1f}")
+
+        exact = Memory(f"{directory}/synthetic", embed, exact_rows=len(memory) + 1)
+        exact_ms = statistics.median(timed(exact, [q], 1)[0] for q in queries[:10])
+        found = sum(abs(memory.search([q], min_score=-1)[0][0]["score"] - exact.search([q], min_score=-1)[0][0]["score"])
+                    < 1e-5 for q in queries)
+        print(f"{len(memory):9d} {'exact':>7} {exact_ms:9.1f}")
+        print(f"search at {len(memory)} rows: {single:.1f} ms (target {TARGET_MS}), top-1 same as the exact scan for "
+              f"{found}/{len(queries)} queries")
+        exact.close()
+        memory.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Render time and widget count vs. chat length: rebuilding every bubble vs. MessageList.
+
+Needs a display; on a headless machine run it under a virtual one, e.g.
+`xvfb-run python -m benchmarks.bench_render`.
+"""
+import argparse
+import time
+import tkinter
+
+import customtkinter as ctk
+
+from chat_store import Message
+from views import MessageList
+
+
+def synthetic_messages(n):
+    return [
+        Message("user" if i % 2 == 0 else "assistant", f"message {i} " + "lorem ipsum " * (i % 7 + 1))
+        for i in range(n)
+    ]
+
+
+def count_widgets(widget):
+    return sum(1 + count_widgets(child) for child in widget.winfo_children())
+
+
+def rebuild_all(frame, messages):
+    """What gui_tkinter.load_chat used to do: destroy everything, build 3-4 widgets per message."""
+    for widget in frame.winfo_children():
+        widget.destroy()
+    for msg in messages:
+        if msg.role == "user":
+            container = ctk.CTkFrame(frame, fg_color="transparent")
+            container.pack(fill="x", pady=5)
+            bubble = ctk.CTkFrame(container, fg_color="#DCF8C6", corner_radius=10)
+            bubble.pack(side="right", padx=(220, 10), pady=2, anchor="e")
+        else:
+            bubble = ctk.CTkFrame(frame, fg_color="#FFFFFF", corner_radius=10)
+            bubble.pack(side="top", fill="x", padx=(10, 220), pady=5, anchor="w")
+        ctk.CTkLabel(bubble, text=msg.text, font=("Arial", 12), justify="left").pack(padx=10, pady=(5, 0), anchor="w")
+        ctk.CTkLabel(bubble, text=msg.time, font=("Arial", 8)).pack(padx=10, pady=(0, 5), anchor="e")
+
+
+def timed(root, fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    root.update()
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 500, 1000])
+    args = parser.parse_args()
+
+    try:
+        root = ctk.CTk()
+    except tkinter.TclError as e:
+        raise SystemExit(f"No display available ({e}); run under xvfb-run.")
+    root.geometry("900x600")
+    root.grid_columnconfigure(0, weight=1)
+    root.grid_rowconfigure(0, weight=1)
+
+    scrollable = ctk.CTkScrollableFrame(root)
+    message_list = MessageList(root)
+    root.update()
+
+    print(f"{'messages':>9} {'rebuild ms':>11} {'widgets':>8} {'virtual ms':>11} {'widgets':>8} {'append ms':>10}")
+    for n in args.sizes:
+        messages = synthetic_messages(n)
+
+        message_list.grid_forget()
+        scrollable.grid(row=0, column=0, sticky="nsew")
+        rebuild_ms = timed(root, rebuild_all, scrollable, messages)
+        rebuild_widgets = count_widgets(scrollable)
+        rebuild_all(scrollable, [])
+
+        scrollable.grid_forget()
+        message_list.grid(row=0, column=0, sticky="nsew")
+        root.update()
+        virtual_ms = timed(root, message_list.show, messages)
+        virtual_widgets = count_widgets(message_list.viewport)
+        append_ms = timed(root, message_list.append, Message("user", "one more"))
+
+        print(f"{n:>9} {rebuild_ms:>11.1f} {rebuild_widgets:>8} {virtual_ms:>11.1f} {virtual_widgets:>8} {append_ms:>10.1f}")
+
+    root.destroy()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""Router over simulated backends: tail latency with hedging, failover, and picking the fastest.
+
+Each simulated backend draws its time to first chunk from a log-normal
+distribution plus an occasional stall, can be switched into an outage
+(every request fails), and stops early when the router cancels it. Every
+scenario prints its numbers and a PASS or FAIL against the expected
+outcome; the exit status is 1 if any check failed. The checks are only
+dependable at the default --requests. tests/test_router.py runs the same
+scenarios with fixed latencies. Run with `python -m benchmarks.bench_router`.
+"""
+import argparse
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import router
+from router import Backend, Router
+
+MESSAGES = [{"role": "user", "content": "Summarize the plot of Hamlet in two sentences."}]
+CHUNKS = 5
+CHUNK_INTERVAL = 0.002
+
+
+def lognormal(median, stall_rate=0.0, stall=1.0, seed=0):
+    """Times to first chunk around median, with stall added to a stall_rate share of calls."""
+    rng = random.Random(seed)
+
+    def latency(call):
+        delay = median * rng.lognormvariate(0, 0.25)
+        return delay + stall if rng.random() < stall_rate else delay
+
+    return latency
+
+
+class SimulatedBackend:
+    """Latency and outages of one fake provider, behind a router Backend.
+
+    latency(call) is the time to first chunk of the backend's call-th call,
+    counting from 0.
+    """
+
+    def __init__(self, name, latency):
+        self.latency = latency
+        self.down = False
+        self.calls = 0
+        self.cancelled = 0
+        self._lock = threading.Lock()
+        self.backend = Backend(name, self.stream)
+
+    def stream(self, api_messages, cancel):
+        with self._lock:
+            delay = self.latency(self.calls)
+            self.calls += 1
+        if self.down:
+            time.sleep(delay / 4)  # Errors come back faster than replies
+            raise ConnectionError(f"{self.backend.name} is down")
+        # Waits like a socket read would; a cancelled request stops here
+        if cancel.wait(delay):
+            with self._lock:
+                self.cancelled += 1
+            raise router.Cancelled()
+        for i in range(CHUNKS):
+            if cancel.is_set():
+                raise router.Cancelled()
+            yield f"chunk {i} "
+            time.sleep(CHUNK_INTERVAL)
+
+
+def run_load(route, n_requests, concurrency, during=None):
+    """Sends n_requests through route; returns (sorted latencies, failures). during(i) runs before request i."""
+    def one(i):
+        if during is not None:
+            during(i)
+        start = time.perf_counter()
+        try:
+            route.complete(MESSAGES)
+            return time.perf_counter() - start
+        except Exception:
+            return None
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(one, range(n_requests)))
+    return sorted(t for t in results if t is not None), sum(t is None for t in results)
+
+
+def pct(latencies, p):
+    return router.percentile(latencies, p) * 1000 if latencies else float("nan")
+
+
+def check(label, ok):
+    print(f"  {'PASS' if ok else 'FAIL'}  {label}")
+    return ok
+
+
+def tail_latency(args):
+    print("tail latency: two backends, 5% of requests stall for 1 s")
+    results = {}
+    for label, hedge in (("single backend", None), ("router, no hedging", False), ("router, hedging", True)):
+        a = SimulatedBackend("a", lognormal(0.05, stall_rate=0.05, seed=1))
+        b = SimulatedBackend("b", lognormal(0.07, stall_rate=0.05, seed=2))
+        route = Router([a.backend] if hedge is None else [a.backend, b.backend], hedge=bool(hedge))
+        latencies, failures = run_load(route, args.requests, args.concurrency)
+        extra = (a.calls + b.calls) / args.requests - 1
+        results[label] = latencies
+        print(f"  {label:20} p50 {pct(latencies, 50):7.1f} ms, p95 {pct(latencies, 95):7.1f} ms, "
+              f"p99 {pct(latencies, 99):7.1f} ms, failed {failures}, hedged {route.hedges}, "
+              f"extra calls {extra:5.1%}, losers cancelled {a.cancelled + b.cancelled}")
+        route.shutdown()
+    single, hedged = results["single backend"], results["router, hedging"]
+    ok = check("hedging cuts p99 by more than half", pct(hedged, 99) < pct(single, 99) / 2)
+    return check("hedging keeps p50 within 20%", pct(hedged, 50) < pct(single, 50) * 1.2) and ok
+
+
+def failover(args):
+    print("failover: the primary is down for the middle third of the requests")
+    ok = True
+    for label, backends in (("single backend", 1), ("router", 2)):
+        a = SimulatedBackend("a", lognormal(0.03, seed=3))
+        b = SimulatedBackend("b", lognormal(0.05, seed=4))
+        route = Router([a.backend, b.backend][:backends])
+        third = args.requests // 3
+
+        def during(i):
+            a.down = third <= i < 2 * third
+
+        latencies, failures = run_load(route, args.requests, args.concurrency, during)
+        print(f"  {label:20} failed {failures:4d}, p50 {pct(latencies, 50):7.1f} ms, "
+              f"p99 {pct(latencies, 99):7.1f} ms, calls to a {a.calls}, to b {b.calls}, "
+              f"failovers {route.failovers}")
+        if backends == 2:
+            ok = check("no request fails while one backend is up", failures == 0)
+            # The breaker opens after a few failures, so most outage traffic skips a
+            ok = check("breaker keeps the outage from doubling the calls", a.calls < args.requests * 0.8) and ok
+            ok = check("traffic returns to the primary after the cooldown",
+                       route.ranked()[0] is a.backend) and ok
+        route.shutdown()
+    return ok
+
+
+def fastest(args):
+    print("selection: the configured primary is four times slower than the fallback")
+    slow = SimulatedBackend("slow", lognormal(0.2, seed=5))
+    fast = SimulatedBackend("fast", lognormal(0.05, seed=6))
+    route = Router([slow.backend, fast.backend])
+    latencies, failures = run_load(route, args.requests, args.concurrency)
+    print(f"  calls to slow {slow.calls}, to fast {fast.calls}, p50 {pct(latencies, 50):.1f} ms, failed {failures}")
+    for row in route.report():
+        print(f"  {row}")
+    route.shutdown()
+    return check("most requests go to the faster backend", fast.calls > args.requests * 0.8)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--cooldown", type=float, default=0.5, help="breaker cooldown in seconds (router.COOLDOWN)")
+    args = parser.parse_args()
+    router.COOLDOWN = args.cooldown  # Long enough to matter, short enough for the primary to recover mid-run
+
+    results = [tail_latency(args), failover(args), fastest(args)]
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
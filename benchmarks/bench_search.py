@@ -0,0 +1,81 @@
+"""Search latency over a large history: ChatStore.search vs. a linear scan of every message.
+
+Builds a synthetic archive (1M messages by default, which takes a minute or
+two to index) and times a mix of common, rare, prefix and multi-word queries.
+Run with `python -m benchmarks.bench_search [--chats 2000 --messages 500]`.
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from chat_store import ChatStore, Message
+
+COMMON = ["the", "python", "error", "model", "data", "function", "question", "answer"]
+RARE = ["zeppelin", "quokka", "marzipan", "obsidian", "tessellate"]
+QUERIES = ["python", "error function", "quokka", "marzip", "obsidian data", "tess", "the model", "nomatchatall"]
+
+
+def synthetic_text(rng, words):
+    text = rng.choices(words, k=rng.randint(8, 30))
+    if rng.random() < 0.001:
+        text.append(rng.choice(RARE))
+    return " ".join(text)
+
+
+def build_store(path, n_chats, per_chat, seed=0):
+    rng = random.Random(seed)
+    words = COMMON + [f"word{i}" for i in range(5000)]
+    store = ChatStore(path)
+    for i in range(n_chats):
+        messages = [
+            Message("user" if j % 2 == 0 else "assistant", synthetic_text(rng, words))
+            for j in range(per_chat)
+        ]
+        store.add_chat({"title": f"chat {i} {rng.choice(words)}"}, messages)
+    store.compact()
+    return store
+
+
+def linear_search(store, text):
+    """What searching without an index means: read every message and test it."""
+    words = text.casefold().split()
+    hits = []
+    for chat in store.load_chats():
+        for index, msg in enumerate(chat["messages"]):
+            if all(word in msg.text.casefold() for word in words):
+                hits.append((chat["id"], index))
+    return hits
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chats", type=int, default=2000)
+    parser.add_argument("--messages", type=int, default=500, help="messages per chat")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        store = build_store(os.path.join(directory, "chat_history.db"), args.chats, args.messages)
+        print(f"built and indexed {args.chats * args.messages} messages in {time.perf_counter() - start:.1f} s")
+
+        for query in QUERIES:
+            store.search(query)  # Warm the page cache
+            times = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                hits = store.search(query)
+                times.append((time.perf_counter() - start) * 1000)
+            print(f"{query!r:18} {len(hits):3d} hits, median {statistics.median(times):7.2f} ms, max {max(times):7.2f} ms")
+
+        start = time.perf_counter()
+        hits = linear_search(store, "quokka")
+        print(f"linear scan for 'quokka': {len(hits)} hits in {(time.perf_counter() - start) * 1000:.0f} ms")
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""Chat server load test: many concurrent sessions against server.py, with the mock server as the model.
+
+Starts the local mock server and a ChatServer on free ports, then runs
+--sessions concurrent sessions. Each one creates a chat and sends --turns
+messages, cycling through plain JSON, server-sent events and WebSocket
+turns. Prints sessions/s, turns/s, turn latency percentiles, errors and 503s,
+and the server's thread count. Runs offline.
+Run with `python -m benchmarks.bench_server --sessions 500`.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import tempfile
+import threading
+import time
+
+import aiohttp
+from aiohttp import web
+
+import llm
+from benchmarks.mock_server import MockServer
+from router import percentile
+from server import ChatServer
+
+MODES = ("json", "sse", "ws")
+
+
+async def json_turn(http, base, chat_id, text):
+    async with http.post(f"{base}/chats/{chat_id}/messages", json={"text": text}) as response:
+        if response.status != 200:
+            return response.status
+        return 200 if (await response.json())["message"] else 500
+
+
+async def sse_turn(http, base, chat_id, text):
+    async with http.post(f"{base}/chats/{chat_id}/messages", json={"text": text, "stream": True}) as response:
+        if response.status != 200:
+            return response.status
+        last = None
+        async for line in response.content:
+            if line.startswith(b"data: "):
+                last = json.loads(line[6:])
+        return 200 if last and "message" in last else 500
+
+
+async def ws_turn(ws, chat_id, text):
+    await ws.send_json({"chat": chat_id, "text": text})
+    while True:
+        frame = await ws.receive_json()
+        if frame["type"] == "done":
+            return 200
+        if frame["type"] == "error":
+            return 503 if "too many" in frame["error"] else 500
+
+
+async def run_session(http, url, index, turns, results):
+    base = f"{url}/sessions/load-{index}"
+    async with http.post(f"{base}/chats", json={"title": f"load {index}"}) as response:
+        chat_id = (await response.json())["id"]
+    mode = MODES[index % len(MODES)]
+    ws = await http.ws_connect(f"{base}/ws") if mode == "ws" else None
+    try:
+        for turn in range(turns):
+            text = f"session {index} turn {turn}"
+            start = time.perf_counter()
+            if mode == "json":
+                status = await json_turn(http, base, chat_id, text)
+            elif mode == "sse":
+                status = await sse_turn(http, base, chat_id, text)
+            else:
+                status = await ws_turn(ws, chat_id, text)
+            results.append((mode, status, time.perf_counter() - start))
+    finally:
+        if ws is not None:
+            await ws.close()
+
+
+async def load(args, mock):
+    with tempfile.TemporaryDirectory() as sessions_dir:
+        client = llm.build_client(base_url=mock.base_url, api_key="test")
+        server = ChatServer(sessions_dir, "mock", client, limiter=llm.RateLimiter(None, None),
+                            max_turns=args.max_turns, queue_timeout=args.queue_timeout)
+        runner = web.AppRunner(server.app())
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        url = f"http://127.0.0.1:{runner.addresses[0][1]}"
+
+        results = []
+        peak_threads = threading.active_count()
+        connector = aiohttp.TCPConnector(limit=0)
+        async with aiohttp.ClientSession(connector=connector) as http:
+            start = time.perf_counter()
+            tasks = [asyncio.create_task(run_session(http, url, i, args.turns, results)) for i in range(args.sessions)]
+            while not all(task.done() for task in tasks):
+                peak_threads = max(peak_threads, threading.active_count())
+                await asyncio.sleep(0.05)
+            elapsed = time.perf_counter() - start
+            failed = [task.exception() for task in tasks if task.exception() is not None]
+            async with http.get(f"{url}/health") as response:
+                health = await response.json()
+        await runner.cleanup()
+        return results, elapsed, failed, peak_threads, health
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=300)
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.1, help="mock model latency before the first token, s")
+    parser.add_argument("--token-interval", type=float, default=0.002)
+    parser.add_argument("--max-turns", type=int, default=128)
+    parser.add_argument("--queue-timeout", type=float, default=30.0)
+    args = parser.parse_args()
+
+    with MockServer(latency=args.latency, token_interval=args.token_interval, reply_words=20) as mock:
+        results, elapsed, failed, peak_threads, health = asyncio.run(load(args, mock))
+        model_calls = mock.stats.requests
+
+    ok = [seconds for _, status, seconds in results if status == 200]
+    print(f"{args.sessions} sessions x {args.turns} turns in {elapsed:.2f} s: "
+          f"{args.sessions / elapsed:.1f} sessions/s, {len(ok) / elapsed:.1f} turns/s")
+    if ok:
+        print(f"turn latency ms: p50 {statistics.median(ok) * 1000:.0f}  p95 {percentile(ok, 95) * 1000:.0f}  "
+              f"p99 {percentile(ok, 99) * 1000:.0f}  max {max(ok) * 1000:.0f}")
+    for mode in MODES:
+        times = [seconds for m, status, seconds in results if m == mode and status == 200]
+        if times:
+            print(f"  {mode:5} {len(times):6d} turns  p50 {statistics.median(times) * 1000:6.0f} ms  "
+                  f"p99 {percentile(times, 99) * 1000:6.0f} ms")
+    errors = sum(1 for _, status, _ in results if status not in (200, 503))
+    rejected = sum(1 for _, status, _ in results if status == 503)
+    print(f"errors: {errors}  503s: {rejected}  failed sessions: {len(failed)}  model calls: {model_calls}")
+    print(f"server: {health['sessions']} sessions open, peak {peak_threads} threads "
+          f"(max {args.max_turns} turns in flight)")
+    for e in failed[:3]:
+        print(f"  {type(e).__name__}: {e}")
+
+
+if __name__ == "__main__":
+    main()
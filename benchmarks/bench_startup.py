@@ -0,0 +1,73 @@
+"""Startup import cost, measured with `python -X importtime` in fresh interpreters.
+
+Compares what the GUIs used to import before the window could paint with
+what they import now, and lists the slowest modules of the current set.
+Exits non-zero if the current set exceeds --budget-ms, so it can guard
+against regressions. Run with `python -m benchmarks.bench_startup`.
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+
+# Imported before the first paint, before and after deferring openai/dotenv to llm.py
+EAGER = ["tkinter", "customtkinter", "openai", "dotenv", "worker", "chat_store", "context", "response_cache", "views"]
+CURRENT = ["tkinter", "customtkinter", "llm", "worker", "chat_store", "context", "response_cache", "views"]
+
+
+def import_times(modules):
+    """Returns {module: cumulative microseconds} for one fresh `import modules`."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import " + ", ".join(modules)],
+        capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    times = {}
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, name = line[len("import time:"):].split("|")
+            if cumulative.strip().isdigit():
+                times[name.strip()] = int(cumulative)
+    return times
+
+
+def total_ms(times, modules):
+    # Top-level entries only: each requested module's cumulative time covers its own imports
+    return sum(times.get(m, 0) for m in modules) / 1000
+
+
+def measure(modules, runs):
+    samples = [import_times(modules) for _ in range(runs)]
+    return statistics.median(total_ms(t, modules) for t in samples), samples[-1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=None, help="fail if the current startup imports take longer")
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    eager, _ = measure(EAGER, args.runs)
+    current, times = measure(CURRENT, args.runs)
+    print(f"eager imports (openai, dotenv at startup): {eager:8.1f} ms")
+    print(f"current startup imports:                   {current:8.1f} ms")
+
+    print("\nslowest top-level imports now:")
+    for name in sorted(CURRENT, key=lambda m: -times.get(m, 0))[:args.top]:
+        print(f"  {times.get(name, 0) / 1000:8.1f} ms  {name}")
+
+    try:
+        tools_ms = total_ms(import_times(["tools"]), ["tools"])
+        print(f"\nimport tools (langchain deferred): {tools_ms:.1f} ms")
+    except RuntimeError as e:
+        print(f"\nimport tools: skipped ({e})")
+
+    if args.budget_ms is not None and current > args.budget_ms:
+        print(f"\nFAIL: startup imports take {current:.1f} ms, budget is {args.budget_ms:.1f} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Per-message save cost: rewriting chat_history.json vs. ChatStore appends.
+
+Run with `python -m benchmarks.bench_store [--sizes 10000 50000]`.
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from chat_store import ChatStore, Message
+
+
+def synthetic_history(n_messages, per_chat=100):
+    chats = []
+    for i in range(0, n_messages, per_chat):
+        messages = [
+            {"role": "user" if j % 2 == 0 else "assistant", "text": f"message {i + j} " + "lorem ipsum " * 20, "time": "12:00"}
+            for j in range(min(per_chat, n_messages - i))
+        ]
+        chats.append({"title": f"chat {i // per_chat}", "messages": messages})
+    return chats
+
+
+def bench_json(directory, chats, appends):
+    """The old save_chats(): json.dump the whole history after each message."""
+    path = os.path.join(directory, "chat_history.json")
+    chat = chats[-1]
+    start = time.perf_counter()
+    for i in range(appends):
+        chat["messages"].append({"role": "user", "text": f"new {i}", "time": "12:00"})
+        with open(path, "w") as f:
+            json.dump(chats, f, indent=2)
+    return (time.perf_counter() - start) / appends
+
+
+def bench_store(directory, chats, appends):
+    store = ChatStore(os.path.join(directory, "chat_history.db"))
+    for chat in chats:
+        store.add_chat({"title": chat["title"]}, [Message.from_dict(m) for m in chat["messages"]])
+    chat = {"id": store.load_index()[-1]["id"]}
+    start = time.perf_counter()
+    for i in range(appends):
+        store.append_message(chat, Message("user", f"new {i}"))
+    elapsed = (time.perf_counter() - start) / appends
+    store.close()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--appends", type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{'messages':>10} {'json.dump':>12} {'ChatStore':>12}")
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            json_cost = bench_json(directory, synthetic_history(size), args.appends)
+            store_cost = bench_store(directory, synthetic_history(size), args.appends)
+        print(f"{size:>10} {json_cost * 1000:>10.2f}ms {store_cost * 1000:>10.3f}ms")
+
+
+if __name__ == "__main__":
+    main()
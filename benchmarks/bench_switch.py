@@ -0,0 +1,155 @@
+"""Chat switch latency: re-rendering on every switch vs. cached views (ViewCache).
+
+Flips back and forth between two long chats, timing each switch up to the
+next frame (`update()`), for both GUIs' views: main.py's Text (delete and
+bulk insert vs. swapping Text widgets) and gui_tkinter.py's MessageList
+(rebinding bubbles vs. swapping MessageLists). Then cycles through more
+chats than fit in the memory budget to show eviction. Needs a display; on a
+headless machine run it under a virtual one, e.g.
+`xvfb-run python -m benchmarks.bench_switch`.
+"""
+import argparse
+import statistics
+import time
+import tkinter
+from tkinter import scrolledtext
+
+import customtkinter as ctk
+
+from chat_store import Message
+from view_cache import ViewCache
+from views import MessageList
+
+TEXT_LINE_BYTES = 200  # As in main.py
+BUBBLE_BYTES = 64 * 1024  # As in gui_tkinter.py
+
+
+def synthetic_chat(n, seed):
+    return [
+        Message("user" if i % 2 == 0 else "assistant", f"chat {seed} message {i} " + "lorem ipsum " * (i % 7 + 1))
+        for i in range(n)
+    ]
+
+
+def text_runs(messages):
+    """What main.message_runs produces for a whole chat."""
+    runs = []
+    for msg in messages:
+        runs += ["\n", "", f"{msg.text}\n({msg.time})", "user" if msg.role == "user" else "bot", "\n\n", ""]
+    return runs
+
+
+def runs_size(runs):
+    return sum(len(text) + text.count("\n") * TEXT_LINE_BYTES for text in runs[0::2])
+
+
+def new_text(root):
+    area = scrolledtext.ScrolledText(root, wrap=tkinter.WORD, font=("Arial", 11))
+    area.tag_config("user", background="#DCF8C6", lmargin1=10, rmargin=100)
+    area.tag_config("bot", background="#FFFFFF", lmargin1=100, rmargin=10)
+    return area
+
+
+def timed_switches(root, switch, chats, flips):
+    """Median and max ms of switch(chat) + update() over alternating chats."""
+    times = []
+    for i in range(flips):
+        start = time.perf_counter()
+        switch(chats[i % len(chats)])
+        root.update()
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times[2:]), max(times[2:])  # The first two build the cached views
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, nargs="+", default=[500, 2000, 10000])
+    parser.add_argument("--flips", type=int, default=20)
+    parser.add_argument("--budget-mb", type=float, default=8.0, help="VIEW_CACHE_BYTES for the eviction run")
+    args = parser.parse_args()
+
+    try:
+        root = ctk.CTk()
+    except tkinter.TclError as e:
+        raise SystemExit(f"No display available ({e}); run under xvfb-run.")
+    root.geometry("900x600")
+    root.update()
+
+    print(f"{'messages':>9} {'view':>12} {'re-render p50/max ms':>22} {'cached p50/max ms':>19}")
+    for n in args.messages:
+        chats = [(chat_id, synthetic_chat(n, chat_id)) for chat_id in (1, 2)]
+
+        # main.py: one Text, cleared and refilled
+        area = new_text(root)
+        area.pack(fill="both", expand=True)
+
+        def rerender_text(chat):
+            area.delete("1.0", "end")
+            area.insert("end", *text_runs(chat[1]))
+            area.yview("end")
+
+        rerender = timed_switches(root, rerender_text, chats, args.flips)
+        area.destroy()
+
+        views = ViewCache(8, 1 << 40, on_evict=lambda view: view.destroy())
+        shown = [None]
+
+        def cached_text(chat):
+            view = views.get(chat[0])
+            if view is None:
+                view = new_text(root)
+                runs = text_runs(chat[1])
+                view.insert("end", *runs)
+                view.yview("end")
+                views.put(chat[0], view, runs_size(runs))
+            if shown[0] is not None:
+                shown[0].pack_forget()
+            view.pack(fill="both", expand=True)
+            shown[0] = view
+
+        cached = timed_switches(root, cached_text, chats, args.flips)
+        views.clear()
+        print(f"{n:9d} {'Text':>12} {rerender[0]:10.2f} / {rerender[1]:8.2f} {cached[0]:9.2f} / {cached[1]:7.2f}")
+
+        # gui_tkinter.py: one MessageList, rebound to the other chat
+        message_list = MessageList(root)
+        message_list.pack(fill="both", expand=True)
+        rerender = timed_switches(root, lambda chat: message_list.show(chat[1]), chats, args.flips)
+        message_list.destroy()
+
+        shown[0] = None
+
+        def cached_list(chat):
+            view = views.get(chat[0])
+            if view is None:
+                view = MessageList(root)
+                view.show(chat[1])
+                views.put(chat[0], view, view.widget_count() * BUBBLE_BYTES + len(view.items) * 8)
+            if shown[0] is not None:
+                shown[0].pack_forget()
+            view.pack(fill="both", expand=True)
+            shown[0] = view
+
+        cached = timed_switches(root, cached_list, chats, args.flips)
+        views.clear()
+        print(f"{n:9d} {'MessageList':>12} {rerender[0]:10.2f} / {rerender[1]:8.2f} {cached[0]:9.2f} / {cached[1]:7.2f}")
+
+    # Eviction: more chats than the byte budget holds
+    n = args.messages[0]
+    budget = int(args.budget_mb * 1024 * 1024)
+    views = ViewCache(8, budget, on_evict=lambda view: view.destroy())
+    for chat_id in range(12):
+        runs = text_runs(synthetic_chat(n, chat_id))
+        view = new_text(root)
+        view.insert("end", *runs)
+        views.put(chat_id, view, runs_size(runs))
+    root.update()
+    print(f"eviction: {len(views)} of 12 Text views kept, {views.total_bytes / 1024 / 1024:.1f} MB estimated "
+          f"(budget {args.budget_mb:g} MB), {views.evictions} evicted, "
+          f"{len(root.winfo_children())} chat widgets alive")
+    views.clear()
+    root.destroy()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Telemetry: cost of a span, and a streamed turn's phases end to end against the mock server.
+
+Measures the per-span overhead with and without JSONL export, then sends
+turns through a ChatEngine pointed at the local mock server and prints the
+per-phase summary, the token counters and a /metrics scrape. Runs offline.
+Run with `python -m benchmarks.bench_telemetry`.
+"""
+import argparse
+import os
+import tempfile
+import time
+import urllib.request
+
+import llm
+from benchmarks.mock_server import MockServer
+from chat_engine import ChatEngine
+from chat_store import ChatStore
+from telemetry import Telemetry, telemetry
+
+
+def span_cost_ns(source, n):
+    start = time.perf_counter()
+    for _ in range(n):
+        with source.span("bench", turn=1):
+            pass
+    return (time.perf_counter() - start) / n * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--spans", type=int, default=200_000)
+    parser.add_argument("--turns", type=int, default=50)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    for _ in range(args.spans):
+        pass
+    loop_ns = (time.perf_counter() - start) / args.spans * 1e9
+    print(f"span, in memory:    {span_cost_ns(Telemetry(), args.spans) - loop_ns:7.0f} ns")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "telemetry.jsonl")
+        exporting = Telemetry(path)
+        print(f"span, JSONL export: {span_cost_ns(exporting, args.spans) - loop_ns:7.0f} ns")
+        exporting.close()
+        with open(path, encoding="utf-8") as f:
+            print(f"  {sum(1 for _ in f)} JSONL records written")
+
+        telemetry.configure(os.path.join(directory, "turns.jsonl"))
+        port = telemetry.serve(0)
+        with MockServer(latency=0.02, token_interval=0.002) as server:
+            client = llm.build_client(base_url=server.base_url, api_key="test")
+            engine = ChatEngine(ChatStore(":memory:"), "mock", client=client, limiter=llm.RateLimiter(None, None))
+            chat = engine.new_chat("telemetry")
+            for i in range(args.turns):
+                engine.add_user_message(chat, f"turn {i}")
+                reply = "".join(engine.stream_reply(engine.build_request(chat)))
+                engine.add_reply(chat, reply)
+            engine.close()
+
+        print(f"{'phase':20} {'n':>6} {'p50 ms':>9} {'p95 ms':>9}")
+        for phase, stats in telemetry.summary().items():
+            print(f"{phase:20} {stats['count']:6d} {stats['p50_ms']:9.2f} {stats['p95_ms']:9.2f}")
+        print(f"tokens: {telemetry.counters()}")
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics") as response:
+            metrics = response.read().decode()
+        print(f"/metrics: {len(metrics.splitlines())} lines, e.g.")
+        print("  " + "\n  ".join(line for line in metrics.splitlines() if "api.ttft" in line))
+        telemetry.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Tool throughput: a batch of 50 mixed search/wiki queries, serial vs. ToolRunner.
+
+Uses local fake backends with fixed latencies, so it runs offline.
+Run with `python -m benchmarks.bench_tools`.
+"""
+import argparse
+import random
+import threading
+import time
+
+from tool_runner import ToolRunner
+
+
+class FakeBackend:
+    """Stands in for DuckDuckGoSearchRun.run / WikipediaQueryRun.run."""
+
+    def __init__(self, name, latency):
+        self.name = name
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def run(self, query):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency)
+        return f"{self.name} result for {query!r}"
+
+
+def run_batch(runner, calls):
+    """Runs [(name, fn, query), ...] through runner all at once, as the agent runs a step's tool calls."""
+    return [future.result() for future in [runner.submit(name, fn, query) for name, fn, query in calls]]
+
+
+def mixed_batch(n, seed=0):
+    """n queries, about a third of them repeats (some differing only in case/spacing)."""
+    random.seed(seed)
+    topics = [f"topic {i}" for i in range(n * 2 // 3)]
+    batch = []
+    for _ in range(n):
+        topic = random.choice(topics)
+        if random.random() < 0.2:
+            topic = "  " + topic.upper()
+        batch.append(("search" if random.random() < 0.6 else "wikipedia", topic))
+    return batch
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--search-latency", type=float, default=0.15)
+    parser.add_argument("--wiki-latency", type=float, default=0.08)
+    args = parser.parse_args()
+
+    batch = mixed_batch(args.queries)
+
+    backends = {"search": FakeBackend("search", args.search_latency), "wikipedia": FakeBackend("wikipedia", args.wiki_latency)}
+    start = time.perf_counter()
+    for name, query in batch:
+        backends[name].run(query)
+    serial = time.perf_counter() - start
+    serial_calls = sum(b.calls for b in backends.values())
+
+    backends = {"search": FakeBackend("search", args.search_latency), "wikipedia": FakeBackend("wikipedia", args.wiki_latency)}
+    runner = ToolRunner()
+    calls = [(name, backends[name].run, query) for name, query in batch]
+    start = time.perf_counter()
+    run_batch(runner, calls)
+    cold = time.perf_counter() - start
+    cold_calls = sum(b.calls for b in backends.values())
+    start = time.perf_counter()
+    run_batch(runner, calls)
+    warm = time.perf_counter() - start
+    runner.shutdown()
+
+    print(f"serial, uncached:  {serial * 1000:8.1f} ms, {serial_calls} backend calls")
+    print(f"ToolRunner, cold:  {cold * 1000:8.1f} ms, {cold_calls} backend calls")
+    print(f"ToolRunner, warm:  {warm * 1000:8.1f} ms, {sum(b.calls for b in backends.values()) - cold_calls} backend calls")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Offline Wikipedia index: build and lookup cost on a large synthetic dump.
+
+Builds an index over --articles generated articles and times building and
+opening it, each kind of lookup and slicing out an answer. Runs offline.
+tests/test_wiki.py checks the lookups on the bundled sample dump. Run with
+`python -m benchmarks.bench_wiki`.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from wiki_index import WikiIndex, build_index
+
+SYLLABLES = ["ka", "lo", "mi", "ra", "ten", "vo", "su", "bel", "dar", "qui", "ne", "po", "zan", "fi", "gro"]
+
+
+def synthetic_dump(path, n, seed=0):
+    rng = random.Random(seed)
+    corpus = " ".join(rng.choice(SYLLABLES) * rng.randint(1, 3) for _ in range(100_000))
+    titles = set()
+    with open(path, "w", encoding="utf-8") as f:
+        while len(titles) < n:
+            title = " ".join("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).capitalize()
+                             for _ in range(rng.randint(1, 3)))
+            if title in titles:
+                continue
+            titles.add(title)
+            start = rng.randrange(len(corpus) - 4000)
+            body = corpus[start:start + rng.randint(500, 3500)]
+            f.write(json.dumps({"title": title, "text": f"'''{title}''' is a [[place]]. {body}"}) + "\n")
+    return sorted(titles)
+
+
+def per_call_us(fn, queries):
+    times = []
+    for query in queries:
+        start = time.perf_counter()
+        fn(query)
+        times.append((time.perf_counter() - start) * 1e6)
+    return statistics.median(times), sorted(times)[int(len(times) * 0.99)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--articles", type=int, default=100_000)
+    parser.add_argument("--lookups", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        dump = os.path.join(directory, "synthetic.jsonl")
+        titles = synthetic_dump(dump, args.articles)
+        index_dir = os.path.join(directory, "synthetic")
+        start = time.perf_counter()
+        build_index(dump, index_dir)
+        build_s = time.perf_counter() - start
+        size = sum(os.path.getsize(os.path.join(index_dir, name)) for name in os.listdir(index_dir))
+        print(f"{args.articles} articles: built in {build_s:.1f} s, index {size / 1e6:.0f} MB "
+              f"(dump {os.path.getsize(dump) / 1e6:.0f} MB)")
+
+        start = time.perf_counter()
+        index = WikiIndex(index_dir)
+        print(f"open: {(time.perf_counter() - start) * 1e3:.2f} ms")
+        rng = random.Random(1)
+        sample = rng.sample(titles, min(args.lookups, len(titles)))
+        typos = [t[:4] + t[5:] if len(t) > 6 else t for t in sample]
+        print(f"{'lookup':28} {'p50 us':>8} {'p99 us':>8}")
+        for name, fn, queries in [
+            ("exact", index.exact, [t.lower() for t in sample]),
+            ("prefix (first 5 chars)", index.prefix, [t[:5] for t in sample]),
+            ("fuzzy (one char dropped)", lambda q: index.fuzzy(q, limit=1), typos[:200]),
+            (f"text slice ({index.max_chars} chars)", lambda i: index.text(i, index.max_chars),
+             [index.exact(t) for t in sample]),
+            ("run (find + format)", index.run, [t.lower() for t in sample]),
+        ]:
+            p50, p99 = per_call_us(fn, queries)
+            print(f"{name:28} {p50:8.1f} {p99:8.1f}")
+        found = sum(index.exact(t) is not None and index.title(index.exact(t)) == t for t in sample)
+        fuzzy_found = sum(index.title(index.fuzzy(q, limit=1)[0]) == t for q, t in zip(typos[:200], sample[:200])
+                          if index.fuzzy(q, limit=1))
+        print(f"exact found {found}/{len(sample)}; fuzzy with a dropped character found {fuzzy_found}/200")
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""UI-thread stall time: blocking send_message vs. the RequestWorker pool.
+
+Also reports time-to-first-token and UI update count for a streamed reply.
+
+Run with `python -m benchmarks.bench_worker`.
+"""
+import argparse
+import time
+
+from benchmarks.common import FakeClient, HeadlessRoot, StallMonitor
+from worker import RequestWorker
+
+
+def request_reply(client, api_messages):
+    response = client.chat.completions.create(model="fake", messages=api_messages)
+    return response.choices[0].message.content
+
+
+def run_blocking(n_requests, latency):
+    """The old behaviour: every completion runs inside a UI callback."""
+    client = FakeClient(latency)
+    root = HeadlessRoot()
+    monitor = StallMonitor(root)
+    done = []
+
+    def send(i):
+        done.append(request_reply(client, [{"role": "user", "content": f"q{i}"}]))
+
+    monitor.start()
+    start = time.perf_counter()
+    for i in range(n_requests):
+        root.after(0, send, i)
+    root.run_until(lambda: len(done) == n_requests)
+    monitor.sample()
+    return time.perf_counter() - start, monitor.max_stall_ms
+
+
+def run_worker(n_requests, latency, max_workers):
+    """Completions run on the pool; replies are polled back with root.after."""
+    client = FakeClient(latency)
+    root = HeadlessRoot()
+    monitor = StallMonitor(root)
+    worker = RequestWorker(max_workers=max_workers)
+    done = []
+
+    def send(i):
+        worker.submit(request_reply, client, [{"role": "user", "content": f"q{i}"}], on_done=done.append)
+
+    monitor.start()
+    worker.start_polling(root)
+    start = time.perf_counter()
+    for i in range(n_requests):
+        root.after(0, send, i)
+    root.run_until(lambda: len(done) == n_requests)
+    monitor.sample()
+    elapsed = time.perf_counter() - start
+    worker.shutdown()
+    return elapsed, monitor.max_stall_ms
+
+
+def stream_reply(client, api_messages):
+    stream = client.chat.completions.create(model="fake", messages=api_messages, stream=True)
+    for chunk in stream:
+        yield chunk.choices[0].delta.content
+
+
+def run_stream(latency, n_tokens):
+    """One streamed reply: how soon the first delta lands and how many redraws it costs."""
+    client = FakeClient(latency, reply=" ".join(["token"] * n_tokens))
+    root = HeadlessRoot()
+    worker = RequestWorker()
+    updates = []
+    done = []
+
+    worker.start_polling(root)
+    start = time.perf_counter()
+    worker.submit_stream(
+        stream_reply, client, [{"role": "user", "content": "q"}],
+        on_delta=lambda text: updates.append(time.perf_counter() - start),
+        on_done=done.append
+    )
+    root.run_until(lambda: done)
+    elapsed = time.perf_counter() - start
+    worker.shutdown()
+    return updates[0], elapsed, len(updates)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.2, help="fake API latency in seconds")
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    elapsed, stall = run_blocking(args.requests, args.latency)
+    print(f"blocking: {elapsed:.2f}s wall, max UI stall {stall:.1f} ms")
+    elapsed, stall = run_worker(args.requests, args.latency, args.workers)
+    print(f"worker:   {elapsed:.2f}s wall, max UI stall {stall:.1f} ms")
+    ttft, elapsed, n_updates = run_stream(args.latency, n_tokens=500)
+    print(f"stream:   first delta after {ttft * 1000:.0f} ms, {elapsed:.2f}s total, "
+          f"{n_updates} UI updates for 500 tokens")
+
+
+if __name__ == "__main__":
+    main()
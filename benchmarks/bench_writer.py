@@ -0,0 +1,67 @@
+"""save_to_txt throughput: open/append/close per record vs. the background RecordWriter.
+
+Run with `python -m benchmarks.bench_writer`.
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from record_writer import RecordWriter
+
+
+def format_record(data):
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    return f"--- Research Output ---\nTimestamp: {timestamp}\n\n{data}\n\n"
+
+
+def save_direct(data, filename):
+    """The previous save_to_txt: one open/write/close per record."""
+    with open(filename, "a", encoding="utf-8") as f:
+        f.write(format_record(data))
+
+
+def run_threads(n_threads, n_records, save):
+    def work(t):
+        for i in range(n_records // n_threads):
+            save(f"thread {t} snippet {i}: " + "finding " * 30)
+
+    threads = [threading.Thread(target=work, args=(t,)) for t in range(n_threads)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start
+
+
+def intact_records(filename):
+    with open(filename, encoding="utf-8") as f:
+        records = f.read().split("--- Research Output ---\n")[1:]
+    return sum(r.startswith("Timestamp: ") and r.endswith("\n\n") for r in records), len(records)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=20000)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        direct_path = os.path.join(directory, "direct.txt")
+        elapsed = run_threads(args.threads, args.records, lambda data: save_direct(data, direct_path))
+        print(f"open/append/close: {args.records / elapsed:10.0f} records/s, intact {intact_records(direct_path)}")
+
+        writer = RecordWriter()
+        buffered_path = os.path.join(directory, "buffered.txt")
+        start = time.perf_counter()
+        run_threads(args.threads, args.records, lambda data: writer.write(buffered_path, format_record(data)))
+        writer.close()  # Include the final flush
+        elapsed = time.perf_counter() - start
+        print(f"RecordWriter:      {args.records / elapsed:10.0f} records/s, intact {intact_records(buffered_path)}")
+
+
+if __name__ == "__main__":
+    main()
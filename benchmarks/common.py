@@ -0,0 +1,143 @@
+import heapq
+import itertools
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+# Shared fakes for the benchmarks: an OpenAI-shaped client that sleeps instead
+# of calling the network, one that plays back a script of tool calls, and a
+# stand-in for the Tk root that implements just enough of `after` to drive
+# the GUIs' polling loops without a display.
+
+
+class FakeCompletions:
+    def __init__(self, latency=0.2, reply="This is a canned reply.", token_interval=0.001):
+        self.latency = latency
+        self.reply = reply
+        self.token_interval = token_interval
+        self.calls = 0
+
+    def create(self, model, messages, stream=False, **kwargs):
+        self.calls += 1
+        time.sleep(self.latency)
+        if stream:
+            return self._stream()
+        message = SimpleNamespace(role="assistant", content=self.reply)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+    def _stream(self):
+        for word in self.reply.split(" "):
+            delta = SimpleNamespace(content=word + " ")
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
+            time.sleep(self.token_interval)
+
+
+class FakeClient:
+    """Mimics `openai.OpenAI()` for `client.chat.completions.create(...)`."""
+
+    def __init__(self, latency=0.2, reply="This is a canned reply.", token_interval=0.001):
+        self.chat = SimpleNamespace(completions=FakeCompletions(latency, reply, token_interval))
+
+
+class ScriptedCompletions:
+    def __init__(self, script, latency):
+        self.script = script
+        self.latency = latency
+        self.requests = []  # The messages of every call, in order
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+
+    def create(self, model, messages, stream=False, tools=None, **kwargs):
+        with self._lock:
+            step = self.script[min(len(self.requests), len(self.script) - 1)]
+            self.requests.append(list(messages))
+        time.sleep(self.latency)
+        if not tools:
+            step = {"content": step.get("content", "Final answer.")}
+        calls = [SimpleNamespace(id=f"call_{next(self._ids)}", type="function",
+                                 function=SimpleNamespace(name=name, arguments=json.dumps({"query": query})))
+                 for name, query in step.get("tool_calls", ())]
+        if stream:
+            return self._stream(step.get("content", ""), calls)
+        message = SimpleNamespace(role="assistant", content=step.get("content"), tool_calls=calls or None)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+    def _stream(self, content, calls):
+        for word in content.split(" ") if content else ():
+            delta = SimpleNamespace(content=word + " ", tool_calls=None)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
+        for index, call in enumerate(calls):
+            # Like the API: the id and name first, then the arguments in pieces
+            arguments = call.function.arguments
+            half = len(arguments) // 2
+            for fragment in (
+                SimpleNamespace(index=index, id=call.id, function=SimpleNamespace(name=call.function.name, arguments="")),
+                SimpleNamespace(index=index, id=None, function=SimpleNamespace(name=None, arguments=arguments[:half])),
+                SimpleNamespace(index=index, id=None, function=SimpleNamespace(name=None, arguments=arguments[half:])),
+            ):
+                delta = SimpleNamespace(content=None, tool_calls=[fragment])
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
+
+
+class ScriptedClient:
+    """Mimics `openai.OpenAI()` for a model that follows a script of steps.
+
+    Each step is {"tool_calls": [(tool name, query), ...]} or {"content": "answer"};
+    the last step repeats. Calls made without tools always get an answer.
+    """
+
+    def __init__(self, script, latency=0.05):
+        self.chat = SimpleNamespace(completions=ScriptedCompletions(script, latency))
+
+
+class HeadlessRoot:
+    """Single-threaded event loop with the `after` API of a Tk root."""
+
+    def __init__(self):
+        self._timers = []
+        self._seq = 0
+
+    def after(self, ms, func, *args):
+        self._seq += 1
+        heapq.heappush(self._timers, (time.perf_counter() + ms / 1000, self._seq, func, args))
+
+    def run_until(self, predicate, timeout=30.0):
+        """Runs due callbacks until predicate() is true or timeout expires."""
+        deadline = time.perf_counter() + timeout
+        while not predicate() and time.perf_counter() < deadline:
+            if not self._timers:
+                return
+            due, _, func, args = heapq.heappop(self._timers)
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            func(*args)
+
+
+class StallMonitor:
+    """Heartbeat on the UI loop; records how late each beat fires."""
+
+    def __init__(self, root, interval_ms=5):
+        self.root = root
+        self.interval_ms = interval_ms
+        self.stalls = []
+        self._expected = None
+
+    def start(self):
+        self._expected = time.perf_counter() + self.interval_ms / 1000
+        self.root.after(self.interval_ms, self._beat)
+
+    def _beat(self):
+        self.sample()
+        self.root.after(self.interval_ms, self._beat)
+
+    def sample(self):
+        """Records the lateness of the pending beat; call once more when done."""
+        now = time.perf_counter()
+        self.stalls.append(max(0.0, now - self._expected))
+        self._expected = now + self.interval_ms / 1000
+
+    @property
+    def max_stall_ms(self):
+        return max(self.stalls, default=0.0) * 1000
@@ -0,0 +1,205 @@
+"""Local OpenAI-compatible chat completions server for benchmarks and fault injection.
+
+Serves POST /v1/chat/completions (plain and stream=True) with configurable
+latency, a share of 429 responses carrying Retry-After, and a share of 500s.
+A stream can also stall between its headers and its first chunk.
+Counts requests, connections and injected errors, so benchmarks can check
+connection reuse and retry behavior. Run standalone with
+`python -m benchmarks.mock_server --port 8000 --rate-limit-rate 0.2`, then
+point the app at it with OPENAI_BASE_URL=http://127.0.0.1:8000/v1.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class MockConfig:
+    def __init__(self, latency=0.05, jitter=0.0, token_interval=0.002, rate_limit_rate=0.0,
+                 retry_after=0.1, error_rate=0.0, reply_words=40, first_chunk_delay=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.token_interval = token_interval
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.error_rate = error_rate
+        self.reply_words = reply_words
+        self.first_chunk_delay = first_chunk_delay
+        self.random = random.Random(seed)
+
+
+class MockStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.connections = 0
+        self.rate_limited = 0
+        self.server_errors = 0
+        self.completed = 0
+
+    def count(self, field):
+        with self.lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, so clients can reuse connections
+    disable_nagle_algorithm = True  # Headers and body are separate writes; don't hold the body for an ACK
+
+    def setup(self):
+        super().setup()
+        self.server.stats.count("connections")
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        config, stats = self.server.config, self.server.stats
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        stats.count("requests")
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            return self._send_json(404, {"error": {"message": "Not found", "type": "invalid_request_error"}})
+        request = json.loads(body or b"{}")
+
+        with stats.lock:
+            roll = config.random.random()
+            delay = max(0.0, config.latency + config.random.uniform(-config.jitter, config.jitter))
+        if roll < config.rate_limit_rate:
+            stats.count("rate_limited")
+            return self._send_json(
+                429, {"error": {"message": "Rate limit reached", "type": "rate_limit_error", "code": "rate_limit_exceeded"}},
+                {"Retry-After": f"{config.retry_after:g}"}
+            )
+        if roll < config.rate_limit_rate + config.error_rate:
+            stats.count("server_errors")
+            return self._send_json(500, {"error": {"message": "Internal error", "type": "server_error"}})
+
+        time.sleep(delay)
+        prompt = request.get("messages", [{}])[-1].get("content", "")
+        words = [f"w{i}" for i in range(config.reply_words - 1)] + [f"({len(prompt)})"]
+        model = request.get("model", "mock")
+        usage = {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(words), "total_tokens": len(prompt) // 4 + len(words)}
+        if request.get("stream"):
+            include_usage = (request.get("stream_options") or {}).get("include_usage")
+            self._stream(model, words, config.token_interval, usage if include_usage else None,
+                         config.first_chunk_delay)
+        else:
+            self._send_json(200, {
+                "id": "chatcmpl-mock",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": " ".join(words)}, "finish_reason": "stop"}],
+                "usage": usage,
+            })
+        stats.count("completed")
+
+    def _send_json(self, status, payload, headers=None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _stream(self, model, words, token_interval, usage=None, first_chunk_delay=0.0):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        time.sleep(first_chunk_delay)  # The headers are out already
+
+        def event(data):
+            payload = f"data: {data}\n\n".encode("utf-8")
+            self.wfile.write(f"{len(payload):x}\r\n".encode("ascii") + payload + b"\r\n")
+            self.wfile.flush()
+
+        for i, word in enumerate(words):
+            chunk = {
+                "id": "chatcmpl-mock",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": word + (" " if i < len(words) - 1 else "")}, "finish_reason": None}],
+            }
+            event(json.dumps(chunk))
+            time.sleep(token_interval)
+        if usage is not None:
+            # Like the API with stream_options.include_usage: a last chunk with no choices
+            event(json.dumps({"id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": int(time.time()),
+                              "model": model, "choices": [], "usage": usage}))
+        event("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+
+
+class _Server(ThreadingHTTPServer):
+    request_queue_size = 256  # Load tests open many connections at once
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        pass  # Clients closing pooled connections mid-read aren't errors here
+
+
+class MockServer:
+    """Runs the mock on a background thread. Use as a context manager."""
+
+    def __init__(self, host="127.0.0.1", port=0, **config):
+        self.config = MockConfig(**config)
+        self.stats = MockStats()
+        self._server = _Server((host, port), _Handler)
+        self._server.config = self.config
+        self._server.stats = self.stats
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="mock-openai", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--token-interval", type=float, default=0.002)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of requests answered with 429")
+    parser.add_argument("--retry-after", type=float, default=0.1)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with 500")
+    parser.add_argument("--first-chunk-delay", type=float, default=0.0, help="stall of streams after their headers")
+    args = parser.parse_args()
+
+    server = MockServer(
+        args.host, args.port, latency=args.latency, jitter=args.jitter, token_interval=args.token_interval,
+        rate_limit_rate=args.rate_limit_rate, retry_after=args.retry_after, error_rate=args.error_rate,
+        first_chunk_delay=args.first_chunk_delay
+    )
+    print(f"Serving {server.base_url}/chat/completions (Ctrl+C to stop)")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,343 @@
+"""Runs the end-to-end benchmark suite and writes the results to a JSON file for comparing runs.
+
+Sections, each across chat histories of --sizes messages:
+  send     a turn through ChatEngine against the local mock OpenAI server:
+           preparing the request, the full round trip, streaming time to
+           first token; plus one run with 429s and 500s injected
+  persist  saving one message: ChatStore.append_message vs. rewriting the
+           whole history as JSON, as save_chats used to
+  render   load_chat (main.py's Text, gui_tkinter.py's MessageList) and
+           update_sidebar (Listbox, ChatSidebar); needs Tk, so it starts
+           Xvfb when there is no display and is skipped if neither works
+  tools    tools.py: ToolRunner throughput on fake search/Wikipedia
+           backends, the offline Wikipedia index, save_to_txt
+
+    python -m benchmarks.run_all                  # benchmarks/results/<time>.json
+    python -m benchmarks.run_all --quick --sections send persist
+    python -m benchmarks.run_all --compare benchmarks/results/<earlier>.json
+
+With --compare, metrics that got worse by more than --threshold are listed
+and the exit status is 1.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import llm
+from benchmarks.bench_store import bench_json, bench_store, synthetic_history
+from benchmarks.bench_tools import FakeBackend, mixed_batch, run_batch
+from benchmarks.mock_server import MockServer
+from chat_engine import ChatEngine
+from chat_store import ChatStore, Message
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+SAMPLE_DUMP = os.path.join(ROOT, "data", "wiki_sample.xml")
+
+SIZES = [10, 100, 1000, 10_000, 100_000]
+QUICK_SIZES = [10, 100, 1000]
+SECTIONS = ["send", "persist", "render", "tools"]
+THRESHOLD = 0.2
+
+
+class Results:
+    """Metrics by name, e.g. "send.round_trip_ms.p50@1000", with their unit and direction."""
+
+    def __init__(self):
+        self.metrics = {}
+        self.skipped = {}
+
+    def add(self, name, value, unit, size=None, higher_is_better=False):
+        key = f"{name}@{size}" if size is not None else name
+        self.metrics[key] = {"value": round(value, 4), "unit": unit, "higher_is_better": higher_is_better}
+        print(f"  {key:48} {value:12.3f} {unit}")
+
+    def add_times(self, name, seconds, size=None, unit="ms"):
+        scale = 1000 if unit == "ms" else 1e6
+        values = sorted(s * scale for s in seconds)
+        self.add(f"{name}.p50", statistics.median(values), unit, size)
+        self.add(f"{name}.p95", values[min(len(values) - 1, int(len(values) * 0.95))], unit, size)
+
+
+# --- Sections ---
+
+def bench_send(args, results, directory):
+    limiter = llm.RateLimiter(None, None)
+    with MockServer(latency=args.latency, token_interval=args.token_interval) as server:
+        client = llm.build_client(base_url=server.base_url, api_key="test")
+        for size in args.sizes:
+            store = ChatStore(os.path.join(directory, f"send-{size}.db"))
+            store.add_chat({"title": "history"}, [
+                Message("user" if i % 2 == 0 else "assistant", f"message {i} " + "lorem ipsum " * (i % 7 + 1))
+                for i in range(size)
+            ])
+            engine = ChatEngine(store, "mock", client=client, limiter=limiter)
+            chat = engine.chats[-1]
+            prepare, round_trip, first_token = [], [], []
+            for turn in range(args.turns):
+                start = time.perf_counter()
+                engine.add_user_message(chat, f"question {turn}")
+                api_messages = engine.build_request(chat)
+                prepared = time.perf_counter()
+                if turn % 2 == 0:
+                    engine.add_reply(chat, engine.request_reply(api_messages))
+                    round_trip.append(time.perf_counter() - start)
+                else:
+                    parts = engine.stream_reply(api_messages)
+                    first = next(parts)
+                    first_token.append(time.perf_counter() - start)
+                    engine.add_reply(chat, first + "".join(parts))
+                prepare.append(prepared - start)
+            engine.close()
+            results.add_times("send.prepare_ms", prepare, size)
+            results.add_times("send.round_trip_ms", round_trip, size)
+            results.add_times("send.stream_first_token_ms", first_token, size)
+
+    # Rate limits and server errors: retried by llm.create_completion, so turns still succeed
+    with MockServer(latency=args.latency, rate_limit_rate=0.2, error_rate=0.05, retry_after=0.05, seed=1) as server:
+        client = llm.build_client(base_url=server.base_url, api_key="test")
+        engine = ChatEngine(ChatStore(":memory:"), "mock", client=client, limiter=limiter)
+        chat = engine.new_chat()
+        failures, times = 0, []
+        for turn in range(args.turns * 2):
+            start = time.perf_counter()
+            engine.add_user_message(chat, f"question {turn}")
+            try:
+                engine.add_reply(chat, engine.request_reply(engine.build_request(chat)))
+            except Exception:
+                failures += 1
+            times.append(time.perf_counter() - start)
+        engine.close()
+        results.add_times("send.faults.round_trip_ms", times)
+        results.add("send.faults.failed_turns", failures, "turns")
+        results.add("send.faults.http_requests_per_turn", server.stats.requests / len(times), "requests")
+
+
+def bench_persist(args, results, directory):
+    for size in args.sizes:
+        appends = max(5, min(50, 200_000 // max(size, 1)))
+        with tempfile.TemporaryDirectory(dir=directory) as run_dir:
+            results.add("persist.append_message_ms", bench_store(run_dir, synthetic_history(size), appends) * 1000,
+                        "ms", size)
+            results.add("persist.json_rewrite_ms", bench_json(run_dir, synthetic_history(size), appends) * 1000,
+                        "ms", size)
+
+
+def ensure_display():
+    """Starts Xvfb when there is no display; returns the process to stop, or None."""
+    if os.environ.get("DISPLAY") or sys.platform in ("win32", "darwin"):
+        return None
+    xvfb = shutil.which("Xvfb")
+    if xvfb is None:
+        return None
+    display = f":{90 + os.getpid() % 9}"
+    process = subprocess.Popen([xvfb, display, "-screen", "0", "1280x1024x24", "-nolisten", "tcp"],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    os.environ["DISPLAY"] = display
+    time.sleep(1)
+    return process
+
+
+def bench_render(args, results, directory):
+    xvfb = ensure_display()
+    try:
+        import tkinter
+
+        import customtkinter as ctk
+        from benchmarks.bench_switch import new_text, text_runs
+        from views import ChatSidebar, MessageList
+
+        try:
+            root = ctk.CTk()
+        except tkinter.TclError as e:
+            results.skipped["render"] = f"no display ({e}); install Xvfb or run under xvfb-run"
+            print(f"  skipped: {results.skipped['render']}")
+            return
+        root.geometry("900x600")
+        root.update()
+
+        def timed(fn, repeat=3):
+            times = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                fn()
+                root.update()
+                times.append(time.perf_counter() - start)
+            return times
+
+        for size in args.sizes:
+            messages = [Message("user" if i % 2 == 0 else "assistant", f"message {i} " + "lorem ipsum " * (i % 7 + 1))
+                        for i in range(size)]
+            chats = [{"id": i, "title": f"Chat {i}"} for i in range(size)]
+
+            area = new_text(root)
+            area.pack(fill="both", expand=True)
+
+            def load_text():
+                area.delete("1.0", "end")
+                area.insert("end", *text_runs(messages))
+                area.yview("end")
+
+            results.add_times("render.load_chat_text_ms", timed(load_text), size)
+            area.destroy()
+
+            message_list = MessageList(root)
+            message_list.pack(fill="both", expand=True)
+            results.add_times("render.load_chat_message_list_ms", timed(lambda: message_list.show(messages)), size)
+            message_list.destroy()
+
+            listbox = tkinter.Listbox(root)
+            listbox.pack(fill="y", side="left")
+
+            def update_listbox():
+                listbox.delete(0, tkinter.END)
+                for chat in chats:
+                    listbox.insert(tkinter.END, chat["title"])
+
+            results.add_times("render.update_sidebar_listbox_ms", timed(update_listbox), size)
+            listbox.destroy()
+
+            sidebar = ChatSidebar(root, command=lambda chat: None)
+            sidebar.pack(fill="y", side="left")
+            results.add_times("render.update_sidebar_virtual_ms", timed(lambda: sidebar.set_chats(chats)), size)
+            sidebar.destroy()
+        root.destroy()
+    finally:
+        if xvfb is not None:
+            xvfb.terminate()
+
+
+def bench_tools(args, results, directory):
+    from tool_runner import ToolRunner
+
+    batch = mixed_batch(50)
+    backends = {"search": FakeBackend("search", 0.05), "wikipedia": FakeBackend("wikipedia", 0.03)}
+    runner = ToolRunner()
+    calls = [(name, backends[name].run, query) for name, query in batch]
+    start = time.perf_counter()
+    run_batch(runner, calls)
+    cold = time.perf_counter() - start
+    start = time.perf_counter()
+    run_batch(runner, calls)
+    warm = time.perf_counter() - start
+    runner.shutdown()
+    results.add("tools.runner_cold_queries_per_s", len(batch) / cold, "queries/s", higher_is_better=True)
+    results.add("tools.runner_warm_queries_per_s", len(batch) / warm, "queries/s", higher_is_better=True)
+
+    from wiki_index import WikiIndex, build_index
+
+    index_dir = os.path.join(directory, "wiki")
+    build_index(SAMPLE_DUMP, index_dir)
+    index = WikiIndex(index_dir)
+    queries = ["python programming", "CNSS", "mmap", "Moroco", "sqlite", "Casa"] * 200
+    start = time.perf_counter()
+    for query in queries:
+        index.run(query)
+    results.add("tools.wiki_index_lookups_per_s", len(queries) / (time.perf_counter() - start), "lookups/s",
+                higher_is_better=True)
+    index.close()
+
+    import tools
+
+    path = os.path.join(directory, "research_output.txt")
+    n = 2000
+    start = time.perf_counter()
+    for i in range(n):
+        tools.save_to_txt(f"finding {i}: " + "lorem ipsum " * 20, path)
+    queued = time.perf_counter() - start
+    tools.record_writer.flush()
+    written = time.perf_counter() - start
+    results.add("tools.save_to_txt_call_us", queued / n * 1e6, "us")
+    results.add("tools.save_to_txt_records_per_s", n / written, "records/s", higher_is_better=True)
+
+
+# --- Comparing runs ---
+
+def compare(current, previous, threshold):
+    """Prints the metrics of both runs side by side; returns the names of those that regressed."""
+    regressed = []
+    print(f"\n{'metric':50} {'before':>12} {'after':>12} {'change':>8}")
+    for name, metric in current["metrics"].items():
+        before = previous["metrics"].get(name)
+        if before is None or before["value"] == 0:
+            continue
+        change = (metric["value"] - before["value"]) / abs(before["value"])
+        worse = -change if metric["higher_is_better"] else change
+        flag = "  REGRESSED" if worse > threshold else ""
+        if flag:
+            regressed.append(name)
+        print(f"{name:50} {before['value']:12.3f} {metric['value']:12.3f} {change:+7.0%}{flag}")
+    return regressed
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=ROOT, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", help=f"messages per history (default {SIZES})")
+    parser.add_argument("--quick", action="store_true", help=f"sizes {QUICK_SIZES} and fewer turns")
+    parser.add_argument("--sections", nargs="+", choices=SECTIONS, default=SECTIONS)
+    parser.add_argument("--turns", type=int, default=20, help="turns sent per history size")
+    parser.add_argument("--latency", type=float, default=0.02, help="mock model latency, s")
+    parser.add_argument("--token-interval", type=float, default=0.001)
+    parser.add_argument("--out", help="results file (default: benchmarks/results/<time>.json)")
+    parser.add_argument("--compare", help="an earlier results file")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help="relative change counted as a regression")
+    args = parser.parse_args()
+    args.sizes = args.sizes or (QUICK_SIZES if args.quick else SIZES)
+    if args.quick:
+        args.turns = min(args.turns, 10)
+
+    results = Results()
+    started = time.time()
+    with tempfile.TemporaryDirectory() as directory:
+        for section in args.sections:
+            print(f"[{section}]")
+            start = time.perf_counter()
+            globals()[f"bench_{section}"](args, results, directory)
+            print(f"  ({time.perf_counter() - start:.1f} s)")
+
+    report = {
+        "meta": {
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(started)),
+            "seconds": round(time.time() - started, 1),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "sizes": args.sizes,
+            "sections": args.sections,
+            "turns": args.turns,
+            "mock_latency": args.latency,
+        },
+        "metrics": results.metrics,
+        "skipped": results.skipped,
+    }
+    out = args.out or os.path.join(RESULTS_DIR, time.strftime("%Y%m%d-%H%M%S", time.localtime(started)) + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nWrote {len(results.metrics)} metrics to {out}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressed = compare(report, json.load(f), args.threshold)
+        print(f"{len(regressed)} regressed by more than {args.threshold:.0%}")
+        sys.exit(1 if regressed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,397 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import llm
+from chat_store import ChatStore, Message, DB_FILE
+from context import ContextWindow
+from telemetry import telemetry
+
+# The chat logic shared by main.py, gui_tkinter.py and batch.py, with no Tk
+# in it: the chat list, sending a message through the context window, the
+# reply cache and the model, and saving both sides of the exchange.
+#
+# The blocking calls (request_reply, stream_reply) are meant for worker
+# threads; the GUIs run them on their RequestWorker and feed the results
+# back with add_reply/finish_stream on the Tk thread. send() and
+# send_stream() are the same round trip as coroutines, for asyncio callers;
+# they run the store and cache reads and writes on the executor too, so a
+# slow disk holds up one turn rather than the event loop.
+#
+# With a router.Router the model calls go to whichever of its backends is
+# fastest and healthy instead of always to self.model. The reply cache is
+# keyed by model, so it is only used for replies from self.model itself: not
+# with a router, whose backends are other models, nor for the agent's turns.
+# With an agent.Agent whose tools loaded, the model may call those tools
+# before it answers; the agent talks to its own model, not the router.
+# With a memory.Memory every saved message is also embedded, and each request
+# carries the snippets of other chats most like the new message. A memory
+# that hasn't seen the archive yet is filled from it on a background thread,
+# chat by chat; recall works on whatever is in it so far.
+
+MODEL = "gpt-4o-mini"
+
+# Chats are created with this title and renamed after their first message
+NEW_CHAT_TITLE = "New Chat"
+TITLE_LENGTH = 30
+
+# Model calls that send()/send_stream() keep in flight at once. They are
+# I/O-bound, so this is well above asyncio's CPU-sized default executor.
+MAX_CONCURRENT_REQUESTS = 32
+
+# Chunks send_stream() buffers ahead of a slow consumer before the model
+# stream is paused
+STREAM_BUFFER = 64
+
+ERROR_REPLY = "Error: Failed to connect to OpenAI. Check your API key and network. ({})"
+
+
+def derive_title(text):
+    """A chat title from its first message."""
+    return text[:TITLE_LENGTH] + "..." if len(text) > TITLE_LENGTH else text
+
+
+class ChatEngine:
+    """Chats and their messages, and the request/reply round trip for one model."""
+
+    def __init__(self, store=None, model=MODEL, context=None, response_cache=None, cache_replies=True,
+                 client=None, limiter=None, router=None, agent=None, executor=None,
+                 memory=None):
+        self.store = store if store is not None else ChatStore(DB_FILE)
+        self.model = model
+        self.context = context or ContextWindow()
+        self.response_cache = response_cache
+        if response_cache is not None and cache_replies:
+            if router is None:
+                response_cache.enable(model)
+            else:
+                print("ChatEngine: reply cache off; replies through the router don't all come from one model")
+        self.client = client    # None: the shared client from llm.get_client()
+        self.limiter = limiter  # None: llm.rate_limiter
+        self.router = router    # None: every call goes to self.model
+        self.agent = agent
+        self.memory = None
+        self.chats = self.store.load_index()  # Titles only; messages are paged in on demand
+        self._streams = []  # (chat, Message) of replies still streaming in
+        self._lock = threading.Lock()
+        self._executor = executor  # For the asyncio API; one of its own is created on first use
+        self._own_executor = executor is None
+        self._backfill = None  # Thread filling a new memory from the archive
+        self._closing = threading.Event()
+        if memory is not None:
+            self.attach_memory(memory)
+
+    # --- Memory ---
+
+    def attach_memory(self, memory):
+        """Starts remembering saved messages and recalling them into requests. Returns at once.
+
+        The messages saved before the memory's first use are added by a
+        background thread, which picks up where it stopped if the app closed
+        before it was done.
+        """
+        if self._closing.is_set():
+            memory.close()  # Opened on another thread as the app was closing
+            return
+        self.memory = memory
+        if memory.setting("backfill_done") is not None:
+            return
+        up_to = memory.setting("backfill_up_to")
+        if up_to is None:
+            up_to = self.store.last_message_id()  # Newer messages are remembered as they are saved
+            memory.set_setting("backfill_up_to", up_to)
+        self._backfill = threading.Thread(target=self._fill_memory, args=(memory, int(up_to)),
+                                          name="memory-backfill", daemon=True)
+        self._backfill.start()
+
+    def wait_for_memory(self, timeout=None):
+        """Waits for the background fill of the memory; returns whether it is done."""
+        if self._backfill is not None:
+            self._backfill.join(timeout)
+            return not self._backfill.is_alive()
+        return True
+
+    def _fill_memory(self, memory, up_to):
+        done = int(memory.setting("backfill_chat") or 0)
+        for chat in self.store.load_index():
+            if self._closing.is_set():
+                return
+            if chat["id"] <= done:
+                continue
+            with telemetry.span("memory.backfill"):
+                memory.add(chat["id"], self.store.read_messages(chat, up_to))
+            if self.find(chat["id"]) is None:
+                memory.forget(chat["id"])  # Deleted while it was being read
+            memory.set_setting("backfill_chat", chat["id"])
+        memory.set_setting("backfill_done", 1)
+
+    # --- Chats ---
+
+    def messages(self, chat):
+        """The chat's stored messages; owned by the store, so don't modify the list."""
+        return self.store.get_messages(chat)
+
+    def index(self, chat):
+        """Position of chat in self.chats, or None if it was deleted."""
+        return next((i for i, c in enumerate(self.chats) if c is chat), None)
+
+    def find(self, chat_id):
+        return next((c for c in self.chats if c["id"] == chat_id), None)
+
+    def new_chat(self, title=None):
+        chat = {"title": title or NEW_CHAT_TITLE}
+        self.store.add_chat(chat)
+        with self._lock:
+            self.chats.append(chat)
+        return chat
+
+    def rename_chat(self, chat, title):
+        chat["title"] = title
+        self.store.set_title(chat)
+
+    def delete_chat(self, chat):
+        with self._lock:
+            idx = self.index(chat)
+            if idx is not None:
+                del self.chats[idx]  # In place: the GUIs hold on to this list
+            self._streams = [s for s in self._streams if s[0] is not chat]
+        self.store.delete_chat(chat)
+        self.context.forget(chat["id"])
+        if self.memory is not None:
+            self.memory.forget(chat["id"])
+
+    def search(self, text):
+        return self.store.search(text)
+
+    def close(self):
+        self._closing.set()
+        if self._backfill is not None:
+            self._backfill.join()  # At most the chat it is on
+        if self.router is not None:
+            self.router.shutdown()
+        if self.agent is not None:
+            self.agent.shutdown()
+        if self._executor is not None and self._own_executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        self.store.close()
+        if self.memory is not None:
+            self.memory.close()
+        if self.response_cache is not None:
+            self.response_cache.close()
+
+    # --- Messages ---
+
+    def add_user_message(self, chat, text):
+        """Saves a user message; a chat still titled "New Chat" is named after it.
+
+        Returns (message, renamed).
+        """
+        msg = Message("user", text)
+        with telemetry.span("store.append", role="user"):
+            self.store.append_message(chat, msg)
+        self._remember(chat, msg)
+        renamed = chat["title"] == NEW_CHAT_TITLE and len(self.messages(chat)) == 1
+        if renamed:
+            self.rename_chat(chat, derive_title(text))
+        return msg, renamed
+
+    def build_request(self, chat):
+        """The api_messages for the chat's next reply."""
+        messages = self.messages(chat)
+        api_messages = self.context.build(chat["id"], messages)
+        if self.memory is not None and messages:
+            with telemetry.span("memory.recall"):
+                recalled = self.memory.recall(messages[-1].text, chat["id"], self._title_of)
+            if recalled is not None:
+                # After the system prompt and summary, before the turns
+                at = next((i for i, m in enumerate(api_messages) if m["role"] != "system"), len(api_messages))
+                api_messages.insert(at, recalled)
+        return api_messages
+
+    def _remember(self, chat, msg):
+        if self.memory is not None:
+            with telemetry.span("memory.add"):
+                self.memory.add(chat["id"], [msg])
+
+    def _title_of(self, chat_id):
+        chat = self.find(chat_id)
+        return chat["title"] if chat is not None else None
+
+    def cached_reply(self, api_messages):
+        """A reply to the same prompt from the cache, or None."""
+        if self.response_cache is None or not self._direct():
+            return None
+        return self.response_cache.get(self.model, api_messages)
+
+    def add_reply(self, chat, result, ts=None):
+        """Saves a finished reply, or the error that ended the request, as one message.
+
+        Returns the Message, or None if the chat was deleted in the meantime.
+        """
+        if self.index(chat) is None:
+            return None
+        text = ERROR_REPLY.format(result) if isinstance(result, Exception) else result
+        msg = Message("assistant", text.strip(), ts)
+        with telemetry.span("store.append", role="assistant"):
+            self.store.append_message(chat, msg)
+        if not isinstance(result, Exception):
+            self._remember(chat, msg)
+        return msg
+
+    # --- Streaming replies ---
+
+    def start_stream(self, chat):
+        """Returns the placeholder Message that a streamed reply grows into."""
+        msg = Message("assistant", "")
+        with self._lock:
+            self._streams.append((chat, msg))
+        return msg
+
+    def streaming(self, chat):
+        """Placeholders of the chat's replies that are still streaming in."""
+        return [msg for c, msg in self._streams if c is chat]
+
+    def finish_stream(self, chat, msg, result):
+        """Saves a streamed reply once it has ended; see add_reply."""
+        with self._lock:
+            self._streams = [s for s in self._streams if s[1] is not msg]
+        return self.add_reply(chat, result, msg.ts)
+
+    # --- Model calls (worker threads) ---
+
+    def request_reply(self, api_messages):
+        """Calls the model and returns the reply text. Blocks."""
+        direct = self._direct()
+        with telemetry.span("api.total", model=self.model, stream=False):
+            if self._use_agent():
+                reply, _ = self.agent.run(api_messages)
+            elif self.router is not None:
+                reply = self.router.complete(api_messages)
+            else:
+                response = llm.create_completion(self.client, self.limiter, model=self.model, messages=api_messages)
+                telemetry.record_usage(getattr(response, "usage", None), self.model)
+                reply = response.choices[0].message.content.strip()
+        if self.response_cache is not None and direct:
+            self.response_cache.put(self.model, api_messages, reply)
+        return reply
+
+    def stream_reply(self, api_messages):
+        """Yields the reply text as it streams in. Blocks between chunks."""
+        parts = []
+        direct = self._direct()
+        start = time.perf_counter()
+        for part in self._stream_parts(api_messages):
+            if not parts:
+                telemetry.record("api.ttft", time.perf_counter() - start, model=self.model)
+            parts.append(part)
+            yield part
+        telemetry.record("api.total", time.perf_counter() - start, model=self.model, stream=True)
+        if self.response_cache is not None and direct:
+            self.response_cache.put(self.model, api_messages, "".join(parts).strip())
+
+    def _use_agent(self):
+        # Loads the tools on first use; without them the agent adds nothing
+        return self.agent is not None and bool(self.agent.tools)
+
+    def _direct(self):
+        """Whether the reply comes straight from self.model, and so may be cached under it."""
+        return not self._use_agent() and self.router is None
+
+    def _stream_parts(self, api_messages):
+        if self._use_agent():
+            yield from self.agent.stream(api_messages)
+            return
+        if self.router is not None:
+            yield from self.router.stream(api_messages)
+            return
+        # The last chunk carries the token usage, with no choices
+        stream = llm.create_completion(self.client, self.limiter, model=self.model, messages=api_messages, stream=True,
+                                       stream_options={"include_usage": True})
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+            elif getattr(chunk, "usage", None) is not None:
+                telemetry.record_usage(chunk.usage, self.model)
+
+    # --- asyncio ---
+
+    def _run_blocking(self, fn, *args):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(MAX_CONCURRENT_REQUESTS, thread_name_prefix="chat-engine")
+        return asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    def _prepare(self, chat, text):
+        """Saves the user message; returns the api_messages and a cached reply or None."""
+        self.add_user_message(chat, text)
+        api_messages = self.build_request(chat)
+        return api_messages, self.cached_reply(api_messages)
+
+    def _answer(self, chat, api_messages):
+        try:
+            result = self.request_reply(api_messages)
+        except Exception as e:
+            result = e
+        return self.add_reply(chat, result)
+
+    async def send(self, chat, text):
+        """Sends a user message and returns the saved reply Message."""
+        api_messages, cached = await self._run_blocking(self._prepare, chat, text)
+        if cached is not None:
+            return await self._run_blocking(self.add_reply, chat, cached)
+        return await self._run_blocking(self._answer, chat, api_messages)
+
+    async def send_stream(self, chat, text):
+        """Sends a user message and yields the reply text as it arrives.
+
+        The reply is saved when the stream ends, like finish_stream. At most
+        STREAM_BUFFER chunks are queued for a consumer that falls behind; then
+        reading from the model waits for it.
+        """
+        api_messages, cached = await self._run_blocking(self._prepare, chat, text)
+        if cached is not None:
+            await self._run_blocking(self.add_reply, chat, cached)
+            yield cached
+            return
+
+        msg = self.start_stream(chat)
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(STREAM_BUFFER)
+        done = object()
+        stopped = threading.Event()  # The consumer went away
+
+        def put(item):
+            # Blocks this worker thread while the queue is full
+            asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+
+        def pump():
+            parts = self.stream_reply(api_messages)
+            try:
+                for part in parts:
+                    if stopped.is_set():
+                        return
+                    put(part)
+                put(done)
+            except Exception as e:
+                if not stopped.is_set():
+                    put(e)
+            finally:
+                parts.close()  # Closes the model stream if the consumer left early
+
+        self._run_blocking(pump)
+        result = None
+        try:
+            while True:
+                part = await queue.get()
+                if part is done:
+                    break
+                if isinstance(part, Exception):
+                    result = part
+                    break
+                msg.text += part
+                yield part
+        finally:
+            stopped.set()
+            while not queue.empty():
+                queue.get_nowait()  # Unblocks the pump if it is waiting on a full queue
+            await self._run_blocking(self.finish_stream, chat, msg, result if result is not None else msg.text)
@@ -0,0 +1,355 @@
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from functools import lru_cache
+
+# SQLite-backed chat storage: one row per message, so saving a reply is a
+# single INSERT no matter how large the archive grows. WAL journaling keeps
+# every write atomic and crash-safe; compact() folds the WAL back into the
+# database file. The pages a deleted chat leaves free are given back as it
+# is deleted (auto_vacuum=INCREMENTAL), which costs about as much as the
+# delete did, rather than by a VACUUM that rewrites the whole file.
+#
+# Startup only reads the chats table (id + title), which is all the sidebar
+# needs. A chat's messages are paged in through the (chat_id, id) index the
+# first time it is opened and kept in a small LRU of recently used chats.
+# Messages are Message records (three slots, timestamp as an int) rather
+# than dicts, which keeps a cached chat at about a third of the memory.
+#
+# Message text and chat titles are also indexed with FTS5. The index tables
+# only hold the inverted index (the text stays in messages/chats) and are
+# kept in sync by triggers, so every insert, rename and delete - including
+# the cascade from deleting a chat - updates them in the same transaction.
+
+DB_FILE = "chat_history.db"
+
+# Checkpoint the WAL after this many writes
+COMPACT_EVERY = 500
+
+# Number of chats whose messages stay in memory
+CACHE_SIZE = 32
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chats (
+    id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    chat_id INTEGER NOT NULL REFERENCES chats(id) ON DELETE CASCADE,
+    role TEXT NOT NULL,
+    text TEXT NOT NULL,
+    ts INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS messages_by_chat ON messages(chat_id, id);
+"""
+
+SEARCH_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+    text, content='messages', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS chats_fts USING fts5(
+    title, content='chats', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS messages_ai AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts (rowid, text) VALUES (new.id, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_ad AFTER DELETE ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, text) VALUES ('delete', old.id, old.text);
+END;
+CREATE TRIGGER IF NOT EXISTS chats_ai AFTER INSERT ON chats BEGIN
+    INSERT INTO chats_fts (rowid, title) VALUES (new.id, new.title);
+END;
+CREATE TRIGGER IF NOT EXISTS chats_ad AFTER DELETE ON chats BEGIN
+    INSERT INTO chats_fts (chats_fts, rowid, title) VALUES ('delete', old.id, old.title);
+END;
+CREATE TRIGGER IF NOT EXISTS chats_au AFTER UPDATE OF title ON chats BEGIN
+    INSERT INTO chats_fts (chats_fts, rowid, title) VALUES ('delete', old.id, old.title);
+    INSERT INTO chats_fts (rowid, title) VALUES (new.id, new.title);
+END;
+"""
+
+# Most search results returned by search()
+SEARCH_LIMIT = 50
+
+
+def fts_query(text):
+    """Turns free text into an FTS5 query: every word must match, the last one as a prefix.
+
+    Words are quoted, so punctuation and FTS5 operators typed by the user are
+    treated as plain text. Returns None if there is nothing to search for.
+    """
+    words = ['"' + word.replace('"', '""') + '"' for word in text.split()]
+    if not words:
+        return None
+    words[-1] += "*"
+    return " ".join(words)
+
+
+@lru_cache(maxsize=4096)
+def format_minute(minute):
+    """Display time ("%H:%M") of a Unix time in whole minutes; cached, as messages share minutes."""
+    return datetime.fromtimestamp(minute * 60).strftime("%H:%M")
+
+
+class Message:
+    """One chat message: role, text and a Unix timestamp in whole seconds."""
+
+    __slots__ = ("role", "text", "ts")
+
+    def __init__(self, role, text, ts=None):
+        self.role = role
+        self.text = text
+        self.ts = int(time.time()) if ts is None else ts
+
+    @property
+    def time(self):
+        """Display time, "%H:%M" in local time."""
+        return format_minute(self.ts // 60)
+
+    def to_dict(self):
+        """The chat_history.json form: {"role", "text", "time"}."""
+        return {"role": self.role, "text": self.text, "time": self.time}
+
+    @classmethod
+    def from_dict(cls, msg, day=None):
+        """Reads a chat_history.json message.
+
+        Its time is "%H:%M" with no date, so it is placed on day (by default
+        today); a message without a valid time gets the current time.
+        """
+        try:
+            clock = datetime.strptime(msg["time"], "%H:%M").time()
+            ts = int(datetime.combine(day or date.today(), clock).timestamp())
+        except (KeyError, TypeError, ValueError):
+            ts = None
+        return cls(msg["role"], msg["text"], ts)
+
+    def __repr__(self):
+        return f"Message({self.role!r}, {self.text!r}, {self.ts!r})"
+
+
+class ChatStore:
+    """Persists chats, one message per row.
+
+    Chats are {"id", "title"} dicts; get_messages(chat) returns the list of
+    Message records for one of them. Safe to use from several threads.
+    """
+
+    def __init__(self, path=DB_FILE, cache_size=CACHE_SIZE):
+        self.path = path
+        self.created = path == ":memory:" or not os.path.exists(path)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.RLock()  # Held across a write and its cache update
+        self._writes = 0
+        self._cache = OrderedDict()
+        self.cache_size = cache_size
+        # Only takes effect on a new database, so it comes before WAL mode and the tables
+        self._conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(SCHEMA)
+        self._conn.executescript(SEARCH_SCHEMA)
+
+    # --- Reading ---
+
+    def load_index(self):
+        """Returns every chat as an {"id", "title"} dict, in creation order."""
+        with self._lock:
+            rows = self._conn.execute("SELECT id, title FROM chats ORDER BY id").fetchall()
+        return [{"id": chat_id, "title": title} for chat_id, title in rows]
+
+    def get_messages(self, chat):
+        """Returns a chat's messages, reading them from disk if not cached.
+
+        The list is owned by the store: add messages with append_message()
+        rather than appending to it directly.
+        """
+        chat_id = chat["id"]
+        with self._lock:
+            messages = self._cache.get(chat_id)
+            if messages is None:
+                rows = self._conn.execute(
+                    "SELECT role, text, ts FROM messages WHERE chat_id = ? ORDER BY id", (chat_id,)
+                ).fetchall()
+                messages = [Message(role, text, ts) for role, text, ts in rows]
+            self._remember(chat_id, messages)
+        return messages
+
+    def _remember(self, chat_id, messages):
+        # Called with self._lock held
+        self._cache[chat_id] = messages
+        self._cache.move_to_end(chat_id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def load_chats(self):
+        """Returns every chat with its messages under "messages". Reads the whole archive."""
+        with self._lock:
+            chats = {
+                chat_id: {"id": chat_id, "title": title, "messages": []}
+                for chat_id, title in self._conn.execute("SELECT id, title FROM chats ORDER BY id")
+            }
+            rows = self._conn.execute("SELECT chat_id, role, text, ts FROM messages ORDER BY id")
+            for chat_id, role, text, ts in rows:
+                chats[chat_id]["messages"].append(Message(role, text, ts))
+        return list(chats.values())
+
+    def read_messages(self, chat, up_to=None):
+        """A chat's messages straight from disk, leaving the cache alone; with up_to, only rows up to that id.
+
+        For going over the whole archive chat by chat in the background.
+        """
+        with self._lock:
+            if up_to is None:
+                up_to = self.last_message_id()
+            rows = self._conn.execute(
+                "SELECT role, text, ts FROM messages WHERE chat_id = ? AND id <= ? ORDER BY id", (chat["id"], up_to)
+            ).fetchall()
+        return [Message(role, text, ts) for role, text, ts in rows]
+
+    def last_message_id(self):
+        """Row id of the newest message, or 0 if there are none."""
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(MAX(id), 0) FROM messages").fetchone()[0]
+
+    # --- Searching ---
+
+    def search(self, text, limit=SEARCH_LIMIT):
+        """Finds chats whose title or messages contain every word of text.
+
+        Returns up to limit hits, title matches first and then messages from
+        newest to oldest, as {"chat_id", "title", "index", "snippet"} dicts.
+        "index" is the message's position in get_messages() of that chat, or
+        None for a title match.
+        """
+        query = fts_query(text)
+        if query is None:
+            return []
+        with self._lock:
+            hits = [
+                {"chat_id": chat_id, "title": title, "index": None, "snippet": title}
+                for chat_id, title in self._conn.execute(
+                    "SELECT rowid, title FROM chats_fts WHERE chats_fts MATCH ? ORDER BY rowid DESC LIMIT ?",
+                    (query, limit)
+                )
+            ]
+            rows = self._conn.execute(
+                "SELECT m.id, m.chat_id, c.title, snippet(messages_fts, 0, '', '', '...', 12) "
+                "FROM messages_fts JOIN messages m ON m.id = messages_fts.rowid JOIN chats c ON c.id = m.chat_id "
+                "WHERE messages_fts MATCH ? ORDER BY messages_fts.rowid DESC LIMIT ?",
+                (query, limit - len(hits))
+            ).fetchall()
+            for message_id, chat_id, title, snippet in rows:
+                index = self._conn.execute(
+                    "SELECT COUNT(*) FROM messages WHERE chat_id = ? AND id < ?", (chat_id, message_id)
+                ).fetchone()[0]
+                hits.append({"chat_id": chat_id, "title": title, "index": index, "snippet": snippet})
+        return hits
+
+    # --- Writing ---
+
+    def _write(self, sql, params=()):
+        with self._lock, self._conn:
+            cursor = self._conn.execute(sql, params)
+            self._writes += 1
+        if self._writes % COMPACT_EVERY == 0:
+            self.compact()
+        return cursor
+
+    def add_chat(self, chat, messages=()):
+        """Inserts a new chat, optionally with existing messages; sets chat["id"]."""
+        with self._lock, self._conn:
+            self._insert_chat(chat, messages)
+            self._remember(chat["id"], list(messages))
+
+    def _insert_chat(self, chat, messages):
+        # Called with self._lock held, inside a transaction
+        chat["id"] = self._conn.execute("INSERT INTO chats (title) VALUES (?)", (chat["title"],)).lastrowid
+        self._conn.executemany(
+            "INSERT INTO messages (chat_id, role, text, ts) VALUES (?, ?, ?, ?)",
+            [(chat["id"], m.role, m.text, m.ts) for m in messages]
+        )
+        self._writes += 1
+
+    def set_title(self, chat):
+        """Saves a renamed chat."""
+        self._write("UPDATE chats SET title = ? WHERE id = ?", (chat["title"], chat["id"]))
+
+    def append_message(self, chat, msg):
+        """Saves one new Message at the end of a chat."""
+        with self._lock:
+            self._write(
+                "INSERT INTO messages (chat_id, role, text, ts) VALUES (?, ?, ?, ?)",
+                (chat["id"], msg.role, msg.text, msg.ts)
+            )
+            messages = self._cache.get(chat["id"])
+            if messages is not None:
+                messages.append(msg)
+
+    def delete_chat(self, chat):
+        """Removes a chat and all of its messages."""
+        with self._lock:
+            self._write("DELETE FROM chats WHERE id = ?", (chat["id"],))
+            self._cache.pop(chat["id"], None)
+            # executescript steps the pragma to the end; execute() would free one page
+            self._conn.executescript("PRAGMA incremental_vacuum;")
+
+    # --- Maintenance ---
+
+    def compact(self):
+        """Checkpoints the WAL into the main database file and truncates it."""
+        with self._lock:
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def close(self):
+        """Compacts and closes the database."""
+        self.compact()
+        self._conn.close()
+
+    # --- Legacy chat_history.json ---
+
+    def import_json(self, path):
+        """Imports chats from the old chat_history.json format, in one transaction.
+
+        Raises ValueError (json.JSONDecodeError if it isn't JSON at all) if
+        the file is corrupt or any chat in it is malformed; nothing is
+        imported in that case.
+        """
+        with open(path, "r") as f:
+            data = json.load(f)
+        chats = []
+        today = date.today()
+        try:
+            for chat in data:
+                messages = [Message.from_dict(m, today) for m in chat.get("messages", [])]
+                if not isinstance(chat["title"], str) or any(not isinstance(m.text, str) for m in messages):
+                    raise TypeError("title and message text must be strings")
+                chats.append(({"title": chat["title"]}, messages))
+        except (AttributeError, KeyError, TypeError) as e:
+            raise ValueError(f"{path}: malformed chat {len(chats)}: {e!r}") from None
+        with self._lock, self._conn:
+            for chat, messages in chats:
+                self._insert_chat(chat, messages)
+        return len(chats)
+
+    def export_json(self, path):
+        """Writes every chat in the old chat_history.json format, atomically."""
+        chats = [{"title": c["title"], "messages": [m.to_dict() for m in c["messages"]]} for c in self.load_chats()]
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(chats, f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
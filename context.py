@@ -0,0 +1,119 @@
+import threading
+from functools import lru_cache
+
+# Bounds the payload sent to the model on each turn.
+# Instead of sending every message of a chat, ContextWindow keeps:
+#   - an optional pinned system prompt, always first;
+#   - a rolling summary of the turns that no longer fit (optional);
+#   - a sliding window of the most recent messages that fit the token budget.
+# The window only ever moves forward, so the summary is extended with newly
+# evicted turns rather than recomputed, and per-message token counts are
+# cached, making each build proportional to the window, not the chat.
+
+MAX_CONTEXT_TOKENS = 3000
+
+# Upper bound on the rolling summary, reserved out of the budget
+SUMMARY_TOKENS = 300
+
+# Per-message overhead of the chat format (role, separators)
+MESSAGE_OVERHEAD = 4
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+_encoding = None
+_encoding_failed = False  # Loading it failed (e.g. offline); not retried for every new string
+
+
+@lru_cache(maxsize=16384)
+def count_tokens(text):
+    """Token count of text; tiktoken when installed, else ~4 characters per token.
+
+    Cached by string: message texts are long-lived objects whose hash Python
+    keeps, so a repeat lookup does not rescan the text.
+    """
+    global _encoding, _encoding_failed
+    if tiktoken is not None and not _encoding_failed:
+        if _encoding is None:
+            try:
+                _encoding = tiktoken.get_encoding("cl100k_base")
+            except Exception:
+                _encoding_failed = True  # Encoding files unavailable offline; use the estimate from now on
+                return len(text) // 4 + 1
+        return len(_encoding.encode(text))
+    return len(text) // 4 + 1
+
+
+def message_tokens(msg):
+    return count_tokens(msg.text) + MESSAGE_OVERHEAD
+
+
+def summarize_turns(summary, messages, max_tokens=SUMMARY_TOKENS):
+    """Default summarizer: folds the first sentence of each evicted turn into the summary.
+
+    Cheap and offline. Pass a different callable with the same signature to
+    ContextWindow (e.g. one that asks the model) for an abstractive summary.
+    """
+    lines = summary.splitlines() if summary else []
+    for msg in messages:
+        first_sentence = msg.text.strip().split("\n", 1)[0].split(". ", 1)[0][:200]
+        lines.append(f"{msg.role}: {first_sentence}")
+    # Keep the most recent lines that fit
+    kept, total = [], 0
+    for line in reversed(lines):
+        total += count_tokens(line) + 1
+        if total > max_tokens:
+            break
+        kept.append(line)
+    return "\n".join(reversed(kept))
+
+
+class ContextWindow:
+    """Builds the api_messages for a chat within a token budget."""
+
+    def __init__(self, max_tokens=MAX_CONTEXT_TOKENS, system_prompt=None, summarize=summarize_turns,
+                 summary_tokens=SUMMARY_TOKENS):
+        self.max_tokens = max_tokens
+        self.system_prompt = system_prompt
+        self.summarize = summarize
+        self.summary_tokens = summary_tokens if summarize else 0
+        self._lock = threading.Lock()
+        self._state = {}  # chat id -> (index of first message in the window, summary)
+
+    def build(self, chat_id, messages):
+        """Returns the role/content payload for a chat's Message records."""
+        budget = self.max_tokens - self.summary_tokens
+        if self.system_prompt:
+            budget -= count_tokens(self.system_prompt) + MESSAGE_OVERHEAD
+
+        with self._lock:
+            start, summary = self._state.get(chat_id, (0, ""))
+            if start > len(messages):
+                start, summary = 0, ""  # The chat shrank; start over
+
+            # Walk back from the newest message until the budget is spent;
+            # the latest message is always sent, even if it alone is too big
+            first = len(messages) - 1 if messages else 0
+            used = message_tokens(messages[first]) if messages else 0
+            while first > start and used + message_tokens(messages[first - 1]) <= budget:
+                first -= 1
+                used += message_tokens(messages[first])
+
+            if first > start and self.summarize:
+                summary = self.summarize(summary, messages[start:first])
+            self._state[chat_id] = (first, summary)
+
+        api_messages = []
+        if self.system_prompt:
+            api_messages.append({"role": "system", "content": self.system_prompt})
+        if summary:
+            api_messages.append({"role": "system", "content": f"Summary of the earlier conversation:\n{summary}"})
+        api_messages += [{"role": m.role, "content": m.text} for m in messages[first:]]
+        return api_messages
+
+    def forget(self, chat_id):
+        """Drops the window and summary of a deleted chat."""
+        with self._lock:
+            self._state.pop(chat_id, None)
@@ -1,11 +1,18 @@
 import customtkinter as ctk
 import tkinter as tk # Kept for simpledialog, messagebox
 from tkinter import simpledialog, messagebox
-import json
 import os
-from datetime import datetime
-from openai import OpenAI
-from dotenv import load_dotenv
+import threading
+from llm import prewarm
+from worker import RequestWorker
+from chat_store import ChatStore, DB_FILE
+from chat_engine import ChatEngine
+from router import Router, default_backends
+from agent import Agent
+from response_cache import ResponseCache
+from telemetry import telemetry, DebugOverlay
+from views import ChatSidebar, MessageList
+from view_cache import ViewCache
 
 # --- Configuration and Initialization ---
 
@@ -13,40 +20,81 @@ from dotenv import load_dotenv
 ctk.set_appearance_mode("System")  # Modes: "System", "Dark", "Light"
 ctk.set_default_color_theme("blue") # Themes: "blue", "green", "dark-blue"
 
-# Load environment variables
-load_dotenv()
-
-# Initialize the OpenAI client
-try:
-    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-except Exception as e:
-    print(f"OpenAI Client Initialization Error: {e}")
-    client = None
+# The OpenAI client (and .env) are loaded by llm.get_client() on first use,
+# and pre-warmed in the background once the window has painted
 
 CHAT_FILE = "chat_history.json"
+MODEL = "gpt-4o-mini"
 SIDEBAR_WIDTH = 220
 
-# Load chat history
-if os.path.exists(CHAT_FILE):
+# Stream replies into their bubble as tokens arrive
+STREAM_REPLIES = True
+
+# Background executor for API calls; replies are polled back onto the Tk thread
+worker = RequestWorker()
+
+# Reuse replies to identical prompts from an on-disk cache. Off by default: at
+# the model's sampling temperature that replays one sampled answer. Only
+# replies straight from MODEL are cached, so this also needs ROUTE_REPLIES and
+# USE_TOOLS off.
+CACHE_REPLIES = False
+
+# Send requests to the fastest healthy backend, falling back to (and hedging
+# slow requests with) Anthropic when its key is configured
+ROUTE_REPLIES = True
+
+# Let the model call the research tools in tools.py (web search, Wikipedia,
+# saving notes) before it answers. Off by default: the agent loop talks to
+# MODEL directly, since the router's backends don't do tool calls, so with
+# it on the router (failover, hedging) is bypassed whenever the tools load
+USE_TOOLS = False
+
+# Remember every message of every chat (embedded offline, under MEMORY_DIR)
+# and send the few snippets of other chats most like each new message along
+# with it, so an earlier conversation can be picked up from a new chat. Off by
+# default: the offline embedder matches words, not meaning, so some of what
+# it recalls is beside the point
+USE_MEMORY = False
+MEMORY_DIR = "memory"
+
+# Phase timings (API, persistence, rendering) are always kept for the debug
+# overlay (F12). Set a file to also log every sample as JSONL, or a port to
+# serve them at http://127.0.0.1:<port>/metrics for Prometheus.
+TELEMETRY_FILE = None # e.g. "telemetry.jsonl"
+METRICS_PORT = None   # e.g. 9464
+telemetry.configure(TELEMETRY_FILE, METRICS_PORT)
+
+# Recently shown chats keep their own MessageList, so switching back to one
+# only swaps frames. Hidden ones are kept up to date as messages arrive and
+# dropped, least recently shown first, past VIEW_CACHE_SIZE chats or
+# VIEW_CACHE_BYTES of estimated widget memory (BUBBLE_BYTES per built bubble).
+VIEW_CACHE_SIZE = 6
+VIEW_CACHE_BYTES = 32 * 1024 * 1024
+BUBBLE_BYTES = 64 * 1024
+
+# Sidebar search: runs shortly after the last keystroke against the store's full-text index
+SEARCH_DELAY_MS = 150
+search_job = None
+
+# Load chat history. Chats live in a SQLite store that saves one message at
+# a time; the old chat_history.json is imported the first time it is opened.
+store = ChatStore(DB_FILE)
+if store.created and os.path.exists(CHAT_FILE):
     try:
-        with open(CHAT_FILE, "r") as f:
-            chat_history = json.load(f)
-    except json.JSONDecodeError:
+        store.import_json(CHAT_FILE)
+    except ValueError: # Corrupt or malformed; nothing was imported
         messagebox.showerror("Error", "Could not load chat history. Starting a new session.")
-        chat_history = []
-else:
-    chat_history = []
+
+# Chats, messages and the request/reply round trip; this module only draws them
+router = Router(default_backends(MODEL)) if ROUTE_REPLIES else None
+agent = Agent(model=MODEL) if USE_TOOLS else None
+response_cache = ResponseCache() if CACHE_REPLIES else None # Its file is only created when it is used
+engine = ChatEngine(store, MODEL, response_cache=response_cache, router=router, agent=agent)
+chat_history = engine.chats # Titles only; messages are paged in by load_chat
 
 # Track the currently selected chat
 current_chat_idx = 0 if chat_history else None
 
-# --- Core Data Functions ---
-
-def save_chats():
-    """Saves the current chat history to a JSON file."""
-    with open(CHAT_FILE, "w") as f:
-        json.dump(chat_history, f, indent=2)
-
 # --- GUI Logic Functions ---
 
 def send_message(event=None):
@@ -57,192 +105,187 @@ def send_message(event=None):
     if not message:
         return
 
-    # 1. Handle Chat Creation if None Exists
+    # 1. Handle Chat Creation if None Exists (it is named after its first message)
     if current_chat_idx is None:
-        title = message[:30] + "..." if len(message) > 30 else message
-        chat_history.append({"title": title, "messages": []})
+        chat = engine.new_chat()
         current_chat_idx = len(chat_history) - 1
-        update_sidebar()
+        sidebar.add(chat)
+        load_chat(current_chat_idx) # Gives the chat its view
         
     chat = chat_history[current_chat_idx]
-    timestamp = datetime.now().strftime("%H:%M")
 
     # 2. Append User Message
-    chat["messages"].append({"role": "user", "text": message, "time": timestamp})
-
-    # Update title if it's the first message
-    if chat["title"] == "New Chat" and len(chat["messages"]) == 1:
-        new_title = message[:30] + "..." if len(message) > 30 else message
-        chat["title"] = new_title
-        update_sidebar()
+    user_msg, renamed = engine.add_user_message(chat, message)
+    if renamed:
+        sidebar.rename(chat)
 
     entry.delete(0, tk.END)
-    load_chat(current_chat_idx) # Display user message immediately
-    root.update_idletasks() # Force UI refresh
-
-    # 3. Call OpenAI API
-    bot_reply = "API Unavailable."
-    if client:
-        try:
-            api_messages = [{"role": m["role"], "content": m["text"]} for m in chat["messages"]]
-
-            response = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=api_messages
-            )
-            bot_reply = response.choices[0].message.content.strip()
-        except Exception as e:
-            bot_reply = f"Error: {e}"
-
-    # 4. Append Bot Message
-    chat["messages"].append({
-        "role": "assistant",
-        "text": bot_reply,
-        "time": datetime.now().strftime("%H:%M")
-    })
-    
-    # 5. Save and Reload
-    save_chats() 
-    load_chat(current_chat_idx)
+    with telemetry.span("render.append"):
+        message_list.append(user_msg) # Display user message immediately, as one new bubble
+    chat_views.resize(chat["id"], view_size(message_list))
 
-def update_sidebar(select_idx=None):
-    """Refreshes the sidebar buttons and highlights the current chat."""
-    global current_chat_idx
-    
-    # Clear existing buttons (A common pattern for dynamic CTk sidebars)
-    for widget in sidebar_scrollable_frame.winfo_children():
-        widget.destroy()
+    # 3. Call OpenAI API on the worker pool
+    api_messages = engine.build_request(chat)
 
-    if not chat_history:
-        current_chat_idx = None
-        load_chat(None)
+    # Asked before: answer from the cache without an API round trip
+    cached = engine.cached_reply(api_messages)
+    if cached is not None:
+        on_reply(chat, cached)
         return
+    if STREAM_REPLIES:
+        stream = engine.start_stream(chat) # Doubles as the view item of the live bubble
+        message_list.append(stream)
+        worker.submit_stream(
+            engine.stream_reply, api_messages,
+            on_delta=lambda text: on_stream_delta(chat, stream, text),
+            on_done=lambda result: on_stream_done(chat, stream, result)
+        )
+    else:
+        worker.submit(engine.request_reply, api_messages, on_done=lambda result: on_reply(chat, result))
+
+@telemetry.span("render.stream_delta")
+def on_stream_delta(chat, stream, text):
+    """Updates the live bubble with the text streamed since the last frame."""
+    stream.text += text
+    view = chat_views.peek(chat["id"])
+    if view is not None:
+        view.refresh(stream) # No-op unless its bubble is on screen
+
+def on_stream_done(chat, stream, result):
+    """Persists a streamed reply once, when the stream ends."""
+    # The live bubble already shows the reply
+    engine.finish_stream(chat, stream, result)
+    if isinstance(result, Exception):
+        chat_views.discard(chat["id"]) # Re-rendered with the error in place of the partial bubble
+        if current_chat_idx is not None and chat_history[current_chat_idx] is chat:
+            load_chat(current_chat_idx)
 
-    # Determine which index to highlight
-    if select_idx is not None:
-        current_chat_idx = select_idx
-    elif current_chat_idx is None:
-        current_chat_idx = 0
+def on_reply(chat, result):
+    """Appends a finished reply to its chat. Runs on the Tk thread via the worker."""
+    # 4. Save (a single row); None if the chat was deleted while the request was in flight
+    bot_msg = engine.add_reply(chat, result)
+
+    # 5. Add it to the chat's view, whether or not the user is still looking at it
+    view = chat_views.peek(chat["id"]) if bot_msg is not None else None
+    if view is not None:
+        with telemetry.span("render.append"):
+            view.append(bot_msg)
+        chat_views.resize(chat["id"], view_size(view))
+
+@telemetry.span("render.sidebar")
+def update_sidebar():
+    """Rebuilds the sidebar from chat_history and highlights the current chat.
+
+    Only needed at startup; afterwards the sidebar is kept in sync entry by
+    entry through sidebar.add/remove/rename/select.
+    """
+    selected = chat_history[current_chat_idx] if current_chat_idx is not None else None
+    sidebar.set_chats(chat_history, selected)
+
+def on_sidebar_click(chat):
+    """Opens the chat whose sidebar button was clicked."""
+    for i, c in enumerate(chat_history):
+        if c is chat:
+            load_chat(i)
+            return
+
+def schedule_search(event=None):
+    """Runs the search shortly after the last keystroke instead of on every one."""
+    global search_job
+    if search_job is not None:
+        root.after_cancel(search_job)
+    search_job = root.after(SEARCH_DELAY_MS, run_search)
+
+def run_search():
+    """Lists the chats and messages matching the search box, or restores the chat list."""
+    global search_job
+    search_job = None
+    query = search_entry.get().strip()
+    if not query:
+        search_results.grid_remove()
+        sidebar.grid()
+        return
 
-    # Create a button for each chat thread
+    results = []
+    for hit in engine.search(query): # Indexed lookup; never scans the history
+        label = f"[{hit['title']}]" if hit["index"] is None else f"{hit['title']}: {hit['snippet']}"
+        results.append({"title": label, "hit": hit})
+    search_results.set_chats(results)
+    sidebar.grid_remove()
+    search_results.grid()
+
+def clear_search(event=None):
+    search_entry.delete(0, tk.END)
+    run_search()
+
+def on_search_click(result):
+    """Opens the chat of a search result and scrolls to the matching message."""
+    hit = result["hit"]
+    search_results.select(result)
     for i, chat in enumerate(chat_history):
-        # Determine color based on selection status
-        if i == current_chat_idx:
-            # Use the selected color from the segmented button theme
-            fg_color = ctk.ThemeManager.theme['CTkSegmentedButton']['selected_color']
-            text_color = ctk.ThemeManager.theme['CTkSegmentedButton']['selected_color'][1] # Get light/dark text color
-        else:
-            # Use the unselected color from the segmented button theme
-            fg_color = ctk.ThemeManager.theme['CTkSegmentedButton']['unselected_color']
-            text_color = ctk.ThemeManager.theme['CTkButton']['text_color'] # Default CTkButton text color
-            
-        btn = ctk.CTkButton(
-            sidebar_scrollable_frame,
-            text=chat["title"],
-            fg_color=fg_color,
-            text_color=text_color,
-            text_color_disabled=("gray70", "gray30"),
-            anchor="w",
-            # FIXED: Use a simple tuple for hover_color to avoid KeyError
-            hover_color=("#dbdbdb", "#4d4d4d"), 
-            command=lambda idx=i: load_chat(idx)
-        )
-        btn.pack(fill="x", pady=2, padx=5)
-        
+        if chat["id"] == hit["chat_id"]:
+            if i != current_chat_idx:
+                load_chat(i)
+            if hit["index"] is not None:
+                message_list.scroll_to(hit["index"])
+            return
+
+@telemetry.span("render.load_chat")
 def load_chat(idx):
-    """Loads the messages for the specified chat index using CTkFrames for bubbles."""
+    """Shows the specified chat. Only the bubbles that fit on screen are built."""
     global current_chat_idx
     
     if idx is None or idx >= len(chat_history) or idx < 0:
         current_chat_idx = None
-        # Clear main chat area
-        for widget in chat_scrollable_frame.winfo_children():
-            widget.destroy()
+        show_view(blank_list) # Clear main chat area
+        sidebar.select(None)
         return
         
     current_chat_idx = idx
     chat = chat_history[idx]
-    
-    # Clear existing messages in the scrollable frame
-    for widget in chat_scrollable_frame.winfo_children():
-        widget.destroy()
-
-    # Create a message frame (bubble) for each message
-    if "messages" in chat:
-        for msg in chat["messages"]:
-            role = msg["role"]
-            text = msg["text"]
-            time = msg["time"]
-            
-            # --- Bubble Styling ---
-            if role == "user":
-                # User bubble (right-aligned, green)
-                bg_color = "#DCF8C6"  # WhatsApp Green
-                text_color = "black"
-                
-                # Create a container frame to push the bubble to the right
-                container = ctk.CTkFrame(chat_scrollable_frame, fg_color="transparent")
-                container.pack(fill="x", pady=5)
-                
-                bubble = ctk.CTkFrame(
-                    container,
-                    fg_color=bg_color,
-                    corner_radius=10,
-                    border_width=0
-                )
-                # Pack to the right side of its container frame
-                bubble.pack(side="right", padx=(SIDEBAR_WIDTH, 10), pady=2, anchor="e")
-
-            else:
-                # Bot bubble (left-aligned, white/light gray)
-                bg_color = "#FFFFFF" # Light background
-                text_color = "black"
-                
-                # Simple packing for left alignment in the main scrollable frame
-                bubble = ctk.CTkFrame(
-                    chat_scrollable_frame,
-                    fg_color=bg_color,
-                    corner_radius=10,
-                    border_width=0
-                )
-                # Pack to the left side of the main scrollable frame
-                bubble.pack(side="top", fill="x", padx=(10, SIDEBAR_WIDTH), pady=5, anchor="w")
-                
-            # Add text label inside the bubble frame
-            text_label = ctk.CTkLabel(
-                bubble,
-                text=f"{text}",
-                font=("Arial", 12),
-                text_color=text_color,
-                justify="left",
-                wraplength=root.winfo_width() - 350 # Wrap text based on window width
-            )
-            text_label.pack(padx=10, pady=(5, 0), anchor="w")
-            
-            # Add timestamp label (smaller)
-            time_label = ctk.CTkLabel(
-                bubble,
-                text=time,
-                font=("Arial", 8),
-                text_color="gray50",
-                justify="right"
-            )
-            time_label.pack(padx=10, pady=(0, 5), anchor="e")
-
-    update_sidebar(idx) # Update sidebar highlight
-    chat_scrollable_frame._scrollbar.set(1.0, 1.0) # Scroll to bottom
+
+    # A chat shown recently still has its view; otherwise it gets a new one
+    view = chat_views.get(chat["id"])
+    if view is None:
+        view = new_message_list()
+        show_view(view) # Before put(), which may evict the view being hidden
+        # Replies still streaming in get a live bubble below the stored messages
+        view.show(engine.messages(chat) + engine.streaming(chat))
+        chat_views.put(chat["id"], view, view_size(view))
+    else:
+        show_view(view)
+
+    sidebar.select(chat) # Move the highlight: reconfigures at most two buttons
+
+def new_message_list():
+    """Creates a chat view (virtualized: bubbles are recycled as it scrolls). Shown by show_view."""
+    return MessageList(root, side_margin=SIDEBAR_WIDTH, fg_color="#e5ddd5") # WhatsApp Background
+
+def show_view(view):
+    """Swaps the chat area for another chat's view."""
+    global message_list
+    if view is not message_list:
+        message_list.grid_remove()
+        view.grid(row=0, column=1, sticky="nsew")
+        message_list = view
+
+def drop_view(view):
+    """Destroys a view evicted from the cache (after swapping it out if it is on screen)."""
+    if view is message_list:
+        show_view(blank_list)
+    view.destroy()
+
+def view_size(view):
+    """Estimated memory of a view: its built bubbles, plus a reference per item."""
+    return view.widget_count() * BUBBLE_BYTES + len(view.items) * 8
 
 def new_chat():
     """Creates a new, empty chat."""
     title = simpledialog.askstring("New Chat", "Enter chat title:", parent=root)
     
-    title = title if title else "New Chat"
-    chat = {"title": title, "messages": []}
-        
-    chat_history.append(chat)
-    save_chats()
+    chat = engine.new_chat(title) # "New Chat" if left empty
+    sidebar.add(chat)
     load_chat(len(chat_history) - 1)
-    update_sidebar()
 
 def delete_chat():
     """Deletes the currently selected chat from history."""
@@ -256,8 +299,10 @@ def delete_chat():
 
     confirm = messagebox.askyesno("Delete Chat", f"Are you sure you want to delete '{chat_history[idx]['title']}'?", parent=root)
     if confirm:
-        chat_history.pop(idx)
-        save_chats()
+        chat = chat_history[idx]
+        engine.delete_chat(chat)
+        chat_views.discard(chat["id"])
+        sidebar.remove(chat)
         
         if not chat_history:
             current_chat_idx = None
@@ -265,8 +310,20 @@ def delete_chat():
         else:
             current_chat_idx = max(0, idx - 1)
             load_chat(current_chat_idx)
-            
-        update_sidebar()
+
+def open_memory():
+    """Opens the memory (numpy and its vector files) off the Tk thread; recall starts once it is attached."""
+    from memory import Memory
+    engine.attach_memory(Memory(MEMORY_DIR))
+
+def warm_up():
+    """Loads the OpenAI client, the tools and the memory in the background, once the window has painted."""
+    prewarm()
+    if USE_TOOLS:
+        import tools
+        tools.prewarm() # langchain and the tool objects, off the first message's worker
+    if USE_MEMORY:
+        threading.Thread(target=open_memory, name="memory-open", daemon=True).start()
 
 # --- GUI Setup ---
 
@@ -286,7 +343,8 @@ sidebar_frame = ctk.CTkFrame(root, width=SIDEBAR_WIDTH, corner_radius=0)
 sidebar_frame.grid(row=0, column=0, rowspan=2, sticky="nsew")
 sidebar_frame.grid_columnconfigure(0, weight=1)
 sidebar_frame.grid_rowconfigure(0, weight=0) # Buttons row
-sidebar_frame.grid_rowconfigure(1, weight=1) # Scrollable area row
+sidebar_frame.grid_rowconfigure(1, weight=0) # Search row
+sidebar_frame.grid_rowconfigure(2, weight=1) # Scrollable area row
 
 # Sidebar Buttons
 sidebar_buttons_frame = ctk.CTkFrame(sidebar_frame, fg_color="transparent")
@@ -299,18 +357,30 @@ btn_new.grid(row=0, column=0, padx=(0, 2), sticky="ew")
 btn_delete = ctk.CTkButton(sidebar_buttons_frame, text="Delete", command=delete_chat, fg_color="red", hover_color="#880000")
 btn_delete.grid(row=0, column=1, padx=(2, 0), sticky="ew")
 
-# Sidebar Chat List (Scrollable Frame acting as a list)
-sidebar_scrollable_frame = ctk.CTkScrollableFrame(sidebar_frame, label_text="Conversations", corner_radius=0)
-sidebar_scrollable_frame.grid(row=1, column=0, sticky="nsew", padx=0, pady=(0, 0))
-sidebar_scrollable_frame.grid_columnconfigure(0, weight=1)
+# Sidebar Search
+search_entry = ctk.CTkEntry(sidebar_frame, placeholder_text="Search chats...")
+search_entry.grid(row=1, column=0, sticky="ew", padx=5, pady=(0, 5))
+search_entry.bind("<KeyRelease>", schedule_search)
+search_entry.bind("<Return>", lambda event: run_search())
+search_entry.bind("<Escape>", clear_search)
+
+# Sidebar Chat List (virtualized; buttons are reused rather than rebuilt)
+sidebar = ChatSidebar(sidebar_frame, command=on_sidebar_click, label_text="Conversations")
+sidebar.grid(row=2, column=0, sticky="nsew", padx=0, pady=(0, 0))
+
+# Search results take the chat list's place while the search box has text
+search_results = ChatSidebar(sidebar_frame, command=on_search_click, label_text="Search Results")
+search_results.grid(row=2, column=0, sticky="nsew", padx=0, pady=(0, 0))
+search_results.grid_remove()
 
 
 # --- 3. Main Chat Area ---
 
-# Chat Display Frame (Scrollable)
-chat_scrollable_frame = ctk.CTkScrollableFrame(root, fg_color="#e5ddd5", corner_radius=0) # WhatsApp Background
-chat_scrollable_frame.grid(row=0, column=1, sticky="nsew")
-chat_scrollable_frame.grid_columnconfigure(0, weight=1)
+# Chat Display: shown when no chat is selected; chats get their own views from load_chat
+blank_list = new_message_list()
+blank_list.grid(row=0, column=1, sticky="nsew")
+message_list = blank_list # The view on screen
+chat_views = ViewCache(VIEW_CACHE_SIZE, VIEW_CACHE_BYTES, on_evict=drop_view)
 
 
 # --- 4. Entry Frame (Bottom) ---
@@ -328,8 +398,15 @@ send_btn.grid(row=0, column=1, padx=(5, 0), pady=5)
 # --- Initialization ---
 update_sidebar()
 load_chat(current_chat_idx)
+overlay = DebugOverlay(root)
+root.bind("<F12>", overlay.toggle)
+
+worker.start_polling(root)
+root.after_idle(warm_up) # Once the window has painted
 
 root.mainloop()
+worker.shutdown()
 
-# Save upon exit
-save_chats()
\ No newline at end of file
+# Compact the store upon exit
+engine.close()
+telemetry.close()
\ No newline at end of file
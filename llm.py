@@ -0,0 +1,223 @@
+import email.utils
+import importlib.util
+import random
+import socket
+import threading
+import time
+
+# The OpenAI client, built on first use rather than at import.
+# Importing openai takes about a second, and all of it would come before
+# the window could paint. The GUIs import this module instead, call prewarm()
+# once the window is up, and create_completion() from the worker threads that
+# make the requests; if prewarming is still running, the first call waits.
+#
+# Every request goes through create_completion(), which
+#   - shares one client and connection pool (keep-alive, HTTP/2 when the h2
+#     package is installed), so requests reuse connections instead of paying
+#     a new TLS handshake each;
+#   - waits for the client-side rate limiter (requests and tokens per minute);
+#   - retries 429s, 5xx and connection errors with jittered exponential
+#     backoff, honoring the server's Retry-After when it sends one.
+# The OpenAI client's own retries are turned off so these are the only ones.
+
+# Connection pool
+MAX_CONNECTIONS = 16
+MAX_KEEPALIVE_CONNECTIONS = 8
+KEEPALIVE_EXPIRY = 60.0
+REQUEST_TIMEOUT = 60.0
+CONNECT_TIMEOUT = 10.0
+HTTP2 = importlib.util.find_spec("h2") is not None
+
+# Retries
+MAX_RETRIES = 4
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30.0
+RETRY_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+# Client-side rate limits; None disables a limit
+REQUESTS_PER_MINUTE = 500
+TOKENS_PER_MINUTE = 200_000
+
+_client = None
+_error = None
+_lock = threading.Lock()
+
+
+class TokenBucket:
+    """Refills at rate units per second up to capacity; take() blocks until enough are available."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._level = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self, amount=1):
+        # Requests larger than the bucket would never fit; let them drain it instead
+        amount = min(amount, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._level = min(self.capacity, self._level + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._level >= amount:
+                    self._level -= amount
+                    return
+                wait = (amount - self._level) / self.rate
+            time.sleep(wait)
+
+
+class RateLimiter:
+    """Token buckets for requests per minute and tokens per minute."""
+
+    def __init__(self, requests_per_minute=REQUESTS_PER_MINUTE, tokens_per_minute=TOKENS_PER_MINUTE):
+        self.requests = TokenBucket(requests_per_minute / 60, requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute / 60, tokens_per_minute) if tokens_per_minute else None
+
+    def acquire(self, tokens=0):
+        """Blocks until one more request of about this many tokens is within the limits."""
+        if self.requests is not None:
+            self.requests.take(1)
+        if self.tokens is not None and tokens:
+            self.tokens.take(tokens)
+
+
+rate_limiter = RateLimiter()
+
+
+def build_client(**kwargs):
+    """Returns a new OpenAI client on a tuned, pooled HTTP transport. kwargs go to OpenAI()."""
+    import openai
+
+    Limits = type(openai.DEFAULT_CONNECTION_LIMITS)  # httpx's Limits, from the transport openai uses
+    http_client = openai.DefaultHttpxClient(
+        limits=Limits(
+            max_connections=MAX_CONNECTIONS,
+            max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=KEEPALIVE_EXPIRY,
+        ),
+        timeout=openai.Timeout(REQUEST_TIMEOUT, connect=CONNECT_TIMEOUT),
+        http2=HTTP2,
+    )
+    return openai.OpenAI(http_client=http_client, max_retries=0, **kwargs)
+
+
+def get_client():
+    """Returns the shared OpenAI client, importing and constructing it on first call.
+
+    Reads .env first, so OPENAI_API_KEY (and OPENAI_BASE_URL) can come from
+    there. Raises the construction error (e.g. a missing API key) on every
+    call if it failed.
+    """
+    global _client, _error
+    with _lock:
+        if _client is None and _error is None:
+            try:
+                from dotenv import load_dotenv
+                load_dotenv()
+                _client = build_client()
+            except Exception as e:
+                _error = e
+        if _error is not None:
+            raise _error
+        return _client
+
+
+def prewarm():
+    """Builds the client on a background thread so the first request does not pay for it."""
+    def warm():
+        try:
+            get_client()
+        except Exception as e:
+            print(f"OpenAI Client Initialization Error: {e}")
+
+    threading.Thread(target=warm, name="llm-prewarm", daemon=True).start()
+
+
+# --- Requests ---
+
+def retry_delay(error, attempt):
+    """Seconds to wait before retrying error, or None if it should not be retried."""
+    import openai
+
+    if isinstance(error, openai.APIStatusError):
+        if error.status_code not in RETRY_STATUS:
+            return None
+        retry_after = parse_retry_after(error.response.headers)
+        if retry_after is not None:
+            return min(retry_after, BACKOFF_MAX)
+    elif not isinstance(error, openai.APIConnectionError):  # Includes APITimeoutError
+        return None
+    # Full jitter: spreads out clients that failed together
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+def parse_retry_after(headers):
+    """Seconds from a retry-after-ms or Retry-After (seconds or HTTP date) header, if present."""
+    try:
+        return float(headers["retry-after-ms"]) / 1000
+    except (KeyError, ValueError):
+        pass
+    value = headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def estimate_tokens(messages):
+    from context import count_tokens
+
+    # Assistant turns that only call tools have no content
+    return sum(count_tokens(m.get("content") or "") for m in messages)
+
+
+def abort(stream):
+    """Ends a streamed response from another thread, waking a read blocked on it.
+
+    Closing the response wouldn't: the reading thread stays in recv() until
+    the server sends something. So the connection's socket is shut down
+    instead, the read fails at once, and the reader closes the response.
+    Only over HTTP/1.1; an HTTP/2 connection carries other requests too, so
+    there the reader stops at its next chunk.
+    """
+    response = stream.response
+    if response.is_closed or response.http_version != "HTTP/1.1":
+        return  # A finished response's connection may already serve another request
+    network = response.extensions.get("network_stream")
+    sock = network.get_extra_info("socket") if network is not None else None
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass  # Already closed
+
+
+def create_completion(client=None, limiter=None, max_retries=MAX_RETRIES, **kwargs):
+    """client.chat.completions.create(**kwargs) with rate limiting and retries.
+
+    Uses the shared client and rate_limiter unless others are passed. With
+    stream=True only opening the stream is retried; errors once chunks are
+    flowing are raised to the caller.
+    """
+    client = client or get_client()
+    limiter = limiter or rate_limiter
+    tokens = estimate_tokens(kwargs.get("messages", ()))
+    attempt = 0
+    while True:
+        limiter.acquire(tokens)
+        try:
+            return client.chat.completions.create(**kwargs)
+        except Exception as e:
+            delay = retry_delay(e, attempt) if attempt < max_retries else None
+            if delay is None:
+                raise
+        time.sleep(delay)
+        attempt += 1
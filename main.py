@@ -1,37 +1,95 @@
 import tkinter as tk
 from tkinter import simpledialog, scrolledtext, messagebox
-import json
 import os
-from datetime import datetime
-from openai import OpenAI  # NEW: Import OpenAI client
-from dotenv import load_dotenv
-
-# Load environment variables
-load_dotenv()
-# The client automatically reads OPENAI_API_KEY from the environment
-client = OpenAI()  # NEW: Initialize the client
+import threading
+from llm import prewarm
+from worker import RequestWorker
+from chat_store import ChatStore, DB_FILE
+from chat_engine import ChatEngine
+from router import Router, default_backends
+from agent import Agent
+from response_cache import ResponseCache
+from telemetry import telemetry, DebugOverlay
+from view_cache import ViewCache
+
+# The OpenAI client (and .env) are loaded by llm.get_client() on first use,
+# and pre-warmed in the background once the window has painted
 
 CHAT_FILE = "chat_history.json"
-
-# Load chat history
-if os.path.exists(CHAT_FILE):
+MODEL = "gpt-3.5-turbo"
+
+# Show replies token by token as they arrive instead of all at once
+STREAM_REPLIES = True
+
+# API calls run here so the window stays responsive while replies are pending
+worker = RequestWorker()
+
+# Reuse replies to identical prompts from an on-disk cache. Off by default: at
+# the model's sampling temperature that replays one sampled answer. Only
+# replies straight from MODEL are cached, so this also needs ROUTE_REPLIES and
+# USE_TOOLS off.
+CACHE_REPLIES = False
+
+# Send requests to the fastest healthy backend, falling back to (and hedging
+# slow requests with) Anthropic when its key is configured
+ROUTE_REPLIES = True
+
+# Let the model call the research tools in tools.py (web search, Wikipedia,
+# saving notes) before it answers. Off by default: the agent loop talks to
+# MODEL directly, since the router's backends don't do tool calls, so with
+# it on the router (failover, hedging) is bypassed whenever the tools load
+USE_TOOLS = False
+
+# Remember every message of every chat (embedded offline, under MEMORY_DIR)
+# and send the few snippets of other chats most like each new message along
+# with it, so an earlier conversation can be picked up from a new chat. Off by
+# default: the offline embedder matches words, not meaning, so some of what
+# it recalls is beside the point
+USE_MEMORY = False
+MEMORY_DIR = "memory"
+
+# Phase timings (API, persistence, rendering) are always kept for the debug
+# overlay (F12). Set a file to also log every sample as JSONL, or a port to
+# serve them at http://127.0.0.1:<port>/metrics for Prometheus.
+TELEMETRY_FILE = None # e.g. "telemetry.jsonl"
+METRICS_PORT = None   # e.g. 9464
+telemetry.configure(TELEMETRY_FILE, METRICS_PORT)
+
+# Text marks where the deltas of each streaming reply are inserted, by Message
+stream_marks = {}
+
+# Recently shown chats keep their own Text widget, so switching back to one
+# only swaps widgets. Hidden ones are kept up to date as messages arrive and
+# dropped, least recently shown first, past VIEW_CACHE_SIZE chats or
+# VIEW_CACHE_BYTES of estimated Tk memory (text plus TEXT_LINE_BYTES per line).
+VIEW_CACHE_SIZE = 8
+VIEW_CACHE_BYTES = 64 * 1024 * 1024
+TEXT_LINE_BYTES = 200
+
+# Results of the sidebar search box, in the order they are listed
+SEARCH_DELAY_MS = 150
+search_hits = []
+search_job = None
+
+# Load chat history. Chats live in a SQLite store that saves one message at
+# a time; the old chat_history.json is imported the first time it is opened.
+store = ChatStore(DB_FILE)
+if store.created and os.path.exists(CHAT_FILE):
     try:
-        with open(CHAT_FILE, "r") as f:
-            chat_history = json.load(f)
-    except json.JSONDecodeError:
+        store.import_json(CHAT_FILE)
+    except ValueError: # Corrupt or malformed; nothing was imported
         messagebox.showerror("Error", "Could not load chat history. Starting fresh.")
-        chat_history = []
-else:
-    chat_history = []
+
+# Chats, messages and the request/reply round trip; this module only draws them
+router = Router(default_backends(MODEL)) if ROUTE_REPLIES else None
+agent = Agent(model=MODEL) if USE_TOOLS else None
+response_cache = ResponseCache() if CACHE_REPLIES else None # Its file is only created when it is used
+engine = ChatEngine(store, MODEL, response_cache=response_cache, router=router, agent=agent)
+chat_history = engine.chats # Titles only; messages are paged in by load_chat
 
 # Track the currently selected chat
 current_chat_idx = 0 if chat_history else None
 
-def save_chats():
-    """Saves the current chat history to a JSON file."""
-    with open(CHAT_FILE, "w") as f:
-        json.dump(chat_history, f, indent=2)
-
 # --- Core Functions ---
 
 def send_message(event=None):
@@ -43,53 +101,96 @@ def send_message(event=None):
         return
 
     if current_chat_idx is None:
-        # If no chat exists, create a new one, using the first message as a title placeholder
-        title = message[:30] + "..." if len(message) > 30 else message
-        chat_history.append({"title": title, "messages": []})
+        # If no chat exists, create a new one; it is named after its first message
+        engine.new_chat()
         current_chat_idx = len(chat_history) - 1
         update_sidebar()
         load_chat(current_chat_idx)
 
     chat = chat_history[current_chat_idx]
 
-    timestamp = datetime.now().strftime("%H:%M")
-    chat["messages"].append({"role": "user", "text": message, "time": timestamp})
-    
-    # Update the chat title with the first message if it was a default "New Chat" title
-    if chat["title"] == "New Chat" and len(chat["messages"]) == 1:
-        new_title = message[:30] + "..." if len(message) > 30 else message
-        chat_history[current_chat_idx]["title"] = new_title
+    user_msg, renamed = engine.add_user_message(chat, message)
+    if renamed:
         update_sidebar()
 
     entry.delete(0, tk.END)
-    load_chat(current_chat_idx) # Display user message immediately
-    chat_area.yview(tk.END)
-    root.update_idletasks() # Force UI refresh
+    show_new_message(chat, user_msg) # Display user message immediately
 
-    # Prepare messages for API (role/content only)
-    api_messages = [{"role": m["role"], "content": m["text"]} for m in chat["messages"]]
+    api_messages = engine.build_request(chat)
 
-    # OpenAI API call
-    try:
-        response = client.chat.completions.create(  # NEW API CALL
-            model="gpt-3.5-turbo",
-            messages=api_messages
+    # Asked before: answer from the cache without an API round trip
+    cached = engine.cached_reply(api_messages)
+    if cached is not None:
+        on_reply(chat, cached)
+        return
+
+    # OpenAI API call, run on the worker pool; the reply lands in on_reply
+    if STREAM_REPLIES:
+        stream = engine.start_stream(chat)
+        stream_marks[stream] = f"stream{id(stream)}"
+
+        chat_area.config(state=tk.NORMAL)
+        insert_stream_bubble(chat_area, stream)
+        chat_area.config(state=tk.DISABLED)
+        chat_area.yview(tk.END)
+
+        worker.submit_stream(
+            engine.stream_reply, api_messages,
+            on_delta=lambda text: on_stream_delta(chat, stream, text),
+            on_done=lambda result: on_stream_done(chat, stream, result)
         )
-        bot_reply = response.choices[0].message.content.strip()  # NEW RESPONSE ACCESS
-    except Exception as e:
-        bot_reply = f"Error: Failed to connect to OpenAI. Check your API key and network. ({e})"
-        print(bot_reply)
+    else:
+        worker.submit(engine.request_reply, api_messages, on_done=lambda result: on_reply(chat, result))
+
+@telemetry.span("render.stream_delta")
+def on_stream_delta(chat, stream, text):
+    """Appends newly streamed text to the live bubble, in the chat's view if it has one."""
+    stream.text += text
+    view = chat_views.peek(chat["id"])
+    if view is None:
+        return
+
+    view.config(state=tk.NORMAL)
+    view.insert(stream_marks[stream], text, "bot")
+    view.config(state=tk.DISABLED)
+    if view is chat_area:
+        view.yview(tk.END)
+
+def on_stream_done(chat, stream, result):
+    """Persists a streamed reply once the stream has ended."""
+    mark = stream_marks.pop(stream)
+    streamed = stream.text
+    if isinstance(result, Exception):
+        print(f"Request failed: {result}")
+    # The streamed bubble is already on screen
+    bot_msg = engine.finish_stream(chat, stream, result)
+    view = chat_views.peek(chat["id"])
+    if view is not None:
+        if bot_msg is not None and not isinstance(result, Exception) and bot_msg.text != streamed:
+            # The store keeps the reply stripped; the bubble must match it, or
+            # show_message's offsets (computed from the store) land off target
+            view.config(state=tk.NORMAL)
+            view.delete(f"{mark} - {len(streamed)} chars", mark)
+            view.insert(mark, bot_msg.text, "bot")
+            view.config(state=tk.DISABLED)
+        view.mark_unset(mark)
+    if bot_msg is not None:
+        show_new_message(chat, bot_msg, insert=False)
+    if isinstance(result, Exception):
+        chat_views.discard(chat["id"]) # Re-rendered with the error in place of the partial bubble
+        if current_chat_idx is not None and chat_history[current_chat_idx] is chat:
+            load_chat(current_chat_idx)
 
-    chat["messages"].append({
-        "role": "assistant", # Correct role for bot reply
-        "text": bot_reply,
-        "time": datetime.now().strftime("%H:%M")
-    })
-    save_chats()
-    load_chat(current_chat_idx) # Reload to display bot response
-    chat_area.yview(tk.END)
+def on_reply(chat, result):
+    """Appends a finished reply to its chat. Called on the Tk thread by the worker."""
+    if isinstance(result, Exception):
+        print(f"Request failed: {result}")
+    bot_msg = engine.add_reply(chat, result) # One row; the rest of the history is untouched
+    if bot_msg is not None: # None if the chat was deleted while the request was in flight
+        show_new_message(chat, bot_msg)
 
 
+@telemetry.span("render.sidebar")
 def update_sidebar():
     """Refreshes the list of chats in the sidebar."""
     sidebar.delete(0, tk.END)
@@ -100,38 +201,164 @@ def update_sidebar():
         sidebar.selection_set(current_chat_idx)
         sidebar.activate(current_chat_idx)
 
+@telemetry.span("render.load_chat")
 def load_chat(idx):
-    """Loads the messages for the specified chat index into the main area."""
+    """Shows the specified chat in the main area.
+
+    A chat shown recently still has its view, which is simply swapped in.
+    Otherwise this is the only full render, one bulk insert; new messages
+    are appended with show_new_message.
+    """
     global current_chat_idx
     current_chat_idx = idx
-    
-    chat_area.config(state=tk.NORMAL)
-    chat_area.delete(1.0, tk.END)
 
-    if idx is not None and idx < len(chat_history):
-        chat = chat_history[idx]
-        if "messages" in chat:
-            for msg in chat["messages"]:
-                tag = "user" if msg["role"] == "user" else "bot"
-                insert_message(msg["text"], msg["time"], tag)
-        
-        # Update sidebar selection
-        sidebar.selection_clear(0, tk.END)
-        sidebar.selection_set(idx)
-        sidebar.activate(idx)
-    
-    chat_area.config(state=tk.DISABLED)
-    chat_area.yview(tk.END)
+    if idx is None or idx >= len(chat_history):
+        show_view(blank_area)
+        return
 
-def insert_message(text, timestamp, tag):
-    """Inserts a formatted message bubble into the chat area."""
-    chat_area.insert(tk.END, "\n")
+    chat = chat_history[idx]
+    view = chat_views.get(chat["id"])
+    if view is None:
+        view = new_chat_area()
+        view.config(state=tk.NORMAL)
+        runs = chat_runs(chat)
+        if runs:
+            view.insert(tk.END, *runs) # One Tk call for the whole conversation
+        for stream in engine.streaming(chat):
+            insert_stream_bubble(view, stream)
+        view.config(state=tk.DISABLED)
+        view.yview(tk.END)
+        show_view(view) # Before put(), which may evict the view being hidden
+        chat_views.put(chat["id"], view, runs_size(runs))
+    else:
+        show_view(view)
+
+    # Update sidebar selection
+    sidebar.selection_clear(0, tk.END)
+    sidebar.selection_set(idx)
+    sidebar.activate(idx)
+
+def show_view(view):
+    """Swaps the chat area for another chat's view."""
+    global chat_area
+    if view is not chat_area:
+        chat_area.pack_forget()
+        view.pack(fill=tk.BOTH, expand=True, before=entry_frame)
+        chat_area = view
+
+def drop_view(view):
+    """Destroys a view evicted from the cache (after swapping it out if it is on screen)."""
+    if view is chat_area:
+        show_view(blank_area)
+    view.destroy()
+
+def runs_size(runs):
+    """Estimated Tk memory of inserting runs: their text plus per-line overhead."""
+    return sum(len(text) + text.count("\n") * TEXT_LINE_BYTES for text in runs[0::2])
+
+def message_runs(msg):
+    """Returns a message bubble as text/tag runs, in Text.insert argument order."""
+    tag = "user" if msg.role == "user" else "bot"
     
     # Format: Message (Time)
-    bubble_text = f"{text}\n({timestamp})"
-    chat_area.insert(tk.END, bubble_text, tag)
-    
-    chat_area.insert(tk.END, "\n\n")
+    bubble_text = f"{msg.text}\n({msg.time})"
+    return ["\n", "", bubble_text, tag, "\n\n", ""]
+
+def chat_runs(chat):
+    """Returns the runs for a whole chat."""
+    runs = []
+    for msg in engine.messages(chat):
+        runs += message_runs(msg)
+    return runs
+
+@telemetry.span("render.append")
+def show_new_message(chat, msg, insert=True):
+    """Appends one message's bubble to the chat's view, if it has one (on screen or not)."""
+    view = chat_views.peek(chat["id"])
+    if view is None:
+        return # Rendered from the store when the chat is next shown
+    runs = message_runs(msg)
+    if insert:
+        view.config(state=tk.NORMAL)
+        view.insert(tk.END, *runs)
+        view.config(state=tk.DISABLED)
+        if view is chat_area:
+            view.yview(tk.END)
+    chat_views.resize(chat["id"], chat_views.size(chat["id"]) + runs_size(runs))
+
+def insert_stream_bubble(view, stream):
+    """Inserts the bubble of a reply that is still streaming, with a mark where deltas go."""
+    view.insert(tk.END, "\n")
+    mark = stream_marks[stream]
+    view.insert(tk.END, stream.text, "bot")
+    # Left gravity while the rest of the bubble is inserted after the mark,
+    # then right gravity so each delta lands before it, in arrival order
+    view.mark_set(mark, "end-1c")
+    view.mark_gravity(mark, tk.LEFT)
+    view.insert(tk.END, f"\n({stream.time})", "bot")
+    view.insert(tk.END, "\n\n")
+    view.mark_gravity(mark, tk.RIGHT)
+
+def schedule_search(event=None):
+    """Runs the search shortly after the last keystroke instead of on every one."""
+    global search_job
+    if search_job is not None:
+        root.after_cancel(search_job)
+    search_job = root.after(SEARCH_DELAY_MS, run_search)
+
+def run_search():
+    """Lists the chats and messages matching the search box, or restores the chat list."""
+    global search_job, search_hits
+    search_job = None
+    query = search_entry.get().strip()
+    if not query:
+        search_hits = []
+        search_results.pack_forget()
+        sidebar.pack(fill=tk.BOTH, expand=True, pady=(5,0))
+        return
+
+    search_hits = engine.search(query) # Indexed lookup; never scans the history
+    search_results.delete(0, tk.END)
+    for hit in search_hits:
+        if hit["index"] is None:
+            search_results.insert(tk.END, f"[{hit['title']}]")
+        else:
+            search_results.insert(tk.END, f"{hit['title']}: {hit['snippet']}")
+    if not search_hits:
+        search_results.insert(tk.END, "No matches")
+    sidebar.pack_forget()
+    search_results.pack(fill=tk.BOTH, expand=True, pady=(5,0))
+
+def clear_search(event=None):
+    search_entry.delete(0, tk.END)
+    run_search()
+
+def on_search_select(event):
+    """Opens the chat of the selected result and scrolls to the matching message."""
+    selection = search_results.curselection()
+    if not selection or selection[0] >= len(search_hits):
+        return
+    hit = search_hits[selection[0]]
+    idx = next((i for i, chat in enumerate(chat_history) if chat["id"] == hit["chat_id"]), None)
+    if idx is None:
+        return
+    if idx != current_chat_idx:
+        load_chat(idx)
+    if hit["index"] is not None:
+        show_message(hit["index"])
+
+def show_message(index):
+    """Scrolls to and highlights the index-th message of the current chat."""
+    runs = chat_runs(chat_history[current_chat_idx])
+    first = index * 6 # message_runs yields three text/tag pairs per message
+    if first >= len(runs):
+        return
+    offset = sum(len(text) for text in runs[0:first:2]) + len(runs[first])
+    start = f"1.0 + {offset} chars"
+    end = f"{start} + {len(runs[first + 2])} chars"
+    chat_area.tag_remove("found", 1.0, tk.END)
+    chat_area.tag_add("found", start, end)
+    chat_area.see(start)
 
 def on_sidebar_select(event):
     """Event handler for selecting a chat in the sidebar."""
@@ -145,13 +372,8 @@ def new_chat():
     """Prompts for a title and creates a new, empty chat."""
     global current_chat_idx
     title = simpledialog.askstring("New Chat", "Enter chat title:")
-    if not title:
-        title = "New Chat" # Default title if user cancels or leaves empty
-        
-    chat = {"title": title, "messages": []}
-    chat_history.append(chat)
+    engine.new_chat(title) # "New Chat" if the user cancels or leaves it empty
     current_chat_idx = len(chat_history) - 1
-    save_chats()
     update_sidebar()
     load_chat(current_chat_idx)
 
@@ -171,8 +393,9 @@ def delete_chat():
 
     confirm = messagebox.askyesno("Delete Chat", f"Are you sure you want to delete '{chat_history[idx]['title']}'?")
     if confirm:
-        chat_history.pop(idx)
-        save_chats()
+        chat = chat_history[idx]
+        engine.delete_chat(chat)
+        chat_views.discard(chat["id"])
         
         if not chat_history:
             current_chat_idx = None
@@ -184,6 +407,47 @@ def delete_chat():
             
         update_sidebar()
 
+def new_chat_area():
+    """Creates a chat view: a read-only Text with the bubble tags. Packed by show_view."""
+    area = scrolledtext.ScrolledText(chat_frame, bg="#e5ddd5", state=tk.DISABLED, bd=0, padx=10, pady=10, font=("Arial", 11), wrap=tk.WORD)
+
+    # Bubble style tags (mimicking the image)
+    area.tag_config("user", 
+                    background="#DCF8C6", 
+                    foreground="#000000", 
+                    lmargin1=10, lmargin2=10, 
+                    rmargin=100, # Large right margin
+                    spacing3=5, 
+                    justify="left",
+                    relief="flat", bd=0, lmarginr=10) # Minimal border/relief
+
+    area.tag_config("bot", 
+                    background="#FFFFFF", 
+                    foreground="#000000", 
+                    lmargin1=100, # Large left margin
+                    lmargin2=10, 
+                    rmargin=10, 
+                    spacing3=5, 
+                    justify="left",
+                    relief="flat", bd=0, lmarginr=10)
+
+    area.tag_config("found", background="#FFF3B0") # Message jumped to from a search result
+    return area
+
+def open_memory():
+    """Opens the memory (numpy and its vector files) off the Tk thread; recall starts once it is attached."""
+    from memory import Memory
+    engine.attach_memory(Memory(MEMORY_DIR))
+
+def warm_up():
+    """Loads the OpenAI client, the tools and the memory in the background, once the window has painted."""
+    prewarm()
+    if USE_TOOLS:
+        import tools
+        tools.prewarm() # langchain and the tool objects, off the first message's worker
+    if USE_MEMORY:
+        threading.Thread(target=open_memory, name="memory-open", daemon=True).start()
+
 # --- GUI ---
 
 root = tk.Tk()
@@ -204,6 +468,16 @@ btn_new.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(0, 2))
 btn_delete = tk.Button(sidebar_buttons, text="Delete", command=delete_chat, relief=tk.FLAT, bg="#e0e0e0")
 btn_delete.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(2, 0))
 
+search_entry = tk.Entry(sidebar_frame, font=("Arial", 11), bd=1, relief=tk.FLAT)
+search_entry.pack(fill=tk.X, padx=5)
+search_entry.bind("<KeyRelease>", schedule_search)
+search_entry.bind("<Return>", lambda event: run_search())
+search_entry.bind("<Escape>", clear_search)
+
+# Shown in place of the chat list while the search box has text
+search_results = tk.Listbox(sidebar_frame, width=30, bg="#f9f9f9", bd=0, highlightthickness=0, selectbackground="#d0d0d0", selectforeground="black", activestyle="none", font=("Arial", 10))
+search_results.bind("<<ListboxSelect>>", on_search_select)
+
 sidebar = tk.Listbox(sidebar_frame, width=30, bg="#f9f9f9", bd=0, highlightthickness=0, selectbackground="#d0d0d0", selectforeground="black", activestyle="none", font=("Arial", 11))
 sidebar.pack(fill=tk.BOTH, expand=True, pady=(5,0))
 sidebar.bind("<<ListboxSelect>>", on_sidebar_select)
@@ -212,28 +486,11 @@ sidebar.bind("<<ListboxSelect>>", on_sidebar_select)
 chat_frame = tk.Frame(root, bg="#e5ddd5") # WhatsApp-style background
 chat_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
 
-chat_area = scrolledtext.ScrolledText(chat_frame, bg="#e5ddd5", state=tk.DISABLED, bd=0, padx=10, pady=10, font=("Arial", 11), wrap=tk.WORD)
-chat_area.pack(fill=tk.BOTH, expand=True)
-
-# Bubble style tags (mimicking the image)
-chat_area.tag_config("user", 
-                     background="#DCF8C6", 
-                     foreground="#000000", 
-                     lmargin1=10, lmargin2=10, 
-                     rmargin=100, # Large right margin
-                     spacing3=5, 
-                     justify="left",
-                     relief="flat", bd=0, lmarginr=10) # Minimal border/relief
-
-chat_area.tag_config("bot", 
-                     background="#FFFFFF", 
-                     foreground="#000000", 
-                     lmargin1=100, # Large left margin
-                     lmargin2=10, 
-                     rmargin=10, 
-                     spacing3=5, 
-                     justify="left",
-                     relief="flat", bd=0, lmarginr=10)
+# Shown when no chat is selected; chats get their own views from load_chat
+blank_area = new_chat_area()
+blank_area.pack(fill=tk.BOTH, expand=True)
+chat_area = blank_area # The view on screen
+chat_views = ViewCache(VIEW_CACHE_SIZE, VIEW_CACHE_BYTES, on_evict=drop_view)
 
 
 # Entry and send button
@@ -251,5 +508,13 @@ send_btn.pack(side=tk.RIGHT, padx=5, pady=5)
 # Initialize
 update_sidebar()
 load_chat(current_chat_idx)
+overlay = DebugOverlay(root)
+root.bind("<F12>", overlay.toggle)
+
+worker.start_polling(root)
+root.after_idle(warm_up) # Once the window has painted
 
-root.mainloop()
\ No newline at end of file
+root.mainloop()
+worker.shutdown()
+engine.close()
+telemetry.close()
\ No newline at end of file
@@ -0,0 +1,316 @@
+import os
+import re
+import sqlite3
+import threading
+import zlib
+from functools import lru_cache
+
+import numpy as np
+
+# Long-term memory across chats. Each chat is sent to the model with only its
+# own context window, so this keeps an embedding of every message of every
+# chat and, for a new turn, finds the most similar snippets from the other
+# chats to send along.
+#
+# Vectors are rows of a float32 matrix in a memory-mapped file that grows by
+# doubling, so appending a message writes one row and opening the memory
+# reads nothing up front; the texts live next to it in SQLite, looked up
+# only for the rows that are returned. Search is a matrix product over
+# blocks of rows for a batch of queries at once, keeping a running top k.
+# Past EXACT_ROWS rows a full scan is too slow for a turn, so rows are first
+# ranked on a SKETCH_DIM random projection kept in a second memmap, and the
+# best CANDIDATES of those are re-scored exactly.
+#
+# The embedder is pluggable: any callable mapping a list of texts to an
+# (n, dim) float32 array of unit rows, with a .dim attribute. The default
+# hashes words and word pairs, so it runs offline with no model download;
+# stopwords are dropped first, or "what is the ..." alone would match.
+
+MEMORY_DIR = "memory"
+
+DIM = 256
+
+# Snippets sent per turn, and how similar they must be to the new message
+TOP_K = 3
+MIN_SCORE = 0.3
+
+# Messages shorter than this ("ok", "thanks") aren't worth remembering, or
+# recalling anything for
+MIN_CHARS = 20
+SNIPPET_CHARS = 400
+
+# Exact scan up to this many rows; beyond it, sketch first and re-score
+EXACT_ROWS = 200_000
+SKETCH_DIM = 64
+SKETCH_SEED = 1
+CANDIDATES = 1000
+
+BLOCK_ROWS = 1 << 16
+INITIAL_ROWS = 4096
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snippets (
+    row INTEGER PRIMARY KEY,
+    chat_id INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    text TEXT NOT NULL,
+    ts REAL
+);
+CREATE INDEX IF NOT EXISTS snippets_by_chat ON snippets(chat_id);
+CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+
+WORD = re.compile(r"\w+")
+
+STOPWORDS = frozenset(
+    "a about after all also am an and any are as at be been before but by can could did do does doing for "
+    "from had has have having he her here hers him his how i if in into is it its just me more most my no "
+    "nor not of off on once only or other our ours out over own same she should so some such than that the "
+    "their theirs them then there these they this those through to too under until up very was we were "
+    "what when where which while who whom why will with would you your yours".split()
+)
+
+DELETED = -1  # Chat id of rows whose chat was deleted
+
+
+@lru_cache(maxsize=65536)
+def _feature(token, dim):
+    h = zlib.crc32(token.encode("utf-8"))  # Stable across runs, unlike hash()
+    return h % dim, 1.0 if h & 0x80000000 else -1.0
+
+
+class HashingEmbedder:
+    """Offline embedder: signed feature hashing of words and adjacent word pairs, stopwords left out."""
+
+    def __init__(self, dim=DIM):
+        self.dim = dim
+
+    def __call__(self, texts):
+        vectors = np.zeros((len(texts), self.dim), np.float32)
+        for i, text in enumerate(texts):
+            words = [w for w in WORD.findall(text.lower()) if w not in STOPWORDS]
+            for token in words + [a + " " + b for a, b in zip(words, words[1:])]:
+                column, sign = _feature(token, self.dim)
+                vectors[i, column] += sign
+        return normalize(vectors)
+
+
+def normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def same_text(text):
+    """text folded so that repeats differing in case and spacing compare equal."""
+    return " ".join(text.lower().split())
+
+
+def excluded(chat_ids, exclude_chat):
+    mask = chat_ids == DELETED
+    if exclude_chat is not None:
+        mask |= chat_ids == exclude_chat
+    return mask
+
+
+def top_k(scores, k):
+    """Row indices of the k highest scores in each column, best first."""
+    k = min(k, scores.shape[0])
+    rows = np.argpartition(scores, -k, axis=0)[-k:]
+    order = np.argsort(-np.take_along_axis(scores, rows, axis=0), axis=0)
+    return np.take_along_axis(rows, order, axis=0)
+
+
+class Memory:
+    """Embedded messages of every chat, searchable by cosine similarity."""
+
+    def __init__(self, directory=MEMORY_DIR, embed=None, exact_rows=EXACT_ROWS, candidates=CANDIDATES):
+        self.directory = directory
+        self.embed = embed or HashingEmbedder()
+        self.dim = self.embed.dim
+        self.exact_rows = exact_rows
+        self.candidates = candidates
+        self._projection = (np.random.default_rng(SKETCH_SEED).standard_normal((self.dim, SKETCH_DIM))
+                            / np.sqrt(SKETCH_DIM)).astype(np.float32)
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(directory, "memory.db"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        with self._conn:
+            self._conn.execute("INSERT OR IGNORE INTO settings VALUES ('dim', ?)", (str(self.dim),))
+        stored_dim = int(self._conn.execute("SELECT value FROM settings WHERE key = 'dim'").fetchone()[0])
+        if stored_dim != self.dim:
+            raise ValueError(f"{directory} holds {stored_dim}-dim vectors; the embedder makes {self.dim}")
+        # Rows are only used once their text is saved, so a crash mid-add leaves no half rows
+        self.rows = self._conn.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM snippets").fetchone()[0]
+        self._open(max(INITIAL_ROWS, self.rows))
+
+    def __len__(self):
+        return self.rows
+
+    def _open(self, capacity):
+        """(Re)maps the files with room for capacity rows, extending them as needed."""
+        self._maps = []
+        for name, dtype, width in (("vectors.f32", np.float32, self.dim), ("sketch.f32", np.float32, SKETCH_DIM),
+                                   ("chats.i4", np.int32, 1)):
+            path = os.path.join(self.directory, name)
+            size = capacity * width * np.dtype(dtype).itemsize
+            with open(path, "ab") as f:
+                if f.tell() < size:
+                    f.truncate(size)
+            self._maps.append(np.memmap(path, dtype, "r+", shape=(capacity, width) if width > 1 else (capacity,)))
+        self.vectors, self.sketch, self.chat_ids = self._maps
+        self.capacity = capacity
+
+    # --- Adding ---
+
+    def add(self, chat_id, messages):
+        """Embeds and saves the Messages of one chat that are long enough to be worth recalling."""
+        messages = [m for m in messages if len(m.text.strip()) >= MIN_CHARS]
+        if not messages:
+            return 0
+        vectors = np.asarray(self.embed([m.text for m in messages]), np.float32)
+        with self._lock:
+            start, end = self.rows, self.rows + len(messages)
+            if end > self.capacity:
+                self._open(max(end, 2 * self.capacity))  # Old maps stay valid for searches under way
+            self.vectors[start:end] = vectors
+            self.sketch[start:end] = vectors @ self._projection
+            self.chat_ids[start:end] = chat_id
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT INTO snippets (row, chat_id, role, text, ts) VALUES (?, ?, ?, ?, ?)",
+                    [(start + i, chat_id, m.role, m.text[:SNIPPET_CHARS], m.ts) for i, m in enumerate(messages)]
+                )
+            self.rows = end
+        return len(messages)
+
+    def forget(self, chat_id):
+        """Drops a deleted chat's snippets; its rows stay in the matrix but never match."""
+        with self._lock:
+            ids = self.chat_ids[:self.rows]
+            ids[ids == chat_id] = DELETED
+            with self._conn:
+                self._conn.execute("DELETE FROM snippets WHERE chat_id = ?", (chat_id,))
+
+    def setting(self, key):
+        """A value saved with set_setting(), as a string, or None."""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM settings WHERE key = ?", (key,)).fetchone()
+        return row[0] if row is not None else None
+
+    def set_setting(self, key, value):
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO settings VALUES (?, ?)", (key, str(value)))
+
+    # --- Searching ---
+
+    def search(self, texts, k=TOP_K, exclude_chat=None, min_score=MIN_SCORE):
+        """The k snippets most similar to each of texts, as lists of dicts, best first.
+
+        Snippets of exclude_chat (the chat being answered, whose own context
+        is sent anyway), those scoring under min_score and repeats of a
+        better one's text are left out.
+        """
+        k_found = 2 * k  # Spares for the repeats
+        queries = np.asarray(self.embed(list(texts)), np.float32)  # float64 would be cast block by block
+        with self._lock:
+            vectors, sketch, chat_ids, rows = self.vectors, self.sketch, self.chat_ids, self.rows
+        if rows == 0:
+            return [[] for _ in texts]
+        if rows <= self.exact_rows:
+            found, scores = self._scan(vectors, queries, chat_ids, rows, k_found, exclude_chat)
+        else:
+            candidates, _ = self._scan(sketch, queries @ self._projection, chat_ids, rows, self.candidates,
+                                       exclude_chat)
+            found, scores = [], []
+            for query, rows_ in zip(queries, candidates):
+                rows_ = np.sort(rows_)  # Sequential reads of the memmap
+                exact = vectors[rows_] @ query
+                exact[excluded(chat_ids[rows_], exclude_chat)] = -np.inf
+                best = top_k(exact[:, None], k_found)[:, 0]
+                found.append(rows_[best])
+                scores.append(exact[best])
+        return self._snippets(found, scores, min_score, k)
+
+    def recall(self, text, exclude_chat=None, title_of=None):
+        """A system message quoting the snippets most like text, or None if nothing is close."""
+        if len(text.strip()) < MIN_CHARS:
+            return None
+        hits = self.search([text], exclude_chat=exclude_chat)[0]
+        if not hits:
+            return None
+        lines = ["Possibly relevant excerpts from the user's earlier conversations:"]
+        for hit in hits:
+            title = title_of(hit["chat_id"]) if title_of else None
+            line = f"{hit['role']}: {' '.join(hit['text'].split())}"
+            if "reply" in hit:
+                line += f" / assistant: {' '.join(hit['reply'].split())}"
+            lines.append(f'- In "{title}", {line}' if title else f"- {line}")
+        return {"role": "system", "content": "\n".join(lines)}
+
+    def _scan(self, matrix, queries, chat_ids, rows, k, exclude_chat):
+        """Top k rows of matrix @ queries.T per query, block by block; ([rows], [scores]) per query."""
+        best_rows = np.empty((0, len(queries)), np.int64)
+        best_scores = np.empty((0, len(queries)), np.float32)
+        for start in range(0, rows, BLOCK_ROWS):
+            end = min(start + BLOCK_ROWS, rows)
+            scores = matrix[start:end] @ queries.T
+            scores[excluded(chat_ids[start:end], exclude_chat)] = -np.inf
+            block_best = top_k(scores, k)
+            best_rows = np.concatenate([best_rows, block_best + start])
+            best_scores = np.concatenate([best_scores, np.take_along_axis(scores, block_best, axis=0)])
+            keep = top_k(best_scores, k)
+            best_rows = np.take_along_axis(best_rows, keep, axis=0)
+            best_scores = np.take_along_axis(best_scores, keep, axis=0)
+        return list(best_rows.T), list(best_scores.T)
+
+    def _snippets(self, found, scores, min_score, k):
+        """Up to k hit dicts per query for the rows scoring at least min_score.
+
+        A user message brings the reply after it, which is then not a hit of
+        its own; a text said before (say, the same greeting in several chats)
+        is only quoted once.
+        """
+        wanted = {int(row) for rows, s in zip(found, scores) for row, score in zip(rows, s) if score >= min_score}
+        if not wanted:
+            return [[] for _ in found]
+        wanted |= {row + 1 for row in wanted}
+        marks = ",".join("?" * len(wanted))
+        with self._lock:
+            texts = {row: (chat_id, role, text, ts) for row, chat_id, role, text, ts in self._conn.execute(
+                f"SELECT row, chat_id, role, text, ts FROM snippets WHERE row IN ({marks})", list(wanted))}
+        results = []
+        for rows, s in zip(found, scores):
+            hits, seen, said = [], set(), set()
+            for row, score in zip(rows.tolist(), s.tolist()):
+                if score < min_score or row not in texts or row in seen:
+                    continue
+                chat_id, role, text, ts = texts[row]
+                if same_text(text) in said:
+                    continue
+                said.add(same_text(text))
+                hit = {"row": row, "chat_id": chat_id, "role": role, "text": text, "ts": ts, "score": score}
+                seen.add(row)
+                reply = texts.get(row + 1)
+                if role == "user" and reply is not None and reply[0] == chat_id and reply[1] == "assistant":
+                    hit["reply"] = reply[2]
+                    said.add(same_text(reply[2]))
+                    if row + 1 in seen:
+                        # The reply ranked higher on its own: the pair takes its place instead
+                        at = next(i for i, h in enumerate(hits) if h["row"] == row + 1)
+                        hit["score"] = hits[at]["score"]
+                        hits[at] = hit
+                        continue
+                    seen.add(row + 1)
+                hits.append(hit)
+            results.append(hits[:k])
+        return results
+
+    def close(self):
+        with self._lock:
+            for m in self._maps:
+                m.flush()
+            self._conn.close()
+
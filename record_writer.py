@@ -0,0 +1,93 @@
+import queue
+import threading
+import time
+
+# Background writer for append-only text records (research_output.txt).
+# Callers only enqueue a record; one writer thread owns the open file handles
+# and writes each file's pending records with a single write() when enough
+# bytes have piled up, when FLUSH_INTERVAL has passed, or on flush()/close().
+# Each record is enqueued as one string and only the writer thread writes, so
+# records from concurrent callers never interleave.
+
+FLUSH_BYTES = 64 * 1024
+FLUSH_INTERVAL = 1.0
+
+_FLUSH = object()
+_CLOSE = object()
+
+
+class RecordWriter:
+    """Coalesces appended records per file and writes them from one thread."""
+
+    def __init__(self, flush_bytes=FLUSH_BYTES, flush_interval=FLUSH_INTERVAL, encoding="utf-8"):
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self.encoding = encoding
+        self._queue = queue.Queue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="record-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, filename, record):
+        """Queues a whole record for appending to filename. Returns immediately."""
+        if self._closed:
+            raise ValueError("RecordWriter is closed")
+        self._queue.put((filename, record))
+
+    def flush(self, timeout=None):
+        """Blocks until every record queued so far is written and flushed."""
+        done = threading.Event()
+        self._queue.put((_FLUSH, done))
+        return done.wait(timeout)
+
+    def close(self, timeout=None):
+        """Writes everything still queued and closes the files."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put((_CLOSE, None))
+        self._thread.join(timeout)
+
+    def _run(self):
+        handles = {}
+        pending = {}  # filename -> [records]
+        pending_bytes = 0
+        oldest = None  # when the oldest pending record arrived
+
+        def write_pending():
+            for filename, records in pending.items():
+                try:
+                    f = handles.get(filename)
+                    if f is None:
+                        f = handles[filename] = open(filename, "a", encoding=self.encoding)
+                    f.write("".join(records))
+                    f.flush()
+                except OSError as e:
+                    print(f"RecordWriter: could not write {len(records)} record(s) to {filename}: {e}")
+            pending.clear()
+
+        while True:
+            timeout = None if oldest is None else max(0.0, oldest + self.flush_interval - time.monotonic())
+            try:
+                filename, record = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                filename, record = None, None
+
+            if filename is not None and filename is not _FLUSH and filename is not _CLOSE:
+                pending.setdefault(filename, []).append(record)
+                pending_bytes += len(record)
+                if oldest is None:
+                    oldest = time.monotonic()
+                if pending_bytes < self.flush_bytes and time.monotonic() - oldest < self.flush_interval:
+                    continue
+
+            write_pending()
+            pending_bytes = 0
+            oldest = None
+
+            if filename is _FLUSH:
+                record.set()
+            elif filename is _CLOSE:
+                for f in handles.values():
+                    f.close()
+                return
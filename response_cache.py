@@ -0,0 +1,116 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+# On-disk cache of model replies, keyed by a hash of the model, temperature
+# and normalized api_messages. A hit skips the API round trip entirely.
+# Caching is opt-in per (model, temperature): replies are only reused for
+# combinations that have been enable()d, since a cached answer to a sampled
+# prompt is one fixed draw.
+
+CACHE_FILE = "response_cache.db"
+
+# Entries older than this are treated as misses
+TTL_SECONDS = 7 * 24 * 3600
+
+# Least recently used entries beyond this are evicted
+MAX_ENTRIES = 5000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    reply TEXT NOT NULL,
+    created REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_by_use ON responses(last_used);
+"""
+
+
+def normalize(api_messages):
+    """Role/content pairs with whitespace collapsed, so trivial edits still hit."""
+    return [[m["role"], " ".join(m["content"].split())] for m in api_messages]
+
+
+def cache_key(model, temperature, api_messages):
+    payload = json.dumps([model, temperature, normalize(api_messages)], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """SQLite-backed reply cache with TTL and size-bounded LRU eviction."""
+
+    def __init__(self, path=CACHE_FILE, ttl=TTL_SECONDS, max_entries=MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._enabled = set()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def enable(self, model, temperature=None):
+        """Opts a model/temperature combination in to caching."""
+        self._enabled.add((model, temperature))
+
+    def enabled(self, model, temperature=None):
+        return (model, temperature) in self._enabled
+
+    def get(self, model, api_messages, temperature=None):
+        """Returns the cached reply, or None on a miss (or if caching is off for this model)."""
+        if not self.enabled(model, temperature):
+            return None
+        key = cache_key(model, temperature, api_messages)
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT reply, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and now - row[1] > self.ttl:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return row[0]
+
+    def put(self, model, api_messages, reply, temperature=None):
+        """Stores a reply and evicts the least recently used entries past max_entries."""
+        if not self.enabled(model, temperature):
+            return
+        key = cache_key(model, temperature, api_messages)
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, reply, created, last_used) VALUES (?, ?, ?, ?)",
+                (key, reply, now, now)
+            )
+            self._conn.execute(
+                "DELETE FROM responses WHERE key IN "
+                "(SELECT key FROM responses ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+    def stats(self):
+        """Hit/miss counters for this session."""
+        lookups = self.hits + self.misses
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": size,
+        }
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM responses")
+
+    def close(self):
+        self._conn.close()
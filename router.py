@@ -0,0 +1,403 @@
+import itertools
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import llm
+from telemetry import telemetry
+
+# Routes each request to the fastest healthy model backend.
+#
+# Every backend keeps rolling stats of its time to first chunk and of its
+# outcomes. Requests go to healthy backends in order of median latency; one
+# that fails before producing anything falls over to the next. If the chosen
+# backend has not produced its first chunk within its p95, the request is
+# hedged: the next backend is started as well, the first one to produce a
+# chunk wins, and the loser is cancelled (its stream is closed, even while
+# it is still waiting for its first chunk). After FAILURE_THRESHOLD
+# consecutive failures a backend is skipped for COOLDOWN seconds, then given
+# one request to prove it has recovered; the others skip it until that one
+# is done.
+#
+# Backends stream: stream(api_messages, cancel) yields text chunks and stops
+# early once the cancel Event is set; cancel.on_set() registers a callback to
+# interrupt a blocking read. Hedging and failover both happen before the
+# first chunk, so the caller never sees output from two backends.
+
+# Rolling window of samples per backend
+WINDOW = 100
+
+# Samples needed before a backend's own percentiles are trusted
+MIN_SAMPLES = 5
+
+# Assumed latency of a backend without enough samples; it sorts behind
+# measured backends faster than this, so new backends still get tried
+PRIOR_LATENCY = 1.0
+
+# Hedge after the primary's p95 time to first chunk, within these bounds
+HEDGE_DELAY = 2.0  # Until the primary has MIN_SAMPLES
+HEDGE_MIN = 0.05
+HEDGE_MAX = 10.0
+
+# Circuit breaker
+FAILURE_THRESHOLD = 3
+COOLDOWN = 30.0
+
+# Backends with a higher error rate over the window sort after the others
+MAX_ERROR_RATE = 0.5
+
+MAX_WORKERS = 16
+
+# Tried after the app's own model; skipped when ANTHROPIC_API_KEY isn't set
+ANTHROPIC_MODEL = "claude-3-5-haiku-latest"
+
+
+class BackendUnavailable(Exception):
+    """The backend can't be used at all (e.g. no API key); it is dropped from routing."""
+
+
+class Cancelled(Exception):
+    """Raised inside a backend that lost a hedge."""
+
+
+class AllBackendsFailed(Exception):
+    pass
+
+
+class CancelEvent(threading.Event):
+    """A threading.Event that also runs callbacks when it is set."""
+
+    def __init__(self):
+        super().__init__()
+        self._callbacks = []
+        self._callbacks_lock = threading.Lock()
+
+    def on_set(self, callback):
+        """Runs callback when the event is set (at once if it already is); returns a function that unregisters it."""
+        with self._callbacks_lock:
+            if not self.is_set():
+                self._callbacks.append(callback)
+                return lambda: self._remove(callback)
+        callback()
+        return lambda: None
+
+    def _remove(self, callback):
+        with self._callbacks_lock:  # Waits for the callback if it is running
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def set(self):
+        with self._callbacks_lock:
+            super().set()
+            callbacks, self._callbacks = self._callbacks, []
+            for callback in callbacks:
+                callback()
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+class BackendStats:
+    """Rolling latency and outcome window of one backend, and its circuit breaker."""
+
+    def __init__(self, window=WINDOW):
+        self.first_chunk = deque(maxlen=window)  # seconds to first chunk
+        self.outcomes = deque(maxlen=window)     # True for success
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.probing = False  # A request is testing the half-open breaker
+        self.requests = 0
+        self.wins = 0
+
+    def start_request(self):
+        self.requests += 1
+        if self.consecutive_failures >= FAILURE_THRESHOLD:
+            self.probing = True
+
+    def record_success(self, first_chunk):
+        self.first_chunk.append(first_chunk)
+        self.outcomes.append(True)
+        self.consecutive_failures = 0
+        self.probing = False
+
+    def record_failure(self):
+        self.outcomes.append(False)
+        self.consecutive_failures += 1
+        self.probing = False
+        if self.consecutive_failures >= FAILURE_THRESHOLD:
+            self.open_until = time.monotonic() + COOLDOWN
+
+    def record_cancelled(self):
+        """The request was given up on before it succeeded or failed."""
+        self.probing = False
+
+    def healthy(self, now):
+        # Past the cooldown the breaker is half open: one request goes through;
+        # its success closes the breaker, and its failure opens it for another
+        # COOLDOWN. Until it ends the backend stays unhealthy for the rest.
+        return self.consecutive_failures < FAILURE_THRESHOLD or (now >= self.open_until and not self.probing)
+
+    def error_rate(self):
+        return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+    def p50(self):
+        return percentile(self.first_chunk, 50) if len(self.first_chunk) >= MIN_SAMPLES else PRIOR_LATENCY
+
+    def p95(self):
+        return percentile(self.first_chunk, 95) if len(self.first_chunk) >= MIN_SAMPLES else None
+
+
+class Backend:
+    """A named model endpoint: stream(api_messages, cancel) yields reply text chunks."""
+
+    def __init__(self, name, stream):
+        self.name = name
+        self.stream = stream
+        self.stats = BackendStats()
+        self.disabled = None  # Reason, once BackendUnavailable was raised
+
+    def __repr__(self):
+        return f"Backend({self.name!r})"
+
+
+def openai_backend(model, client=None, limiter=None):
+    """Chat completions through llm.create_completion (shared pool, retries, rate limits)."""
+    def stream(api_messages, cancel):
+        # The last chunk carries the token usage, with no choices
+        response = llm.create_completion(client, limiter, model=model, messages=api_messages, stream=True,
+                                         stream_options={"include_usage": True})
+        unregister = cancel.on_set(lambda: llm.abort(response))
+        try:
+            for chunk in response:
+                if cancel.is_set():
+                    raise Cancelled()
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+                elif getattr(chunk, "usage", None) is not None:
+                    telemetry.record_usage(chunk.usage, model)
+        except Exception:
+            if cancel.is_set():
+                raise Cancelled() from None  # The read was cut off by llm.abort
+            raise
+        finally:
+            unregister()
+            response.close()
+
+    return Backend(f"openai:{model}", stream)
+
+
+def anthropic_backend(model, max_tokens=1024):
+    """Anthropic Messages API; unavailable (not an error) without ANTHROPIC_API_KEY."""
+    client = None
+
+    def stream(api_messages, cancel):
+        nonlocal client
+        if client is None:
+            from dotenv import load_dotenv
+            load_dotenv()
+            if not os.getenv("ANTHROPIC_API_KEY"):
+                raise BackendUnavailable("ANTHROPIC_API_KEY is not set")
+            try:
+                import anthropic
+            except ImportError:
+                raise BackendUnavailable("the anthropic package is not installed") from None
+            client = anthropic.Anthropic()
+
+        # System prompts go in their own parameter, and the turns must start with the user
+        system = "\n\n".join(m["content"] for m in api_messages if m["role"] == "system")
+        messages = [m for m in api_messages if m["role"] != "system"]
+        while messages and messages[0]["role"] != "user":
+            messages.pop(0)
+        kwargs = {"system": system} if system else {}
+        response = client.messages.create(model=model, max_tokens=max_tokens, messages=messages, stream=True, **kwargs)
+        unregister = cancel.on_set(lambda: llm.abort(response))
+        try:
+            for event in response:
+                if cancel.is_set():
+                    raise Cancelled()
+                if event.type == "content_block_delta" and getattr(event.delta, "text", None):
+                    yield event.delta.text
+                elif event.type == "message_start":
+                    telemetry.count("prompt_tokens", event.message.usage.input_tokens or 0, model)
+                elif event.type == "message_delta":
+                    telemetry.count("completion_tokens", event.usage.output_tokens or 0, model)
+        except Exception:
+            if cancel.is_set():
+                raise Cancelled() from None
+            raise
+        finally:
+            unregister()
+            response.close()
+
+    return Backend(f"anthropic:{model}", stream)
+
+
+def default_backends(model):
+    """The app's OpenAI model first, then Anthropic as the fallback and hedge."""
+    return [openai_backend(model), anthropic_backend(ANTHROPIC_MODEL)]
+
+
+class Router:
+    """Picks, fails over between and hedges across a list of backends (in preference order)."""
+
+    def __init__(self, backends, hedge=True, max_workers=MAX_WORKERS):
+        self.backends = list(backends)
+        self.hedge = hedge
+        self.hedges = 0
+        self.failovers = 0
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="router")
+
+    def ranked(self):
+        """Enabled backends, best first: healthy, then low error rate, then fast, then configured order."""
+        now = time.monotonic()
+        with self._lock:
+            candidates = [b for b in self.backends if b.disabled is None]
+            return sorted(candidates, key=lambda b: (
+                not b.stats.healthy(now),
+                b.stats.error_rate() > MAX_ERROR_RATE,
+                b.stats.p50(),
+            ))
+
+    def hedge_delay(self, backend):
+        p95 = backend.stats.p95()
+        return HEDGE_DELAY if p95 is None else min(HEDGE_MAX, max(HEDGE_MIN, p95))
+
+    def complete(self, api_messages):
+        """The whole reply text; see stream()."""
+        return "".join(self.stream(api_messages)).strip()
+
+    def stream(self, api_messages):
+        """Yields the reply's text chunks from whichever backend answers first.
+
+        Raises AllBackendsFailed if every backend failed before producing output.
+        """
+        candidates = iter(self.ranked())
+        results = queue.Queue()
+        attempts = {}  # attempt id -> (backend, cancel Event, start time)
+        attempt_ids = itertools.count()
+        errors = []
+
+        def run(attempt, backend, cancel):
+            try:
+                for chunk in backend.stream(api_messages, cancel):
+                    results.put((attempt, "chunk", chunk))
+                results.put((attempt, "done", None))
+            except Exception as e:
+                results.put((attempt, "error", e))
+
+        def launch():
+            backend = next(candidates, None)
+            if backend is None:
+                return None
+            cancel = CancelEvent()
+            attempt = next(attempt_ids)
+            attempts[attempt] = (backend, cancel, time.monotonic())
+            with self._lock:
+                backend.stats.start_request()
+            self._pool.submit(run, attempt, backend, cancel)
+            return backend
+
+        primary = launch()
+        if primary is None:
+            raise AllBackendsFailed("no backends available")
+        hedge_at = time.monotonic() + self.hedge_delay(primary) if self.hedge else None
+        winner = None
+
+        try:
+            while winner is None:
+                timeout = None if hedge_at is None else max(0.0, hedge_at - time.monotonic())
+                try:
+                    attempt, kind, value = results.get(timeout=timeout)
+                except queue.Empty:
+                    # The primary is slower than its p95: race the next backend against it
+                    hedge_at = None
+                    if launch() is not None:
+                        with self._lock:
+                            self.hedges += 1
+                    continue
+                if attempt not in attempts:
+                    continue  # From a cancelled loser
+                backend, cancel, start = attempts[attempt]
+
+                if kind == "error":
+                    del attempts[attempt]
+                    self._record_error(backend, value, errors)
+                    if not attempts:
+                        # Nothing else in flight: fail over to the next backend
+                        primary = launch()
+                        if primary is None:
+                            raise AllBackendsFailed("; ".join(errors))
+                        with self._lock:
+                            self.failovers += 1
+                        hedge_at = time.monotonic() + self.hedge_delay(primary) if self.hedge else None
+                    continue
+
+                # First output (or an empty reply): this backend wins, the others are cancelled
+                winner = attempt
+                now = time.monotonic()
+                with self._lock:
+                    backend.stats.record_success(now - start)
+                    backend.stats.wins += 1
+                    for other, (loser, loser_cancel, loser_start) in list(attempts.items()):
+                        if other != attempt:
+                            loser_cancel.set()
+                            # Censored sample: the loser took at least this long
+                            loser.stats.first_chunk.append(now - loser_start)
+                            loser.stats.record_cancelled()
+                            del attempts[other]
+                if kind == "chunk":
+                    yield value
+                elif kind == "done":
+                    return
+
+            while True:
+                attempt, kind, value = results.get()
+                if attempt != winner:
+                    continue
+                if kind == "chunk":
+                    yield value
+                elif kind == "done":
+                    return
+                else:
+                    # Output has already reached the caller, so it can't fail over any more
+                    with self._lock:
+                        backend.stats.record_failure()
+                    raise value
+        finally:
+            # The caller stopped early or an error escaped: stop whatever is still running
+            for backend, cancel, start in attempts.values():
+                cancel.set()
+                with self._lock:
+                    backend.stats.record_cancelled()
+
+    def _record_error(self, backend, error, errors):
+        with self._lock:
+            if isinstance(error, BackendUnavailable):
+                backend.disabled = str(error)
+            elif not isinstance(error, Cancelled):
+                backend.stats.record_failure()
+        errors.append(f"{backend.name}: {error}")
+
+    def report(self):
+        """Per-backend stats, for logging or a debug view."""
+        now = time.monotonic()
+        with self._lock:
+            return [{
+                "backend": b.name,
+                "requests": b.stats.requests,
+                "wins": b.stats.wins,
+                "p50_ms": round(b.stats.p50() * 1000, 1) if len(b.stats.first_chunk) >= MIN_SAMPLES else None,
+                "p95_ms": round(b.stats.p95() * 1000, 1) if len(b.stats.first_chunk) >= MIN_SAMPLES else None,
+                "error_rate": round(b.stats.error_rate(), 3),
+                "healthy": b.stats.healthy(now),
+                "disabled": b.disabled,
+            } for b in self.backends]
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
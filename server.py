@@ -0,0 +1,329 @@
+"""Serves the chat over HTTP and WebSocket: many users' sessions from one asyncio process.
+
+Every session has its own chat history (a SQLite store under --sessions-dir)
+and its own ChatEngine, so a turn goes through the same steps as
+send_message in the GUIs: the message is saved, the context window is
+built, the reply cache is checked, and the model is called. All sessions
+share one pooled API client (llm.get_client) and one thread pool for the
+blocking calls: the model, and every SQLite read and write, so the event
+loop only moves bytes.
+
+    GET    /sessions/{session}/chats                      the session's chats
+    POST   /sessions/{session}/chats                      {"title"} -> new chat
+    DELETE /sessions/{session}/chats/{chat}
+    GET    /sessions/{session}/chats/{chat}/messages
+    POST   /sessions/{session}/chats/{chat}/messages      {"text", "stream"}
+    GET    /sessions/{session}/ws                         WebSocket
+    GET    /health, /metrics
+
+A POST to messages returns {"message": reply}; with "stream": true the reply
+comes as server-sent events, {"delta": text} per chunk and then
+{"message": reply}. On the WebSocket each {"chat", "text"} (a missing chat
+starts a new one) is answered with {"type": "delta"} frames and a
+{"type": "done"} frame, one turn at a time.
+
+Backpressure: a session runs one turn per chat at a time; at most
+--max-turns turns run at once, and a turn that can't start within
+--queue-timeout seconds gets a 503 with Retry-After. Streams are written
+only as fast as the client reads them, and a stalled reader pauses the
+model stream (ChatEngine.STREAM_BUFFER) instead of buffering without bound.
+
+    python server.py --port 8080
+    python server.py --base-url http://127.0.0.1:8000/v1   # local stub model
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import WSMsgType, web
+
+import llm
+from chat_engine import ChatEngine, MODEL
+from chat_store import ChatStore
+from response_cache import ResponseCache
+from telemetry import telemetry
+
+HOST = "127.0.0.1"
+PORT = 8080
+SESSIONS_DIR = "sessions"
+
+# Turns in flight across all sessions, and how long one may wait for a slot
+MAX_TURNS = 256
+QUEUE_TIMEOUT = 5.0
+
+# Sessions whose stores stay open; the least recently used are closed
+MAX_OPEN_SESSIONS = 512
+
+MAX_MESSAGE_CHARS = 32_000
+SESSION_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+class Session:
+    """One user's chats: a ChatEngine over the session's own store."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.chat_locks = {}  # chat id -> asyncio.Lock, so turns in one chat don't interleave
+        self.active = 0       # Requests using the session; it isn't closed while > 0
+
+    def chat(self, chat_id):
+        """The chat with chat_id, as sent by the client; 404 if there is none."""
+        try:
+            chat = self.engine.find(int(chat_id))
+        except (TypeError, ValueError):
+            chat = None
+        if chat is None:
+            raise web.HTTPNotFound(text=json.dumps({"error": f"no chat {chat_id}"}), content_type="application/json")
+        return chat
+
+    def lock(self, chat):
+        return self.chat_locks.setdefault(chat["id"], asyncio.Lock())
+
+
+class ChatServer:
+    """Sessions, admission control and the HTTP/WebSocket handlers."""
+
+    def __init__(self, sessions_dir=SESSIONS_DIR, model=MODEL, client=None, response_cache=None, limiter=None,
+                 max_turns=MAX_TURNS, queue_timeout=QUEUE_TIMEOUT, max_open_sessions=MAX_OPEN_SESSIONS):
+        self.sessions_dir = sessions_dir
+        self.model = model
+        self.client = client  # None: the shared client from llm.get_client()
+        self.response_cache = response_cache
+        self.limiter = limiter  # None: llm.rate_limiter
+        self.queue_timeout = queue_timeout
+        self.max_open_sessions = max_open_sessions
+        self.turns = asyncio.Semaphore(max_turns)
+        self.rejected = 0
+        # Model calls and store reads and writes; threads mostly wait on the network or disk
+        self.executor = ThreadPoolExecutor(max_turns + 8, thread_name_prefix="chat-server")
+        self._sessions = OrderedDict()  # session id -> Session
+        self._opening = {}              # session id -> Future of a Session being opened
+        os.makedirs(sessions_dir, exist_ok=True)
+
+    def app(self):
+        app = web.Application(client_max_size=4 * MAX_MESSAGE_CHARS, middlewares=[self.track_session])
+        app.add_routes([
+            web.get("/health", self.health),
+            web.get("/metrics", self.metrics),
+            web.get("/sessions/{session}/chats", self.list_chats),
+            web.post("/sessions/{session}/chats", self.create_chat),
+            web.delete(r"/sessions/{session}/chats/{chat:\d+}", self.delete_chat),
+            web.get(r"/sessions/{session}/chats/{chat:\d+}/messages", self.list_messages),
+            web.post(r"/sessions/{session}/chats/{chat:\d+}/messages", self.post_message),
+            web.get("/sessions/{session}/ws", self.websocket),
+        ])
+        app.on_cleanup.append(self.close)
+        return app
+
+    # --- Sessions ---
+
+    @web.middleware
+    async def track_session(self, request, handler):
+        """Keeps a request's session open until the request is done."""
+        try:
+            return await handler(request)
+        finally:
+            session = request.get("session")
+            if session is not None:
+                session.active -= 1
+
+    async def session(self, request):
+        """The request's Session, opening its store on a worker thread the first time."""
+        session = await self._get_session(request.match_info["session"])
+        session.active += 1
+        request["session"] = session
+        return session
+
+    async def _get_session(self, session_id):
+        if not SESSION_ID.match(session_id):
+            raise web.HTTPBadRequest(text="session ids are 1-64 letters, digits, '-' or '_'")
+        session = self._sessions.get(session_id)
+        if session is not None:
+            self._sessions.move_to_end(session_id)
+            return session
+        opening = self._opening.get(session_id)
+        if opening is None:
+            # Concurrent first requests for one session share the same open
+            opening = self._opening[session_id] = asyncio.get_running_loop().run_in_executor(
+                self.executor, self._open, session_id)
+        try:
+            session = await asyncio.shield(opening)
+        finally:
+            self._opening.pop(session_id, None)
+        if session_id not in self._sessions:
+            self._sessions[session_id] = session
+            self._close_idle()
+        return self._sessions[session_id]
+
+    def _open(self, session_id):
+        store = ChatStore(os.path.join(self.sessions_dir, f"{session_id}.db"))
+        return Session(ChatEngine(store, self.model, response_cache=self.response_cache, client=self.client,
+                                  limiter=self.limiter, executor=self.executor))
+
+    def _close_idle(self):
+        """Closes the least recently used sessions beyond max_open_sessions."""
+        excess = len(self._sessions) - self.max_open_sessions
+        for session_id in [sid for sid, s in self._sessions.items() if s.active == 0][:max(0, excess)]:
+            self.executor.submit(self._sessions.pop(session_id).engine.store.close)  # Checkpoints the WAL
+
+    def blocking(self, fn, *args):
+        """Runs a store call on the executor; await the result."""
+        return asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    async def turn_slot(self):
+        """Waits for one of the max_turns slots; 503 if none frees up within queue_timeout."""
+        try:
+            await asyncio.wait_for(self.turns.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise web.HTTPServiceUnavailable(text="too many turns in flight", headers={"Retry-After": "1"})
+
+    # --- HTTP ---
+
+    async def health(self, request):
+        return web.json_response({"sessions": len(self._sessions), "rejected": self.rejected})
+
+    async def metrics(self, request):
+        return web.Response(text=telemetry.prometheus(), content_type="text/plain")
+
+    async def list_chats(self, request):
+        session = await self.session(request)
+        return web.json_response([{"id": c["id"], "title": c["title"]} for c in session.engine.chats])
+
+    async def create_chat(self, request):
+        session = await self.session(request)
+        body = await read_json(request) if request.can_read_body else {}
+        chat = await self.blocking(session.engine.new_chat, body.get("title"))
+        return web.json_response({"id": chat["id"], "title": chat["title"]}, status=201)
+
+    async def delete_chat(self, request):
+        session = await self.session(request)
+        chat = session.chat(request.match_info["chat"])
+        await self.blocking(session.engine.delete_chat, chat)
+        session.chat_locks.pop(chat["id"], None)
+        return web.Response(status=204)
+
+    async def list_messages(self, request):
+        session = await self.session(request)
+        chat = session.chat(request.match_info["chat"])
+        messages = await self.blocking(session.engine.messages, chat)
+        return web.json_response([m.to_dict() for m in messages])
+
+    async def post_message(self, request):
+        session = await self.session(request)
+        chat = session.chat(request.match_info["chat"])
+        body = await read_json(request)
+        text = str(body.get("text", "")).strip()
+        if not text or len(text) > MAX_MESSAGE_CHARS:
+            raise web.HTTPBadRequest(text=f"text must be 1-{MAX_MESSAGE_CHARS} characters")
+
+        await self.turn_slot()
+        try:
+            async with session.lock(chat):
+                if not body.get("stream"):
+                    msg = await session.engine.send(chat, text)
+                    return web.json_response({"message": msg.to_dict() if msg else None})
+
+                response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+                await response.prepare(request)
+                async for part in session.engine.send_stream(chat, text):
+                    await response.write(sse({"delta": part}))  # Waits while the client's buffer is full
+                msg = (await self.blocking(session.engine.messages, chat))[-1]
+                await response.write(sse({"message": msg.to_dict()}))
+                await response.write_eof()
+                return response
+        finally:
+            self.turns.release()
+
+    # --- WebSocket ---
+
+    async def websocket(self, request):
+        session = await self.session(request)
+        ws = web.WebSocketResponse(heartbeat=30, max_msg_size=4 * MAX_MESSAGE_CHARS)
+        await ws.prepare(request)
+        # One turn at a time: the next frame isn't read until this turn is done
+        async for frame in ws:
+            if frame.type != WSMsgType.TEXT:
+                break
+            try:
+                await self._ws_turn(session, ws, json.loads(frame.data))
+            except (web.HTTPException, ValueError, KeyError) as e:
+                await ws.send_json({"type": "error", "error": getattr(e, "text", None) or str(e)})
+        return ws
+
+    async def _ws_turn(self, session, ws, request):
+        if not isinstance(request, dict):
+            raise ValueError('expected a JSON object like {"chat": 1, "text": "..."}')
+        text = str(request["text"]).strip()
+        if not text or len(text) > MAX_MESSAGE_CHARS:
+            raise ValueError(f"text must be 1-{MAX_MESSAGE_CHARS} characters")
+        if request.get("chat"):
+            chat = session.chat(request["chat"])
+        else:
+            chat = await self.blocking(session.engine.new_chat)
+        await self.turn_slot()
+        try:
+            async with session.lock(chat):
+                async for part in session.engine.send_stream(chat, text):
+                    await ws.send_json({"type": "delta", "chat": chat["id"], "text": part})
+                msg = (await self.blocking(session.engine.messages, chat))[-1]
+                await ws.send_json({"type": "done", "chat": chat["id"], "message": msg.to_dict()})
+        finally:
+            self.turns.release()
+
+    async def close(self, app=None):
+        for session in self._sessions.values():
+            session.engine.store.close()
+        self._sessions.clear()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def read_json(request):
+    try:
+        body = await request.json()
+    except ValueError:
+        raise web.HTTPBadRequest(text="expected a JSON body") from None
+    if not isinstance(body, dict):
+        raise web.HTTPBadRequest(text="expected a JSON object")
+    return body
+
+
+def sse(payload):
+    return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode("utf-8")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--sessions-dir", default=SESSIONS_DIR)
+    parser.add_argument("--model", default=MODEL)
+    parser.add_argument("--base-url", help="OpenAI-compatible endpoint, e.g. a local stub server")
+    parser.add_argument("--api-key", help="defaults to OPENAI_API_KEY")
+    parser.add_argument("--max-turns", type=int, default=MAX_TURNS)
+    parser.add_argument("--queue-timeout", type=float, default=QUEUE_TIMEOUT)
+    parser.add_argument("--cache", action="store_true", help="reuse replies to identical prompts across sessions")
+    args = parser.parse_args(argv)
+
+    client = None
+    if args.base_url:
+        client = llm.build_client(base_url=args.base_url, api_key=args.api_key or os.getenv("OPENAI_API_KEY") or "local")
+    elif args.api_key:
+        client = llm.build_client(api_key=args.api_key)
+
+    async def make_app():
+        # The semaphore belongs to the loop that run_app starts
+        server = ChatServer(args.sessions_dir, args.model, client, ResponseCache() if args.cache else None,
+                            max_turns=args.max_turns, queue_timeout=args.queue_timeout)
+        return server.app()
+
+    print(f"Serving on http://{args.host}:{args.port} (sessions in {args.sessions_dir})")
+    web.run_app(make_app(), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+import json
+import threading
+import time
+from collections import deque
+from contextlib import ContextDecorator
+
+# Timings of the phases of a chat turn: the API call (time to first token
+# and total), persistence, and rendering, plus token counts from the API's
+# usage reports.
+#
+# Each phase keeps a rolling window of its last WINDOW durations for the
+# p50/p95 shown in the debug overlay, and running totals for the
+# Prometheus-style /metrics endpoint. With a path configured every sample
+# is also appended to a JSONL file by a background RecordWriter, so
+# recording stays a lock and a deque append on the calling thread.
+
+WINDOW = 1000
+
+# Phases are listed in this order first, then alphabetically
+PHASE_ORDER = ("api.ttft", "api.total", "agent.model", "agent.tools", "store.append", "render.load_chat",
+               "render.append", "render.stream_delta", "render.sidebar")
+
+OVERLAY_REFRESH_MS = 500
+
+
+def percentile(sorted_values, p):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p / 100))]
+
+
+class Telemetry:
+    """Rolling per-phase latencies and counters, with optional JSONL and /metrics export."""
+
+    def __init__(self, path=None, window=WINDOW):
+        self.path = path
+        self.window = window
+        self._samples = {}   # phase -> deque of seconds
+        self._totals = {}    # phase -> [count, sum of seconds]
+        self._counters = {}  # (name, model) -> value
+        self._lock = threading.Lock()
+        self._writer = None
+        self._server = None
+
+    def configure(self, path=None, port=None):
+        """Starts JSONL export to path and/or serving /metrics on a local port."""
+        self.path = path
+        if port is not None:
+            self.serve(port)
+
+    def span(self, phase, **attrs):
+        """Times a with block, or each call of a decorated function, as one sample of phase.
+
+        attrs go to JSONL with the sample; `with span(...) as attrs` can add to them.
+        """
+        return _Span(self, phase, attrs)
+
+    def record(self, phase, seconds, **attrs):
+        with self._lock:
+            samples = self._samples.get(phase)
+            if samples is None:
+                samples = self._samples[phase] = deque(maxlen=self.window)
+                self._totals[phase] = [0, 0.0]
+            samples.append(seconds)
+            totals = self._totals[phase]
+            totals[0] += 1
+            totals[1] += seconds
+        if self.path:
+            self._export({"phase": phase, "ms": round(seconds * 1000, 3), **attrs})
+
+    def count(self, name, value, model=""):
+        with self._lock:
+            key = (name, model)
+            self._counters[key] = self._counters.get(key, 0) + value
+        if self.path:
+            self._export({"counter": name, "value": value, "model": model})
+
+    def record_usage(self, usage, model=""):
+        """Token counts from a response's usage, if the API sent one."""
+        if usage is None:
+            return
+        self.count("prompt_tokens", usage.prompt_tokens or 0, model)
+        self.count("completion_tokens", usage.completion_tokens or 0, model)
+
+    def _export(self, record):
+        if self._writer is None:
+            from record_writer import RecordWriter
+            with self._lock:
+                if self._writer is None:
+                    self._writer = RecordWriter()
+        record["ts"] = round(time.time(), 3)
+        self._writer.write(self.path, json.dumps(record) + "\n")
+
+    # --- Reports ---
+
+    def summary(self):
+        """{phase: {"count", "p50_ms", "p95_ms", "max_ms"}} over each phase's rolling window."""
+        with self._lock:
+            windows = {phase: sorted(samples) for phase, samples in self._samples.items()}
+        order = {phase: i for i, phase in enumerate(PHASE_ORDER)}
+        return {phase: {
+            "count": len(values),
+            "p50_ms": round(percentile(values, 50) * 1000, 2),
+            "p95_ms": round(percentile(values, 95) * 1000, 2),
+            "max_ms": round(values[-1] * 1000, 2),
+        } for phase, values in sorted(windows.items(), key=lambda kv: (order.get(kv[0], len(order)), kv[0]))}
+
+    def counters(self):
+        with self._lock:
+            return dict(self._counters)
+
+    def prometheus(self):
+        """The metrics in the Prometheus text exposition format."""
+        with self._lock:
+            windows = {phase: sorted(samples) for phase, samples in self._samples.items()}
+            totals = {phase: tuple(t) for phase, t in self._totals.items()}
+            counters = dict(self._counters)
+        lines = ["# HELP chat_phase_seconds Duration of each phase of a chat turn (quantiles over the last "
+                 f"{self.window} samples).", "# TYPE chat_phase_seconds summary"]
+        for phase, values in windows.items():
+            for q in (0.5, 0.95, 0.99):
+                lines.append(f'chat_phase_seconds{{phase="{phase}",quantile="{q}"}} {percentile(values, q * 100):.6f}')
+            lines.append(f'chat_phase_seconds_count{{phase="{phase}"}} {totals[phase][0]}')
+            lines.append(f'chat_phase_seconds_sum{{phase="{phase}"}} {totals[phase][1]:.6f}')
+        lines += ["# HELP chat_tokens_total Tokens reported by the API.", "# TYPE chat_tokens_total counter"]
+        for (name, model), value in sorted(counters.items()):
+            kind = name.removesuffix("_tokens")
+            lines.append(f'chat_tokens_total{{kind="{kind}",model="{model}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port, host="127.0.0.1"):
+        """Serves GET /metrics on a daemon thread. Returns the bound port."""
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        telemetry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = telemetry.prometheus().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="telemetry-metrics", daemon=True).start()
+        return self._server.server_address[1]
+
+    def close(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+class _Span(ContextDecorator):
+    __slots__ = ("telemetry", "phase", "attrs", "start")
+
+    def __init__(self, telemetry, phase, attrs):
+        self.telemetry = telemetry
+        self.phase = phase
+        self.attrs = attrs
+
+    def _recreate_cm(self):
+        # A fresh span per call of a decorated function, so calls may nest or overlap
+        return _Span(self.telemetry, self.phase, dict(self.attrs))
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self.attrs
+
+    def __exit__(self, *exc):
+        self.telemetry.record(self.phase, time.perf_counter() - self.start, **self.attrs)
+        return False
+
+
+# Shared by the engine, the GUIs and the batch runner
+telemetry = Telemetry()
+
+
+class DebugOverlay:
+    """A small always-on-top panel over a Tk window with each phase's rolling p50/p95."""
+
+    def __init__(self, root, source=telemetry):
+        import tkinter as tk
+
+        self.root = root
+        self.source = source
+        self.label = tk.Label(root, justify=tk.LEFT, anchor="nw", font=("Courier", 9),
+                              bg="#202020", fg="#c8f0c8", padx=6, pady=4)
+        self.visible = False
+        self._job = None
+
+    def toggle(self, event=None):
+        self.visible = not self.visible
+        if self.visible:
+            self.label.place(relx=1.0, x=-10, y=10, anchor="ne")
+            self.label.lift()
+            self._refresh()
+        else:
+            self.label.place_forget()
+            if self._job is not None:
+                self.root.after_cancel(self._job)
+                self._job = None
+
+    def _refresh(self):
+        lines = [f"{'phase':20} {'n':>6} {'p50 ms':>9} {'p95 ms':>9}"]
+        for phase, stats in self.source.summary().items():
+            lines.append(f"{phase:20} {stats['count']:6d} {stats['p50_ms']:9.2f} {stats['p95_ms']:9.2f}")
+        for (name, model), value in sorted(self.source.counters().items()):
+            lines.append(f"{name} {model}: {value}")
+        self.label.config(text="\n".join(lines) if len(lines) > 1 else "No samples yet")
+        self._job = self.root.after(OVERLAY_REFRESH_MS, self._refresh)
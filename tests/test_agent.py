@@ -0,0 +1,64 @@
+"""Agent loop with fake tools and a scripted model, as in benchmarks/bench_agent.py.
+
+The scripted model asks for several lookups in one step, then for one more,
+then answers. Tool latencies are fixed and far apart, so the timing checks
+hold with wide margins.
+"""
+import pytest
+
+from agent import Agent
+from benchmarks.bench_agent import MESSAGES, make_script, make_tools
+from benchmarks.common import ScriptedClient
+from llm import RateLimiter
+
+LATENCIES = {"search": 0.2, "wikipedia": 0.1}
+CALLS = [(name, f"query {i}") for i, name in enumerate(["search", "wikipedia"] * 3)]
+ANSWER = "Madrid is the largest of the three."
+MODEL_LATENCY = 0.01
+
+
+@pytest.fixture
+def agent_for():
+    agents = []
+
+    def make(calls, **kwargs):
+        client = ScriptedClient(make_script(calls), MODEL_LATENCY)
+        agent = Agent(make_tools(LATENCIES), model="scripted", client=client, limiter=RateLimiter(None, None),
+                      **kwargs)
+        agents.append(agent)
+        return agent, client.chat.completions.requests
+
+    yield make
+    for agent in agents:
+        agent.shutdown()
+
+
+def test_tool_calls_of_a_step_run_in_parallel(agent_for):
+    agent, requests = agent_for(CALLS, tool_timeout=2.0)
+    events = list(agent.run_iter(MESSAGES))
+    reply, trace = events[-1]["text"], events[-1]["trace"]
+    serial_ms = sum(LATENCIES[name] for name, _ in CALLS) * 1000
+    assert trace[0]["tools_ms"] < max(LATENCIES.values()) * 1000 * 1.5  # About the slowest tool
+    assert trace[0]["tools_ms"] < serial_ms / 2
+    assert sum(m["role"] == "tool" for m in requests[1]) == len(CALLS)  # Every result goes back to the model
+    finished = [e["name"] for e in events if e["type"] == "tool_result" and e["step"] == 0]
+    assert finished == sorted(finished, key=LATENCIES.get)  # Reported as they finish
+    assert reply == ANSWER
+
+
+def test_failing_and_stuck_tools_become_error_results(agent_for):
+    agent, requests = agent_for([("broken", "x"), ("stuck", "y"), ("nonexistent", "z"), ("search", "w")],
+                                tool_timeout=0.5)
+    reply, trace = agent.run(MESSAGES)
+    results = [m["content"] for m in requests[1] if m["role"] == "tool"]
+    assert len(results) == 4
+    assert sum(r.startswith("Error:") for r in results) == 3
+    assert trace[0]["tools_ms"] < 600  # The stuck tool costs at most the timeout
+    assert reply == ANSWER
+
+
+def test_streamed_answer_matches_the_blocking_one(agent_for):
+    agent, requests = agent_for(CALLS)
+    assert "".join(agent.stream(MESSAGES)).strip() == ANSWER
+    # Tool calls streamed in fragments are reassembled
+    assert sum(m["role"] == "tool" for m in requests[1]) == len(CALLS)
@@ -0,0 +1,78 @@
+"""Memory across chats: recall through ChatEngine, what is left out, and the sketch-and-rescore search.
+
+The search sizes are small; benchmarks/bench_memory.py times them up to 1M rows.
+"""
+import numpy as np
+import pytest
+
+from benchmarks.bench_memory import SyntheticEmbedder
+from chat_engine import ChatEngine
+from chat_store import ChatStore, Message
+from memory import DIM, Memory, normalize
+
+
+@pytest.fixture
+def memory(tmp_path):
+    memory = Memory(str(tmp_path / "memory"))
+    yield memory
+    memory.close()
+
+
+def test_new_chat_recalls_an_earlier_chat(tmp_path):
+    store = ChatStore(":memory:")
+    for i in range(50):
+        store.add_chat({"title": f"chat {i}"}, [
+            Message("user", f"Can you help me plan the weekend trip number {i} to the mountains?"),
+            Message("assistant", f"Sure, for trip {i} pack warm clothes and check the weather forecast first."),
+        ])
+    store.add_chat({"title": "cnss"}, [
+        Message("user", "What is the CNSS contribution rate for employees in Morocco?"),
+        Message("assistant", "The employee CNSS contribution is 4.48% of gross salary, capped at 6000 MAD."),
+    ])
+    engine = ChatEngine(store, "none", memory=Memory(str(tmp_path / "memory")))
+    assert engine.wait_for_memory(timeout=10)
+    chat = engine.new_chat()
+    engine.add_user_message(chat, "Remind me of the CNSS contribution rate we talked about")
+    api_messages = engine.build_request(chat)
+    engine.close()
+    recalled = [m["content"] for m in api_messages if m["role"] == "system"]
+    assert len(recalled) == 1
+    assert '"cnss"' in recalled[0] and "4.48%" in recalled[0]  # The question with its reply, under its chat's title
+    assert "trip" not in recalled[0]
+    assert api_messages[-1]["role"] == "user"
+
+
+def test_unrelated_and_short_messages_recall_nothing(memory):
+    memory.add(1, [Message("user", "What is the Social Security retirement age in the United States?"),
+                   Message("assistant", "It is 67 for anyone born in 1960 or later.")])
+    memory.add(2, [Message("user", "Hello there, how are you doing today?")])
+    assert memory.recall("what is the capital of france") is None  # Only stopwords in common
+    assert memory.recall("hello") is None
+
+
+def test_repeated_text_is_quoted_once(memory):
+    for chat_id in (1, 2, 3):
+        memory.add(chat_id, [Message("user", "Hello there, how are you doing today?"),
+                             Message("assistant", "I am fine, thanks for asking!")])
+    memory.add(4, [Message("user", "hello there,  how are you doing TODAY?")])
+    hits = memory.search(["hello there, how are you doing"])[0]
+    assert len(hits) == 1
+    assert hits[0]["reply"] == "I am fine, thanks for asking!"
+
+
+def test_sketch_search_finds_the_exact_top_hit(tmp_path):
+    embed = SyntheticEmbedder()
+    memory = Memory(str(tmp_path / "synthetic"), embed, exact_rows=1000)
+    while len(memory) < 20_000:
+        memory.add(len(memory) // 1000, [Message("user", "x" * 20)] * 5000)
+    exact = Memory(str(tmp_path / "synthetic"), embed, exact_rows=len(memory) + 1)
+    random = np.random.default_rng(1)
+    targets = random.integers(0, len(memory), 50)
+    queries = [embed.query(f"q{i}", normalize(memory.vectors[t][None]
+                                              + random.standard_normal((1, DIM)).astype(np.float32) * 0.05)[0])
+               for i, t in enumerate(targets)]
+    same = sum(abs(memory.search([q], min_score=-1)[0][0]["score"] - exact.search([q], min_score=-1)[0][0]["score"])
+               < 1e-5 for q in queries)
+    exact.close()
+    memory.close()
+    assert same >= 0.95 * len(queries)
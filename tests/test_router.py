@@ -0,0 +1,120 @@
+"""Router scenarios over simulated backends with fixed latencies, one request at a time.
+
+The same three scenarios as benchmarks/bench_router.py (hedging, failover
+and picking the faster backend), sized so that every outcome is decided by
+margins of tens of milliseconds rather than by random draws.
+"""
+import threading
+import time
+
+import pytest
+
+import llm
+import router
+from benchmarks.bench_router import MESSAGES, SimulatedBackend, run_load, pct
+from benchmarks.mock_server import MockServer
+from router import Router
+from telemetry import telemetry
+
+REQUESTS = 40
+
+
+def stalls(latency, stall, every, first=router.MIN_SAMPLES):
+    """latency for every call, plus stall for one call in every `every` from call `first` on."""
+    return lambda call: latency + stall if call >= first and (call - first) % every == every - 1 else latency
+
+
+@pytest.fixture(autouse=True)
+def short_cooldown(monkeypatch):
+    monkeypatch.setattr(router, "COOLDOWN", 1.0)  # Longer than the outage below
+
+
+def test_hedging_cuts_tail_latency():
+    results = {}
+    for label, hedge in (("single", None), ("hedged", True)):
+        a = SimulatedBackend("a", stalls(0.02, 0.4, every=8))
+        b = SimulatedBackend("b", lambda call: 0.03)
+        route = Router([a.backend] if hedge is None else [a.backend, b.backend], hedge=bool(hedge))
+        results[label], failures = run_load(route, REQUESTS, 1)
+        route.shutdown()
+        assert failures == 0
+    assert pct(results["hedged"], 99) < pct(results["single"], 99) / 2
+    assert pct(results["hedged"], 50) < pct(results["single"], 50) * 1.2
+    assert route.hedges == 4 and a.cancelled == 4  # The hedged run raced each stall, and a lost every race
+
+
+def test_failover_and_recovery():
+    a = SimulatedBackend("a", lambda call: 0.01)
+    b = SimulatedBackend("b", lambda call: 0.03)
+    route = Router([a.backend, b.backend])
+
+    def outage(i):
+        a.down = i >= 10
+
+    latencies, failures = run_load(route, 20, 1, outage)
+    assert failures == 0
+    # The breaker opens after FAILURE_THRESHOLD failures; the rest of the outage skips a
+    assert route.failovers == router.FAILURE_THRESHOLD
+    assert a.calls == 10 + router.FAILURE_THRESHOLD
+
+    a.down = False
+    assert route.ranked()[0] is b.backend  # Until the cooldown is over
+    time.sleep(router.COOLDOWN)
+    assert route.ranked()[0] is a.backend
+    run_load(route, 5, 1)
+    assert a.calls == 10 + router.FAILURE_THRESHOLD + 5
+    route.shutdown()
+
+
+def test_faster_backend_takes_over():
+    # The configured primary is slow, then stalls on its next MIN_SAMPLES calls; each stall is
+    # hedged to the fallback, which then has enough samples of its own to rank first
+    slow = SimulatedBackend("slow", lambda call: 0.48 if router.MIN_SAMPLES <= call < 2 * router.MIN_SAMPLES else 0.08)
+    fast = SimulatedBackend("fast", lambda call: 0.01)
+    route = Router([slow.backend, fast.backend])
+    latencies, failures = run_load(route, REQUESTS, 1)
+    route.shutdown()
+    assert failures == 0
+    assert route.ranked()[0] is fast.backend
+    assert slow.calls == 2 * router.MIN_SAMPLES
+    assert fast.calls == REQUESTS - router.MIN_SAMPLES
+
+
+def test_half_open_breaker_lets_one_request_through():
+    stats = router.BackendStats()
+    for _ in range(router.FAILURE_THRESHOLD):
+        stats.record_failure()
+    after_cooldown = time.monotonic() + router.COOLDOWN
+    assert not stats.healthy(time.monotonic())
+    assert stats.healthy(after_cooldown)
+    stats.start_request()
+    assert not stats.healthy(after_cooldown)  # The probe is in flight
+    stats.record_failure()
+    assert not stats.healthy(after_cooldown)  # Open again, for another COOLDOWN
+    stats.start_request()
+    stats.record_success(0.01)
+    assert stats.healthy(time.monotonic())
+
+
+def openai_backend(server):
+    pytest.importorskip("openai")
+    client = llm.build_client(base_url=server.base_url, api_key="test")
+    return router.openai_backend("mock", client, llm.RateLimiter(None, None))
+
+
+def test_openai_backend_records_usage():
+    with MockServer(latency=0, token_interval=0) as server:
+        before = telemetry.counters().get(("completion_tokens", "mock"), 0)
+        list(openai_backend(server).stream(MESSAGES, router.CancelEvent()))
+        assert telemetry.counters()[("completion_tokens", "mock")] - before == server.config.reply_words
+
+
+def test_cancel_interrupts_a_stream_waiting_for_its_first_chunk():
+    with MockServer(latency=0, first_chunk_delay=5.0) as server:
+        backend = openai_backend(server)
+        cancel = router.CancelEvent()
+        threading.Timer(0.2, cancel.set).start()
+        start = time.perf_counter()
+        with pytest.raises(router.Cancelled):
+            list(backend.stream(MESSAGES, cancel))
+        assert time.perf_counter() - start < 1.0
@@ -0,0 +1,60 @@
+"""Offline Wikipedia index over the bundled sample dump (data/wiki_sample.xml).
+
+benchmarks/bench_wiki.py times the same lookups on a large synthetic dump.
+"""
+import os
+
+import pytest
+
+from benchmarks.bench_wiki import synthetic_dump
+from wiki_index import NO_RESULT, WikiIndex, build_index
+
+SAMPLE_DUMP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "wiki_sample.xml")
+
+
+@pytest.fixture(scope="module")
+def index(tmp_path_factory):
+    directory = str(tmp_path_factory.mktemp("wiki"))
+    build_index(SAMPLE_DUMP, directory)
+    index = WikiIndex(directory, max_chars=120)
+    yield index
+    index.close()
+
+
+def title(index, i):
+    return index.title(i) if i is not None else None
+
+
+def test_exact_lookup_ignores_case_and_underscores(index):
+    assert title(index, index.exact("SQLite")) == "SQLite"
+    assert title(index, index.exact("memory-MAPPED_file")) == "Memory-mapped file"
+
+
+def test_redirects_lead_to_their_article(index):
+    assert title(index, index.exact("cnss")) == "Caisse nationale de sécurité sociale"
+
+
+def test_prefix_and_fuzzy_lookups(index):
+    assert [index.title(i) for i in index.prefix("ca")] == ["Caisse nationale de sécurité sociale", "Casablanca"]
+    assert title(index, index.find("Moroco")) == "Morocco"
+
+
+def test_other_namespaces_are_skipped(index):
+    assert index.exact("Wikipedia:About") is None
+
+
+def test_answers_are_plain_text_capped_at_max_chars(index):
+    assert "[[" not in index.text(index.exact("Python language"))
+    assert "{{" not in index.run("SQLite")
+    assert len(index.run("Tkinter").split("Summary: ", 1)[1]) == 120
+    assert index.run("zzzz qqqq") == NO_RESULT
+
+
+def test_every_title_of_a_larger_dump_is_found(tmp_path):
+    dump = str(tmp_path / "synthetic.jsonl")
+    titles = synthetic_dump(dump, 2000)
+    build_index(dump, str(tmp_path / "index"))
+    index = WikiIndex(str(tmp_path / "index"))
+    found = [title(index, index.exact(t.lower())) for t in titles]
+    index.close()
+    assert found == titles
@@ -0,0 +1,86 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+# Execution layer for the research tools in tools.py.
+# Results are memoized per (tool, normalized query) for TTL_SECONDS, identical
+# queries that are already running share one in-flight call, and every call
+# runs on a thread pool with a timeout. The agent runs a step's tool calls
+# at once, so they overlap here too.
+
+TTL_SECONDS = 15 * 60
+CALL_TIMEOUT = 20.0
+MAX_WORKERS = 8
+
+# Results kept in the memo; the least recently used go first
+MEMO_SIZE = 1024
+
+
+def normalize_query(query):
+    """Case- and whitespace-insensitive form of a query, used as the memo key."""
+    return " ".join(str(query).split()).casefold()
+
+
+class ToolRunner:
+    """Runs tool backends concurrently with memoization and in-flight deduplication."""
+
+    def __init__(self, max_workers=MAX_WORKERS, ttl=TTL_SECONDS, timeout=CALL_TIMEOUT, memo_size=MEMO_SIZE):
+        self.ttl = ttl
+        self.timeout = timeout
+        self.memo_size = memo_size
+        self.hits = 0
+        self.misses = 0
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tool-call")
+        self._lock = threading.Lock()
+        self._memo = OrderedDict()  # key -> (expires at, result), least recently used first
+        self._in_flight = {}  # key -> Future
+
+    def submit(self, name, fn, query):
+        """Returns a Future for fn(query), reusing a memoized or in-flight call if there is one."""
+        key = (name, normalize_query(query))
+        with self._lock:
+            cached = self._memo.get(key)
+            if cached is not None and cached[0] <= time.monotonic():
+                del self._memo[key]
+                cached = None
+            if cached is not None:
+                self._memo.move_to_end(key)
+                self.hits += 1
+                future = Future()
+                future.set_result(cached[1])
+                return future
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.hits += 1
+                return future
+            self.misses += 1
+            future = self._pool.submit(fn, query)
+            self._in_flight[key] = future
+
+        def remember(done):
+            with self._lock:
+                self._in_flight.pop(key, None)
+                if not done.cancelled() and done.exception() is None:
+                    self._memo[key] = (time.monotonic() + self.ttl, done.result())
+                    self._memo.move_to_end(key)
+                    while len(self._memo) > self.memo_size:
+                        self._memo.popitem(last=False)
+
+        future.add_done_callback(remember)
+        return future
+
+    def run(self, name, fn, query, timeout=None):
+        """Runs one call and waits for it; raises TimeoutError past the timeout."""
+        future = self.submit(name, fn, query)
+        try:
+            return future.result(timeout=timeout or self.timeout)
+        except FutureTimeoutError:
+            raise TimeoutError(f"{name} timed out after {timeout or self.timeout}s") from None
+
+    def clear(self):
+        with self._lock:
+            self._memo.clear()
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
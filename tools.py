@@ -1,29 +1,90 @@
-from langchain_community.tools import WikipediaQueryRun, DuckDuckGoSearchRun
-from langchain_community.utilities import WikipediaAPIWrapper
-from langchain.tools import Tool
 from datetime import datetime
+import atexit
+import os
+import threading
+from record_writer import RecordWriter
+from tool_runner import ToolRunner
+
+# Search and Wikipedia lookups go through a shared runner: results are cached
+# per normalized query, duplicate in-flight queries are merged, and every call
+# has a timeout.
+tool_runner = ToolRunner()
+
+# Saved research is appended by a background writer that batches records and
+# keeps the output file open; anything still queued is written at exit.
+record_writer = RecordWriter()
+atexit.register(record_writer.close)
+
+# Wikipedia lookups go to the live API, unless WIKI_INDEX names a directory
+# built by wiki_index.py (e.g. `python wiki_index.py build data/wiki_sample.xml`):
+# then they are answered offline from that index. Either way an answer
+# carries up to WIKI_CHARS characters of the article.
+WIKI_INDEX = os.getenv("WIKI_INDEX")
+WIKI_CHARS = 2000
+
+# langchain is only imported, and the tool objects below only built, the
+# first time one of them is used (or prewarm() runs), so importing this
+# module stays cheap. They are still plain module attributes: tools.search_tool
+# works as before.
+_LAZY_TOOLS = {"save_tool", "search", "search_tool", "api_wrapper", "wiki_query", "wiki_tool"}
+_build_lock = threading.Lock()
 
 def save_to_txt(data: str, filename: str = "research_output.txt"):
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     formatted_text = f"--- Research Output ---\nTimestamp: {timestamp}\n\n{data}\n\n"
 
-    with open(filename, "a", encoding="utf-8") as f:
-        f.write(formatted_text)
+    record_writer.write(filename, formatted_text)
     
     return f"Data successfully saved to {filename}"
 
-save_tool = Tool(
-    name="save_text_to_file",
-    func=save_to_txt,
-    description="Saves structured research data to a text file.",
-)
-
-search = DuckDuckGoSearchRun()
-search_tool = Tool(
-    name="search",
-    func=search.run,
-    description="Search the web for information",
-)
-
-api_wrapper = WikipediaAPIWrapper(top_k_results=1, doc_content_chars_max=100)
-wiki_tool = WikipediaQueryRun(api_wrapper=api_wrapper)
\ No newline at end of file
+def _build_tools():
+    """Imports langchain and constructs the tools, once."""
+    global save_tool, search, search_tool, api_wrapper, wiki_query, wiki_tool
+    with _build_lock:
+        if "wiki_tool" in globals():
+            return
+        from langchain_community.tools import WikipediaQueryRun, DuckDuckGoSearchRun
+        from langchain_community.utilities import WikipediaAPIWrapper
+        from langchain.tools import Tool
+
+        save_tool = Tool(
+            name="save_text_to_file",
+            func=save_to_txt,
+            description="Saves structured research data to a text file.",
+        )
+
+        search = DuckDuckGoSearchRun()
+        search_tool = Tool(
+            name="search",
+            func=lambda query: tool_runner.run("search", search.run, query),
+            description="Search the web for information",
+        )
+
+        if WIKI_INDEX:
+            from wiki_index import WikiIndex
+            api_wrapper = None
+            wiki_query = WikiIndex(WIKI_INDEX, max_chars=WIKI_CHARS)  # Same name, description and run()
+        else:
+            api_wrapper = WikipediaAPIWrapper(top_k_results=1, doc_content_chars_max=WIKI_CHARS)
+            wiki_query = WikipediaQueryRun(api_wrapper=api_wrapper)
+        wiki_tool = Tool(
+            name=wiki_query.name,
+            func=lambda query: tool_runner.run(wiki_query.name, wiki_query.run, query),
+            description=wiki_query.description,
+        )
+
+def __getattr__(name):
+    if name in _LAZY_TOOLS:
+        _build_tools()
+        return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def prewarm():
+    """Builds the tools on a background thread, ahead of their first use."""
+    def warm():
+        try:
+            _build_tools()
+        except ImportError:
+            pass  # Reported by the agent when it asks for the tools
+
+    threading.Thread(target=warm, name="tools-prewarm", daemon=True).start()
@@ -0,0 +1,82 @@
+from collections import OrderedDict
+
+# Rendered chat views kept alive after the user switches away, so switching
+# back is a show/hide instead of a re-render.
+#
+# The GUIs own the views (a Text widget per chat in main.py, a MessageList
+# per chat in gui_tkinter.py) and keep hidden ones up to date as messages
+# arrive; this only decides which ones to keep. Each view is charged an
+# estimated size in bytes, and the least recently shown views are dropped
+# once there are more than max_views or their sizes add up to more than
+# max_bytes. The most recently shown view is always kept, however large.
+
+
+class ViewCache:
+    """LRU of views by chat id, bounded by count and estimated bytes."""
+
+    def __init__(self, max_views, max_bytes, on_evict=None):
+        self.max_views = max_views
+        self.max_bytes = max_bytes
+        self.on_evict = on_evict  # Called with each dropped view, e.g. to destroy it
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._views = OrderedDict()  # chat id -> [view, bytes]
+
+    def __contains__(self, key):
+        return key in self._views
+
+    def __len__(self):
+        return len(self._views)
+
+    def get(self, key):
+        """The view for key, marked as most recently shown, or None."""
+        entry = self._views.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._views.move_to_end(key)
+        return entry[0]
+
+    def peek(self, key):
+        """The view for key without changing its recency, or None; for updating hidden views."""
+        entry = self._views.get(key)
+        return entry[0] if entry is not None else None
+
+    def put(self, key, view, size):
+        """Adds a view as the most recently shown and evicts others as needed."""
+        self.discard(key)
+        self._views[key] = [view, size]
+        self.total_bytes += size
+        self._evict()
+
+    def size(self, key):
+        entry = self._views.get(key)
+        return entry[1] if entry is not None else 0
+
+    def resize(self, key, size):
+        """Updates a view's estimated size after it changed, e.g. when a message was added."""
+        entry = self._views.get(key)
+        if entry is not None:
+            self.total_bytes += size - entry[1]
+            entry[1] = size
+            self._evict()
+
+    def discard(self, key):
+        """Drops key's view, e.g. when its chat is deleted or has to be re-rendered."""
+        entry = self._views.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= entry[1]
+            if self.on_evict is not None:
+                self.on_evict(entry[0])
+
+    def clear(self):
+        for key in list(self._views):
+            self.discard(key)
+
+    def _evict(self):
+        while len(self._views) > 1 and (len(self._views) > self.max_views or self.total_bytes > self.max_bytes):
+            self.discard(next(iter(self._views)))
+            self.evictions += 1
@@ -0,0 +1,514 @@
+import sys
+
+import customtkinter as ctk
+
+# Virtualized CustomTkinter views for gui_tkinter.py.
+# MessageList never builds more bubbles than fit in its viewport (plus a
+# small overscan). Each bound bubble is measured once and placed at a pixel
+# offset, so scrolling moves by pixels; it rebinds the existing bubbles to
+# other messages instead of creating new widgets, and appending a message
+# recycles a single bubble. ChatSidebar does the same for the conversation
+# list and only reconfigures the buttons whose chat or selection state
+# actually changed.
+
+# Height of the smallest bubble (one line of text plus the timestamp), used to
+# bound how many bubbles can be visible at once
+MIN_ROW_HEIGHT = 52
+
+# Extra bubbles kept bound (and measured) above and below the ones that fit
+OVERSCAN = 3
+
+# Vertical space between bubbles, split above and below each one
+ROW_GAP = 10
+
+# Pixels scrolled per mouse wheel step
+SCROLL_STEP = 40
+
+BUBBLE_COLORS = {"user": "#DCF8C6", "assistant": "#FFFFFF"}  # WhatsApp green / white
+
+# Height of one sidebar button including its padding
+SIDEBAR_ROW_HEIGHT = 32
+
+
+# Widget path -> wheel handler, for every live widget passed to bind_mouse_wheel
+_wheel_handlers = {}
+
+
+def bind_mouse_wheel(widget, handler):
+    """Calls handler(steps) for wheel events over widget or its children, until widget is destroyed.
+
+    CTk widgets refuse bind_all, so this binds once on the window like
+    CTkScrollableFrame does and dispatches by widget path.
+    """
+    path = str(widget)
+    _wheel_handlers[path] = handler
+    widget.bind("<Destroy>", lambda event: _wheel_handlers.pop(path, None), add="+")
+
+    toplevel = widget.winfo_toplevel()
+    if getattr(toplevel, "_wheel_bound", False):
+        return
+    toplevel._wheel_bound = True
+    if sys.platform.startswith("linux"):
+        toplevel.bind_all("<Button-4>", _on_wheel, add="+")
+        toplevel.bind_all("<Button-5>", _on_wheel, add="+")
+    else:
+        toplevel.bind_all("<MouseWheel>", _on_wheel, add="+")
+
+
+def _on_wheel(event):
+    target = str(event.widget)
+    paths = [path for path in _wheel_handlers if target == path or target.startswith(path + ".")]
+    if not paths:
+        return
+    if sys.platform.startswith("linux"):
+        steps = -1 if event.num == 4 else 1
+    elif sys.platform == "darwin":
+        steps = -event.delta
+    else:
+        steps = -int(event.delta / 120) or (-1 if event.delta > 0 else 1)
+    _wheel_handlers[max(paths, key=len)](steps)  # The innermost one, should they ever nest
+
+
+class _Bubble:
+    """One recyclable row: container frame, bubble frame, text and time labels."""
+
+    __slots__ = ("container", "bubble", "text_label", "time_label", "role", "item", "index")
+
+
+class MessageList(ctk.CTkFrame):
+    """Scrollable chat view over a list of Message records.
+
+    The view is anchored at the bottom: `last` is the index of the lowest
+    item reaching into the viewport and `offset` is how many pixels of it are
+    hidden below the bottom edge. Rows are placed upwards from there at their
+    measured heights, so scrolling moves by pixels and a bubble taller than
+    the viewport can be scrolled through.
+    """
+
+    def __init__(self, master, side_margin=220, fg_color="#e5ddd5", **kwargs):
+        super().__init__(master, fg_color=fg_color, corner_radius=0, **kwargs)
+        self.side_margin = side_margin
+        self.items = []
+        self.last = -1
+        self.offset = 0
+        self._heights = {}  # item index -> measured row height, cleared when the text is rewrapped
+        self._width = 1  # Mapped width, known from the first <Configure>
+        self._slots = []  # bound bubbles
+        self._spare = []  # unbound bubbles, ready for reuse
+
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_rowconfigure(0, weight=1)
+
+        self.viewport = ctk.CTkFrame(self, fg_color=fg_color, corner_radius=0)
+        self.viewport.grid(row=0, column=0, sticky="nsew")
+        self.viewport.bind("<Configure>", lambda event: self._render())
+        self.bind("<Configure>", self._on_resize)
+
+        self.scrollbar = ctk.CTkScrollbar(self, command=self._on_scrollbar)
+        self.scrollbar.grid(row=0, column=1, sticky="ns")
+
+        bind_mouse_wheel(self, lambda steps: self.scroll_by(steps * SCROLL_STEP))
+
+    # --- Public API ---
+
+    def show(self, items):
+        """Displays a new list of items, scrolled to the bottom."""
+        self.items = list(items)
+        self.last = len(self.items) - 1
+        self.offset = 0
+        self._heights = {}
+        self._render()
+
+    def clear(self):
+        self.show([])
+
+    def append(self, item):
+        """Adds one item at the bottom; if following the end, scrolls so it shows, rebinding one bubble."""
+        following = self.last == len(self.items) - 1 and self.offset == 0
+        self.items.append(item)
+        if following:
+            self.last += 1
+        self._render()
+
+    def refresh(self, item):
+        """Redraws an item whose text changed, if it is currently bound."""
+        for slot in self._slots:
+            if slot.item is item:
+                slot.text_label.configure(text=item.text)
+                self._heights.pop(slot.index, None)
+                self._render()  # Re-measures it; a growing last row keeps its bottom in place
+                return
+
+    def scroll_to_end(self):
+        self.scroll_to(len(self.items) - 1)
+
+    def scroll_to(self, index):
+        """Scrolls so that the bottom of items[index] is at the bottom of the view."""
+        if not self.items:
+            return
+        self.last = max(0, min(index, len(self.items) - 1))
+        self.offset = 0
+        self._render()
+
+    def scroll_by(self, pixels):
+        """Scrolls towards the end (pixels > 0) or the start (pixels < 0)."""
+        if self.items and self._move(pixels):
+            self._render()
+
+    def widget_count(self):
+        """Number of bubbles instantiated (bound or spare)."""
+        return len(self._slots) + len(self._spare)
+
+    # --- Scroll position ---
+
+    def _height(self, index):
+        return self._heights.get(index, MIN_ROW_HEIGHT)
+
+    def _viewport_height(self):
+        height = self.viewport.winfo_height()
+        if height <= 1:
+            height = self.viewport.cget("height")  # Not mapped yet; use the requested size
+        return max(1, height)
+
+    def _move(self, pixels):
+        """Shifts the content up by pixels (down if negative); returns whether it moved."""
+        before = (self.last, self.offset)
+        self.offset -= pixels
+        while self.offset < 0 and self.last < len(self.items) - 1:
+            self.last += 1
+            self.offset += self._height(self.last)
+        while self.offset >= self._height(self.last) and self.last > 0:
+            self.offset -= self._height(self.last)
+            self.last -= 1
+        # Past either end: the bottom row stays at the bottom, and _render pulls the top row back up
+        self.offset = max(0, min(self.offset, self._height(self.last) - 1))
+        return (self.last, self.offset) != before
+
+    # --- Rendering ---
+
+    def _render(self):
+        """Binds and places the rows reaching into the viewport, plus OVERSCAN on either side."""
+        height = self._viewport_height()
+        while True:
+            first, end = self._window(height)
+            top = self._place(height, first, end)
+            if top <= 0:
+                break
+            if first > 0:
+                continue  # Rows came out shorter than estimated; bind more above
+            # Empty space above the first row: scroll down to fill it, unless the whole chat fits
+            if not self._move(top):
+                break
+        self._update_scrollbar(height)
+
+    def _window(self, height):
+        """Range of items to bind, from the estimated or measured heights above `last`."""
+        if not self.items:
+            return 0, 0
+        first = self.last
+        y = height + self.offset - self._height(first)  # Top of items[last]
+        while first > 0 and y > 0:
+            first -= 1
+            y -= self._height(first)
+        return max(0, first - OVERSCAN), min(len(self.items), self.last + 1 + OVERSCAN)
+
+    def _place(self, height, first, end):
+        """Binds items[first:end], measures new rows and places them; returns the top of items[first]."""
+        slots = self._bind_range(first, end)
+        y = height + self.offset  # Bottom of items[last]
+        for index in range(self.last + 1, end):
+            self._put(slots[index], y)
+            y += self._heights[index]
+        y = height + self.offset
+        for index in range(self.last, first - 1, -1):
+            y -= self._heights[index]
+            self._put(slots[index], y)
+        return y
+
+    def _bind_range(self, first, end):
+        """Binds items[first:end], reusing the bubbles already showing them, and measures new rows."""
+        slots = {}
+        for slot in self._slots:
+            if first <= slot.index < end and self.items[slot.index] is slot.item:
+                slots[slot.index] = slot
+            else:
+                slot.container.place_forget()
+                slot.item = None
+                self._spare.append(slot)
+        for index in range(first, end):
+            if index not in slots:
+                slot = self._spare.pop() if self._spare else self._new_slot()
+                self._bind(slot, index)
+                slots[index] = slot
+        self._slots = list(slots.values())
+
+        unmeasured = [index for index in range(first, end) if index not in self._heights]
+        if unmeasured:
+            self.viewport.update_idletasks()  # Lets pack size the new bubbles
+            for index in unmeasured:
+                self._heights[index] = slots[index].container.winfo_reqheight() + ROW_GAP
+        return slots
+
+    def _put(self, slot, top):
+        # Heights are measured in screen pixels, while CTk's place() scales y
+        slot.container.place(x=0, y=self._reverse_widget_scaling(float(top + ROW_GAP // 2)), relwidth=1)
+
+    def _new_slot(self):
+        slot = _Bubble()
+        slot.role = None
+        slot.item = None
+        slot.index = -1
+        slot.container = ctk.CTkFrame(self.viewport, fg_color="transparent")
+        slot.bubble = ctk.CTkFrame(slot.container, corner_radius=10, border_width=0)
+        slot.text_label = ctk.CTkLabel(
+            slot.bubble,
+            text="",
+            font=("Arial", 12),
+            text_color="black",
+            justify="left"
+        )
+        slot.text_label.pack(padx=10, pady=(5, 0), anchor="w")
+        slot.time_label = ctk.CTkLabel(
+            slot.bubble,
+            text="",
+            font=("Arial", 8),
+            text_color="gray50",
+            justify="right"
+        )
+        slot.time_label.pack(padx=10, pady=(0, 5), anchor="e")
+        return slot
+
+    def _bind(self, slot, index):
+        """Points a bubble at another item, re-aligning it only if the role changed."""
+        item = self.items[index]
+        slot.item = item
+        slot.index = index
+        role = "user" if item.role == "user" else "assistant"
+        if role != slot.role:
+            slot.role = role
+            slot.bubble.configure(fg_color=BUBBLE_COLORS[role])
+            slot.bubble.pack_forget()
+            if role == "user":
+                # User bubble: right-aligned, pushed over by the side margin
+                slot.bubble.pack(side="right", padx=(self.side_margin, 10), pady=2, anchor="e")
+            else:
+                # Bot bubble: left-aligned, stretching to the side margin
+                slot.bubble.pack(side="left", fill="x", expand=True, padx=(10, self.side_margin), anchor="w")
+        slot.text_label.configure(text=item.text, wraplength=self._wraplength())
+        slot.time_label.configure(text=item.time)
+
+    def _wraplength(self):
+        return max(200, self._width - 130)
+
+    def _update_scrollbar(self, height):
+        n = len(self.items)
+        if not n:
+            self.scrollbar.set(0.0, 1.0)
+            return
+        # Fractions by item, counting the partly hidden top and bottom rows pro rata
+        index, y = self.last, height + self.offset - self._height(self.last)
+        while index > 0 and y > 0:
+            index -= 1
+            y -= self._height(index)
+        start = index + max(0, -y) / self._height(index)
+        end = self.last + 1 - self.offset / self._height(self.last)
+        self.scrollbar.set(start / n, end / n)
+
+    # --- Events ---
+
+    def _on_resize(self, event):
+        """Rewraps the bound bubbles when the width changes; their heights are measured again."""
+        if event.width == self._width:
+            return
+        self._width = event.width
+        wraplength = self._wraplength()
+        for slot in self._slots:
+            slot.text_label.configure(wraplength=wraplength)
+        self._heights = {}
+        self._render()
+
+    def _on_scrollbar(self, action, amount, units=None):
+        if not self.items:
+            return
+        if action == "moveto":
+            # Put the row at that fraction of the items at the top of the view
+            position = max(0.0, min(float(amount), 1.0)) * len(self.items)
+            index = min(int(position), len(self.items) - 1)
+            height = self._viewport_height()
+            self._bind_range(index, min(len(self.items), index + height // MIN_ROW_HEIGHT + 1))  # Real heights to move by
+            self.last = index
+            self.offset = 0
+            self._move(height - self._height(index) * (1 - (position - index)))
+            self._render()
+        else:
+            step = self._viewport_height() if units == "pages" else SCROLL_STEP
+            self.scroll_by(int(amount) * step)
+
+
+class _Row:
+    """One recyclable sidebar button and the chat it currently shows."""
+
+    __slots__ = ("button", "chat", "title", "selected")
+
+
+class ChatSidebar(ctk.CTkFrame):
+    """Virtualized list of chat buttons, keyed by chat identity.
+
+    Only the rows that fit are backed by buttons. Edits go through add(),
+    remove(), rename() and select(); each one reconfigures just the buttons
+    whose chat, title or highlight changed.
+    """
+
+    def __init__(self, master, command, label_text="Conversations", **kwargs):
+        super().__init__(master, corner_radius=0, **kwargs)
+        self.command = command
+        self.chats = []
+        self.selected = None
+        self.first = 0
+        self._rows = []  # bound buttons, top-most first
+        self._spare = []
+
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_rowconfigure(1, weight=1)
+
+        label = ctk.CTkLabel(self, text=label_text)
+        label.grid(row=0, column=0, columnspan=2, sticky="ew", pady=(5, 0))
+
+        self.viewport = ctk.CTkFrame(self, fg_color="transparent", corner_radius=0)
+        self.viewport.grid(row=1, column=0, sticky="nsew")
+        self.viewport.pack_propagate(False)
+        self.viewport.bind("<Configure>", lambda event: self._render())
+
+        self.scrollbar = ctk.CTkScrollbar(self, command=self._on_scrollbar)
+        self.scrollbar.grid(row=1, column=1, sticky="ns")
+
+        bind_mouse_wheel(self, lambda steps: self.scroll_to(self.first + steps))
+
+    # --- Model updates ---
+
+    def set_chats(self, chats, selected=None):
+        """Replaces the whole list (startup)."""
+        self.chats = list(chats)
+        self.selected = selected
+        self.first = 0
+        self._render()
+
+    def add(self, chat):
+        """Appends one chat at the bottom of the list."""
+        self.chats.append(chat)
+        self._render()
+
+    def remove(self, chat):
+        """Drops one chat; only the visible rows below it are rebound."""
+        self.chats = [c for c in self.chats if c is not chat]
+        if self.selected is chat:
+            self.selected = None
+        self._render()
+
+    def rename(self, chat):
+        """Updates the button of a retitled chat, if it is visible."""
+        for row in self._rows:
+            if row.chat is chat:
+                self._bind(row, chat)
+
+    def select(self, chat):
+        """Moves the highlight; reconfigures at most the old and the new button."""
+        if chat is self.selected:
+            return
+        self.selected = chat
+        for row in self._rows:
+            if row.selected != (row.chat is chat):
+                self._bind(row, row.chat)
+        if chat is not None:
+            self.reveal(chat)
+
+    def reveal(self, chat):
+        """Scrolls just enough to make chat visible."""
+        idx = next((i for i, c in enumerate(self.chats) if c is chat), None)
+        if idx is None:
+            return
+        visible = self._visible_rows()
+        if idx < self.first:
+            self.scroll_to(idx)
+        elif idx >= self.first + visible:
+            self.scroll_to(idx - visible + 1)
+
+    def scroll_to(self, first):
+        first = max(0, min(first, len(self.chats) - self._visible_rows()))
+        if first != self.first:
+            self.first = first
+            self._render()
+
+    def widget_count(self):
+        """Number of buttons instantiated (bound or spare)."""
+        return len(self._rows) + len(self._spare)
+
+    # --- Rendering ---
+
+    def _visible_rows(self):
+        height = self.viewport.winfo_height()
+        if height <= 1:
+            height = self.viewport.cget("height")  # Not mapped yet; use the requested size
+        return max(1, height // SIDEBAR_ROW_HEIGHT)
+
+    def _render(self):
+        """Binds buttons to chats[first : first + visible + 1], rebinding only changed rows."""
+        self.first = max(0, min(self.first, len(self.chats) - self._visible_rows()))
+        window = self.chats[self.first:self.first + self._visible_rows() + 1]
+
+        while len(self._rows) > len(window):
+            row = self._rows.pop()
+            row.button.pack_forget()
+            row.chat = None
+            self._spare.append(row)
+        for row, chat in zip(self._rows, window):
+            if row.chat is not chat or row.title != chat["title"] or row.selected != (chat is self.selected):
+                self._bind(row, chat)
+        for chat in window[len(self._rows):]:
+            row = self._spare.pop() if self._spare else self._new_row()
+            self._bind(row, chat)
+            row.button.pack(fill="x", pady=2, padx=5)
+            self._rows.append(row)
+
+        n = len(self.chats)
+        if n:
+            self.scrollbar.set(self.first / n, min(n, self.first + self._visible_rows()) / n)
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def _new_row(self):
+        row = _Row()
+        row.chat = None
+        row.title = None
+        row.selected = None
+        row.button = ctk.CTkButton(
+            self.viewport,
+            text="",
+            text_color_disabled=("gray70", "gray30"),
+            anchor="w",
+            hover_color=("#dbdbdb", "#4d4d4d"),
+            command=lambda: self.command(row.chat)
+        )
+        return row
+
+    def _bind(self, row, chat):
+        row.chat = chat
+        row.title = chat["title"]
+        row.selected = chat is self.selected
+        theme = ctk.ThemeManager.theme
+        if row.selected:
+            # Use the selected color from the segmented button theme
+            fg_color = theme['CTkSegmentedButton']['selected_color']
+            text_color = theme['CTkSegmentedButton']['selected_color'][1]
+        else:
+            fg_color = theme['CTkSegmentedButton']['unselected_color']
+            text_color = theme['CTkButton']['text_color']
+        row.button.configure(text=chat["title"], fg_color=fg_color, text_color=text_color)
+
+    # --- Events ---
+
+    def _on_scrollbar(self, action, amount, units=None):
+        if action == "moveto":
+            self.scroll_to(round(float(amount) * len(self.chats)))
+        else:
+            self.scroll_to(self.first + int(amount))
@@ -0,0 +1,333 @@
+"""Builds and queries an offline, memory-mapped Wikipedia title index.
+
+    python wiki_index.py build data/wiki_sample.xml wiki_data
+    python wiki_index.py lookup wiki_data "python programing"
+
+Set WIKI_INDEX=wiki_data and tools.wiki_tool answers from the index instead
+of the live Wikipedia API.
+"""
+import argparse
+import bisect
+import bz2
+import difflib
+import json
+import mmap
+import os
+import re
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+# An index directory holds these files, all read through mmap:
+#   keys.bin      the normalized titles (lookup keys), sorted, back to back
+#   keys.idx      where each key starts in keys.bin, as uint64, plus the end
+#   reversed.idx  the entry numbers (uint32) ordered by reversed key, so the
+#                 fuzzy lookup also finds titles that only share an ending
+#   titles.bin    the display titles, in the same order
+#   entries.npy   one fixed-size record per key with the offsets and lengths
+#                 of its title and text
+#   text.bin      article texts (cleaned of wiki markup), back to back
+# Lookups binary-search the sorted keys straight from the mapped files, so
+# opening an index reads nothing and a lookup touches a few pages. Redirects
+# are entries that point at their target's text. Article text is sliced
+# from the mapping without copying the rest of the file.
+#
+# Dumps are MediaWiki XML exports (pages-articles.xml, optionally .bz2), or
+# JSON lines of {"title", "text"} for any other collection of articles.
+
+INDEX_DIR = "wiki_data"
+MAX_CHARS = 2000
+
+# Titles compared with the query by the fuzzy lookup, either side of where it
+# would sort, forwards and reversed
+FUZZY_WINDOW = 32
+FUZZY_CUTOFF = 0.6
+
+NO_RESULT = "No good Wikipedia Search Result was found"  # What WikipediaAPIWrapper returns
+
+ENTRY = np.dtype([("title", "<u8"), ("title_len", "<u4"), ("text_len", "<u4"), ("text", "<u8")])
+
+
+def normalize_title(title):
+    """The lookup key of a title: case-folded, underscores as spaces, whitespace collapsed."""
+    return " ".join(title.replace("_", " ").split()).casefold()
+
+
+# --- Building ---
+
+MARKUP = [
+    (re.compile(r"<!--.*?-->", re.S), ""),
+    (re.compile(r"<ref[^>]*/>|<ref[^>]*>.*?</ref>", re.S), ""),
+    (re.compile(r"<math[^>]*>(.*?)</math>", re.S), r"\1"),
+    (re.compile(r"</?\w+[^>]*>"), ""),
+    (re.compile(r"\{\|.*?\|\}", re.S), ""),                                    # Tables
+    (re.compile(r"\[\[(?:File|Image|Category):[^\[\]]*(?:\[\[[^\]]*\]\][^\[\]]*)*\]\]", re.I), ""),
+    (re.compile(r"\[\[[^|\]]*\|([^\]]*)\]\]"), r"\1"),                          # [[target|label]]
+    (re.compile(r"\[\[([^\]]*)\]\]"), r"\1"),                                   # [[target]]
+    (re.compile(r"\[https?://\S+ ([^\]]*)\]"), r"\1"),                          # [url label]
+    (re.compile(r"'{2,}"), ""),
+    (re.compile(r"^=+\s*(.*?)\s*=+\s*$", re.M), r"\1"),                         # Headings
+    (re.compile(r"\n{3,}"), "\n\n"),
+]
+TEMPLATE = re.compile(r"\{\{[^{}]*\}\}")
+
+
+def clean_wikitext(text):
+    """Plain text from wiki markup: templates, references, tables and link syntax removed."""
+    previous = None
+    while previous != text:  # Innermost templates first, until nested ones are gone
+        previous, text = text, TEMPLATE.sub("", text)
+    for pattern, replacement in MARKUP:
+        text = pattern.sub(replacement, text)
+    return text.strip()
+
+
+def read_dump(path):
+    """Yields (title, text, redirect target or None) for each article of a dump."""
+    opener = bz2.open if path.endswith(".bz2") else open
+    if ".jsonl" in path or ".json" in path:
+        with opener(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    article = json.loads(line)
+                    yield article["title"], article.get("text", ""), article.get("redirect")
+        return
+    with opener(path, "rb") as f:
+        for _, element in ET.iterparse(f):
+            if element.tag.rsplit("}", 1)[-1] != "page":
+                continue
+            fields = {child.tag.rsplit("}", 1)[-1]: child for child in element}
+            if fields.get("ns") is None or fields["ns"].text == "0":  # Articles only
+                redirect = fields.get("redirect")
+                text = element.find(".//{*}text")
+                yield (fields["title"].text, (text.text or "") if text is not None else "",
+                       redirect.get("title") if redirect is not None else None)
+            element.clear()  # Keep memory flat on multi-gigabyte dumps
+
+
+def build_index(dump_path, index_dir=INDEX_DIR):
+    """Writes the index for a dump; returns (articles, redirects) indexed."""
+    os.makedirs(index_dir, exist_ok=True)
+    entries = {}    # key -> (title, text offset, text length)
+    redirects = {}  # key -> target key
+    offset = 0
+    with open(os.path.join(index_dir, "text.bin"), "wb") as text_file:
+        for title, text, redirect in read_dump(dump_path):
+            key = normalize_title(title)
+            if not key or key in entries or key in redirects:
+                continue
+            if redirect:
+                redirects[key] = normalize_title(redirect)
+                continue
+            data = clean_wikitext(text).encode("utf-8")
+            text_file.write(data)
+            entries[key] = (title, offset, len(data))
+            offset += len(data)
+    linked = 0
+    for key, target in redirects.items():
+        if target in entries:
+            entries[key] = entries[target]  # Listed under the target's title
+            linked += 1
+
+    keys = sorted(key.encode("utf-8") for key in entries)  # Byte order, as lookups compare
+    key_offsets = np.zeros(len(keys) + 1, "<u8")
+    records = np.zeros(len(keys), ENTRY)
+    with open(os.path.join(index_dir, "keys.bin"), "wb") as key_file, \
+            open(os.path.join(index_dir, "titles.bin"), "wb") as title_file:
+        key_position = title_position = 0
+        for i, key in enumerate(keys):
+            title, text_offset, text_len = entries[key.decode("utf-8")]
+            title = title.encode("utf-8")
+            key_file.write(key)
+            title_file.write(title)
+            key_offsets[i] = key_position
+            records[i] = (title_position, len(title), text_len, text_offset)
+            key_position += len(key)
+            title_position += len(title)
+        key_offsets[len(keys)] = key_position
+    key_offsets.tofile(os.path.join(index_dir, "keys.idx"))
+    reverse = sorted(range(len(keys)), key=lambda i: keys[i][::-1])
+    np.array(reverse, "<u4").tofile(os.path.join(index_dir, "reversed.idx"))
+    np.save(os.path.join(index_dir, "entries.npy"), records)
+    return len(entries) - linked, linked
+
+
+# --- Reading ---
+
+class _Keys:
+    """The sorted keys as a sequence of bytes, read from the mapping on demand, for bisect."""
+
+    def __init__(self, keys, offsets):
+        self.keys = keys
+        self.offsets = offsets  # uint64 memoryview: plain ints, no numpy scalar per probe
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self.keys[self.offsets[i]:self.offsets[i + 1]]
+
+
+class _ReversedKeys:
+    """The keys, each reversed, in reversed-key order."""
+
+    def __init__(self, keys, order):
+        self.keys = keys
+        self.order = order
+
+    def __len__(self):
+        return len(self.order)
+
+    def __getitem__(self, i):
+        return self.keys[self.order[i]][::-1]
+
+
+class WikiIndex:
+    """A built index, opened read-only. Usable where a WikipediaQueryRun is (name, description, run)."""
+
+    name = "wikipedia"
+    description = (
+        "A wrapper around an offline copy of Wikipedia. Useful for when you need to answer general questions "
+        "about people, places, companies, facts, historical events, or other subjects. "
+        "Input should be a search query."
+    )
+
+    def __init__(self, index_dir=INDEX_DIR, max_chars=MAX_CHARS):
+        self.index_dir = index_dir
+        self.max_chars = max_chars
+        self.entries = np.load(os.path.join(index_dir, "entries.npy"), mmap_mode="r")
+        self._files, self._maps = [], []
+        self._offsets = memoryview(self._map("keys.idx")).cast("Q")
+        self.keys = _Keys(self._map("keys.bin"), self._offsets)
+        self._order = memoryview(self._map("reversed.idx")).cast("I") if len(self.keys) else []
+        self.reversed_keys = _ReversedKeys(self.keys, self._order)
+        self._titles = self._map("titles.bin")
+        self._text = memoryview(self._map("text.bin"))
+
+    def _map(self, name):
+        f = open(os.path.join(self.index_dir, name), "rb")
+        self._files.append(f)
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""  # mmap can't map an empty file
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._maps.append(mapped)
+        return mapped
+
+    def __len__(self):
+        return len(self.entries)
+
+    # --- Titles ---
+
+    def title(self, i):
+        entry = self.entries[i]
+        start = int(entry["title"])
+        return self._titles[start:start + int(entry["title_len"])].decode("utf-8")
+
+    def exact(self, title):
+        """The entry number of title (case-insensitive), or None."""
+        key = normalize_title(title).encode("utf-8")
+        i = bisect.bisect_left(self.keys, key)
+        return i if i < len(self) and self.keys[i] == key else None
+
+    def prefix(self, text, limit=10):
+        """Entry numbers of the titles starting with text, in title order."""
+        key = normalize_title(text).encode("utf-8")
+        found = []
+        i = bisect.bisect_left(self.keys, key)
+        while i < len(self) and len(found) < limit and self.keys[i].startswith(key):
+            found.append(i)
+            i += 1
+        return found
+
+    def fuzzy(self, text, limit=5, cutoff=FUZZY_CUTOFF):
+        """Entry numbers of the titles most similar to text, best first.
+
+        Compares against the FUZZY_WINDOW titles either side of where text
+        would sort, and of where it would sort reversed: titles that share a
+        start or an end with it. That catches a typo or a missing word
+        anywhere but the middle of the title.
+        """
+        key = normalize_title(text)
+        encoded = key.encode("utf-8")
+        i = bisect.bisect_left(self.keys, encoded)
+        candidates = set(range(max(0, i - FUZZY_WINDOW), min(len(self), i + FUZZY_WINDOW)))
+        i = bisect.bisect_left(self.reversed_keys, encoded[::-1])
+        candidates.update(self._order[j] for j in range(max(0, i - FUZZY_WINDOW), min(len(self), i + FUZZY_WINDOW)))
+        matcher = difflib.SequenceMatcher(b=key, autojunk=False)
+        scored = []
+        for j in candidates:
+            matcher.set_seq1(self.keys[j].decode("utf-8"))
+            if matcher.real_quick_ratio() >= cutoff and matcher.quick_ratio() >= cutoff:
+                score = matcher.ratio()
+                if score >= cutoff:
+                    scored.append((score, j))
+        return [j for _, j in sorted(scored, key=lambda s: (-s[0], s[1]))[:limit]]
+
+    def find(self, query):
+        """The best entry for a query: exact title, then shortest title with it as prefix, then fuzzy."""
+        i = self.exact(query)
+        if i is None:
+            matches = self.prefix(query, limit=50)
+            if matches:
+                i = min(matches, key=lambda j: len(self.keys[j]))
+        if i is None:
+            matches = self.fuzzy(query, limit=1)
+            i = matches[0] if matches else None
+        return i
+
+    # --- Text ---
+
+    def raw(self, i):
+        """The UTF-8 text of entry i as a memoryview of the mapping; nothing is copied."""
+        entry = self.entries[i]
+        start = int(entry["text"])
+        return self._text[start:start + int(entry["text_len"])]
+
+    def text(self, i, max_chars=None):
+        """Entry i's text, cut to max_chars characters; only that much is decoded."""
+        data = self.raw(i)
+        if max_chars is None:
+            return str(data, "utf-8")
+        return str(data[:max_chars * 4], "utf-8", "ignore")[:max_chars]  # At most 4 bytes per character
+
+    def run(self, query):
+        """Tool function: the best match's title and text, formatted like WikipediaQueryRun's answers."""
+        i = self.find(query)
+        if i is None:
+            return NO_RESULT
+        return f"Page: {self.title(i)}\nSummary: {self.text(i, self.max_chars)}"
+
+    def close(self):
+        if self._order:
+            self._order.release()
+        self._offsets.release()
+        self._text.release()
+        for mapped in self._maps:
+            mapped.close()
+        for f in self._files:
+            f.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="index a dump (.xml, .xml.bz2 or .jsonl)")
+    build.add_argument("dump")
+    build.add_argument("index_dir", nargs="?", default=INDEX_DIR)
+    lookup = commands.add_parser("lookup", help="print the article a query finds")
+    lookup.add_argument("index_dir")
+    lookup.add_argument("query")
+    lookup.add_argument("--max-chars", type=int, default=MAX_CHARS)
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        articles, redirects = build_index(args.dump, args.index_dir)
+        print(f"Indexed {articles} articles and {redirects} redirects into {args.index_dir}")
+    else:
+        index = WikiIndex(args.index_dir, args.max_chars)
+        print(index.run(args.query))
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
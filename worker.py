@@ -0,0 +1,113 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Background request executor shared by the GUIs.
+# Jobs run on a thread pool; their results are handed back to the Tk thread
+# through a queue that is drained with root.after polling, so no Tk call is
+# ever made from a worker thread.
+
+# One poll per frame: streamed deltas are coalesced between polls, so this
+# also caps how often a streaming bubble is redrawn (~30 fps).
+POLL_INTERVAL_MS = 33
+
+
+class _Stream:
+    """Text chunks received by a streaming job since the last poll."""
+
+    __slots__ = ("chunks", "on_delta")
+
+    def __init__(self, on_delta):
+        self.chunks = []
+        self.on_delta = on_delta
+
+
+class RequestWorker:
+    """Runs blocking jobs (API calls) off the Tk event loop."""
+
+    def __init__(self, max_workers=4, poll_interval_ms=POLL_INTERVAL_MS):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="chat-request")
+        self._results = queue.Queue()
+        self._lock = threading.Lock()
+        self._streams = []
+        self.poll_interval_ms = poll_interval_ms
+        self.in_flight = 0
+
+    def submit(self, fn, *args, on_done=None):
+        """Runs fn(*args) on the pool and calls on_done(result) on the Tk thread."""
+        self.in_flight += 1
+
+        def run():
+            try:
+                result = fn(*args)
+            except Exception as e:
+                result = e
+            self._results.put((on_done, result, None))
+
+        return self._pool.submit(run)
+
+    def submit_stream(self, fn, *args, on_delta=None, on_done=None):
+        """Iterates the text chunks yielded by fn(*args) on the pool.
+
+        on_delta(text) receives everything that arrived since the previous
+        poll, at most once per poll; on_done(result) gets the full text, or
+        the exception that ended the stream.
+        """
+        self.in_flight += 1
+        stream = _Stream(on_delta)
+        with self._lock:
+            self._streams.append(stream)
+
+        def run():
+            parts = []
+            try:
+                for chunk in fn(*args):
+                    parts.append(chunk)
+                    with self._lock:
+                        stream.chunks.append(chunk)
+                result = "".join(parts)
+            except Exception as e:
+                result = e
+            self._results.put((on_done, result, stream))
+
+        return self._pool.submit(run)
+
+    def _flush(self, stream):
+        with self._lock:
+            text = "".join(stream.chunks)
+            stream.chunks.clear()
+        if text and stream.on_delta is not None:
+            stream.on_delta(text)
+
+    def poll(self):
+        """Delivers pending deltas and finished results. Tk thread only."""
+        with self._lock:
+            streams = list(self._streams)
+        for stream in streams:
+            self._flush(stream)
+
+        while True:
+            try:
+                on_done, result, stream = self._results.get_nowait()
+            except queue.Empty:
+                return
+            if stream is not None:
+                # Chunks that raced in after the flush above go out first
+                self._flush(stream)
+                with self._lock:
+                    self._streams.remove(stream)
+            self.in_flight -= 1
+            if on_done is not None:
+                on_done(result)
+
+    def start_polling(self, root):
+        """Drains the result queue every poll_interval_ms using root.after."""
+        def tick():
+            self.poll()
+            root.after(self.poll_interval_ms, tick)
+
+        root.after(self.poll_interval_ms, tick)
+
+    def shutdown(self, wait=False):
+        """Stops accepting jobs; pending replies are dropped if wait is False."""
+        self._pool.shutdown(wait=wait, cancel_futures=not wait)